@@ -0,0 +1,101 @@
+import marshal
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+from bench.generator import generate_program, generate_realistic_program
+from bench.incremental import signature
+from lang.build import TREE_MODES
+from lang.optimizer import optimize
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.arenaUtils import ArenaBuilder, ArenaProgram, arena_to_objects
+from lang.utils.astFileUtils import AstFile, decode_program, encode_program, write_program
+from lang.utils.parserUtils import HashConsFactory
+from lang.utils.tokenUtils import TokenIterator
+
+
+def typed_signature(program) -> list[tuple]:
+    # signature() compares 1 == 1.0 == True, the types of the values have to match as well
+    return [node + (type(node[3]).__name__,) for node in signature(program)]
+
+
+def best(run, repeat: int = 5) -> float:
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def check(rounds: int, size: int = 20_000) -> int:
+    # round trip: every tree mode, optimized dags and single functions read from a mapped file decode to the
+    # tree that was written
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "check.lsast")
+        for seed in range(rounds):
+            generate = generate_realistic_program if seed % 2 else generate_program
+            tokens = TableLexer(generate(size, seed)).tokenize()
+            trees = {mode: Parse(TokenIterator(tokens), TREE_MODES[mode]()).parse() for mode in TREE_MODES}
+            trees["O2"] = optimize(Parse(TokenIterator(tokens), HashConsFactory()).parse(), 2)
+            for mode, program in trees.items():
+                expected = typed_signature(program)
+                if typed_signature(decode_program(encode_program(program))) != expected:
+                    failures += 1
+                    print(f"seed {seed}: {mode} tree differs after a round trip")
+            program = trees["O2"]
+            write_program(program, path)
+            with AstFile.open(path) as ast_file:
+                names = ast_file.function_names()
+                for name in random.Random(seed).sample(sorted(names), min(5, len(names))):
+                    if typed_signature(ast_file.function(name)) != typed_signature(program.body[names[name]]):
+                        failures += 1
+                        print(f"seed {seed}: function {name} differs")
+    print(f"check: {rounds} programs, {'ok' if failures == 0 else f'{failures} mismatches'}")
+    return failures
+
+
+def main(args: list[str]) -> None:
+    if len(args) > 1 and args[1] == "--check":
+        exit(1 if check(int(args[2]) if len(args) > 2 else 20) else 0)
+    size = int(args[1]) if len(args) > 1 else 1_000_000
+    tokens = TableLexer(generate_realistic_program(size)).tokenize()
+    program = Parse(TokenIterator(tokens)).parse()
+    arena = Parse(TokenIterator(tokens), ArenaBuilder()).parse()
+    sys.setrecursionlimit(100_000)   # pickle recurses into nested expressions
+    pickled = pickle.dumps(program, pickle.HIGHEST_PROTOCOL)
+    marshalled = marshal.dumps(arena.dump())
+    encoded = encode_program(program)
+    print(f"{len(program.body)} top level statements, {len(signature(program))} nodes")
+    print(f"{'format':>14} {'bytes':>10} {'write':>8} {'read':>8}")
+    print(f"{'pickle':>14} {len(pickled):>10} {best(lambda: pickle.dumps(program, pickle.HIGHEST_PROTOCOL)):>7.3f}s "
+          f"{best(lambda: pickle.loads(pickled)):>7.3f}s")
+    print(f"{'arena marshal':>14} {len(marshalled):>10} {best(lambda: marshal.dumps(arena.dump())):>7.3f}s "
+          f"{best(lambda: arena_to_objects(ArenaProgram.load(marshal.loads(marshalled)))):>7.3f}s")
+    print(f"{'ast file':>14} {len(encoded):>10} {best(lambda: encode_program(program)):>7.3f}s "
+          f"{best(lambda: decode_program(encoded)):>7.3f}s")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.lsast")
+        write_program(program, path)
+        names = sorted(AstFile(encoded).function_names())
+        name = names[len(names) // 2]
+
+        def one_function():
+            with AstFile.open(path) as ast_file:
+                ast_file.function(name)
+
+        def whole_tree():
+            with AstFile.open(path) as ast_file:
+                ast_file.program()
+
+        print(f"open the mapped file and decode {name}: {best(one_function) * 1000:.2f}ms "
+              f"(the whole tree: {best(whole_tree) * 1000:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from bench.generator import generate_program
+from lang.build import compile_file
+from lang.cache import CompileCache
+from main import read_raw_program
+
+
+def build_tree(directory: str, files: int, size: int) -> list[str]:
+    paths = list()
+    for index in range(files):
+        path = os.path.join(directory, f"module_{index}.ls")    # caches go in sub directories next to them
+        with open(path, 'w') as file:
+            file.write(generate_program(size, seed=index))
+        paths.append(path)
+    return paths
+
+
+def run(paths: list[str], tree: str, cache: CompileCache | None) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        compile_file(path, "table", tree, cache)
+    return time.perf_counter() - start
+
+
+def hash_only(paths: list[str]) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        hashlib.sha256(read_raw_program(path)).hexdigest()
+    return time.perf_counter() - start
+
+
+def main(args: list[str]) -> None:
+    files = int(args[1]) if len(args) > 1 else 500
+    size = int(args[2]) if len(args) > 2 else 4000
+    with tempfile.TemporaryDirectory() as directory:
+        paths = build_tree(directory, files, size)
+        print(f"{files} files of {size} bytes")
+        print(f"{'run':>16} {'time':>8}")
+        print(f"{'read + hash':>16} {hash_only(paths):>7.3f}s")
+        for tree in ("objects", "arena"):
+            cache = CompileCache(os.path.join(directory, f"cache-{tree}"))
+            print(f"{'no cache ' + tree:>16} {run(paths, tree, None):>7.3f}s")
+            print(f"{'cold ' + tree:>16} {run(paths, tree, cache):>7.3f}s")
+            print(f"{'warm ' + tree:>16} {run(paths, tree, cache):>7.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,76 @@
+import gc
+import io
+import re
+import sys
+import time
+import tracemalloc
+
+from bench.generator import generate_program, generate_repetitive_program
+from lang.emitter import GO_PRELUDE, GoEmitter
+from lang.optimizer import optimize
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.parserUtils import HashConsFactory, NodeFactory, iter_children
+from lang.utils.tokenUtils import TokenIterator
+
+HELPER_CALL = re.compile(r"\bloom[A-Z]\w*\(")
+
+
+def count_nodes(program) -> tuple[int, int]:
+    # (nodes of the tree, distinct node objects), the same unless nodes are shared
+    paths = 0
+    distinct = set()
+    pending = [program]
+    while pending:
+        node = pending.pop()
+        paths += 1
+        distinct.add(id(node))
+        pending.extend(iter_children(node))
+    return paths, len(distinct)
+
+
+def measure_tree(tokens, make_nodes) -> tuple[object, float, int]:
+    # the program, parse time and the memory it keeps (the factory and its table are gone by then)
+    start = time.perf_counter()
+    Parse(TokenIterator(tokens), make_nodes()).parse()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    program = Parse(TokenIterator(tokens), make_nodes()).parse()
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return program, elapsed, memory
+
+
+def helper_calls(tokens, level: int, passes: tuple[str, ...] | None = None) -> tuple[int, float]:
+    program = Parse(TokenIterator(tokens)).parse()
+    start = time.perf_counter()
+    optimize(program, level, passes)
+    elapsed = time.perf_counter() - start
+    buffer = io.StringIO()
+    GoEmitter(buffer).emit(program)
+    return len(HELPER_CALL.findall(buffer.getvalue()[len(GO_PRELUDE):])), elapsed
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    for name, generate in (("generated", generate_program), ("repetitive", generate_repetitive_program)):
+        tokens = TableLexer(generate(size)).tokenize()
+        tree, tree_time, tree_memory = measure_tree(tokens, lambda: NodeFactory)
+        dag, dag_time, dag_memory = measure_tree(tokens, HashConsFactory)
+        paths, _ = count_nodes(tree)
+        _, distinct = count_nodes(dag)
+        print(f"{name}: {size} bytes")
+        print(f"  tree {paths} nodes {tree_memory / 1e6:.1f}MB parse {tree_time:.3f}s, "
+              f"dag {distinct} nodes ({100 - distinct * 100 / paths:.0f}% fewer) {dag_memory / 1e6:.1f}MB "
+              f"({100 - dag_memory * 100 / tree_memory:.0f}% less) parse {dag_time:.3f}s")
+        without, _ = helper_calls(tokens, 2, ("simplify", "dce"))
+        with_cse, elapsed = helper_calls(tokens, 2)
+        print(f"  go helper calls -O2 without cse {without}, with cse {with_cse} "
+              f"({100 - with_cse * 100 / without:.0f}% fewer), optimize {elapsed:.3f}s")
+        del tree, dag
+
+
+if __name__ == "__main__":
+    main(sys.argv)
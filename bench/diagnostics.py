@@ -0,0 +1,62 @@
+import gc
+import random
+import sys
+import time
+
+from bench.generator import generate_program
+from lang import constants
+from lang.exception import LoomSyntaxError
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+
+def best_of(runs: int, function) -> float:
+    times = list()
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def parse_all(tokens, recover: bool) -> Parse:
+    parser = Parse(TokenIterator(tokens), recover=recover)
+    try:
+        parser.parse()
+    except LoomSyntaxError:
+        pass
+    return parser
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    errors = int(args[2]) if len(args) > 2 else 20
+    tokens = TableLexer(generate_program(size)).tokenize()
+    gc.freeze()     # the tokens live on, the collector would walk them during every parse
+    plain = best_of(5, lambda: parse_all(tokens, False))
+    recovering = best_of(5, lambda: parse_all(tokens, True))
+    print(f"{size} bytes, no errors: parse {plain:.3f}s, recovering parse {recovering:.3f}s "
+          f"({(recovering / plain - 1) * 100:+.1f}%)")
+
+    # drops the '=' of some declarations, then fixes them one compile at a time as a plain parse reports them
+    equals = [index for index, token in enumerate(tokens) if token.is_of_type(constants.EQUAL)]
+    broken = sorted(random.Random(0).sample(equals, errors))
+    sources = list()
+    for fixed in range(errors + 1):
+        dropped = set(broken[fixed:])
+        sources.append([token for index, token in enumerate(tokens) if index not in dropped])
+    gc.freeze()
+    start = time.perf_counter()
+    for source in sources:
+        parse_all(source, False)
+    one_by_one = time.perf_counter() - start
+    start = time.perf_counter()
+    found = len(parse_all(sources[0], True).diagnostics)
+    at_once = time.perf_counter() - start
+    print(f"{errors} errors: {len(sources)} plain parses {one_by_one:.3f}s, one recovering parse {at_once:.3f}s "
+          f"found {found}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
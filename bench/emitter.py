@@ -0,0 +1,52 @@
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.generator import generate_program
+from lang.emitter import GoEmitter, emit_file
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+
+def measure(size: int, directory: str) -> None:
+    program = Parse(TokenIterator(TableLexer(generate_program(size)).tokenize())).parse()
+    path = os.path.join(directory, "out.go")
+    times = list()
+    for _ in range(3):
+        start = time.perf_counter()
+        emit_file(program, path)
+        times.append(time.perf_counter() - start)
+    elapsed = min(times)
+    with open(path, 'rb') as file:
+        lines = file.read().count(b"\n")
+    # what emitting keeps alive besides the tree: the output of a few statements, not the whole file
+    tracemalloc.start()
+    emit_file(program, path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # the same code kept in memory as one string, for comparison
+    tracemalloc.start()
+    buffer = io.StringIO()
+    GoEmitter(buffer).emit(program)
+    text = buffer.getvalue()
+    whole = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del text, buffer
+    print(f"{size:>10} {lines:>9} {os.path.getsize(path) / 1e6:>7.1f}MB {elapsed:>7.3f}s "
+          f"{lines / elapsed:>11.0f} {peak / 1e6:>8.2f}MB {whole / 1e6:>8.2f}MB")
+
+
+def main(args: list[str]) -> None:
+    sizes = [int(arg) for arg in args[1:]] or [1_000_000, 4_000_000, 16_000_000]
+    print(f"{'source':>10} {'go lines':>9} {'output':>9} {'emit':>8} {'lines/s':>11} {'peak':>10} {'in memory':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            measure(size, directory)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,44 @@
+import random
+import sys
+import time
+
+from bench.generator import BINARY_OPERATORS
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+
+def generate_operator_program(statements: int, width: int, seed: int = 0) -> str:
+    # one function, every statement a flat chain of `width` binary operators over a, b, c and literals
+    rng = random.Random(seed)
+    lines = ["function operators(a, b, c) {\n"]
+    for _ in range(statements):
+        operands = [rng.choice(["a", "b", "c", str(rng.randint(0, 999))]) for _ in range(width + 1)]
+        expression = operands[0]
+        for operand in operands[1:]:
+            expression += f" {rng.choice(BINARY_OPERATORS)} {operand}"
+        lines.append(f"    {expression};\n")
+    lines.append("}\n")
+    return "".join(lines)
+
+
+def parse_time(program: str, repeat: int = 3) -> float:
+    tokens = TableLexer(program).tokenize()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Parse(TokenIterator(tokens)).parse()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args: list[str]) -> None:
+    statements = int(args[1]) if len(args) > 1 else 20000
+    print(f"{'width':>6} {'parse':>8} {'us/expression':>14}")
+    for width in (0, 4, 16, 64):
+        elapsed = parse_time(generate_operator_program(statements, width))
+        print(f"{width:>6} {elapsed:>7.3f}s {elapsed / statements * 1e6:>14.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,177 @@
+import random
+
+BINARY_OPERATORS = ["+", "-", "*", "/", "<", ">", "<=", ">=", "==", "!="]
+WORDS = ["alpha", "beta", "gamma", "delta", "count", "total", "index", "value", "name", "result"]
+
+
+def generate_program(size: int, seed: int = 0) -> str:
+    # seeded, so every run (and every engine) sees the very same program
+    rng = random.Random(seed)
+    functions: list[str] = list()
+    total = 0
+    while total < size:
+        function = generate_function(rng, len(functions))
+        functions.append(function)
+        total += len(function)
+    return "".join(functions)
+
+
+def generate_function(rng: random.Random, index: int) -> str:
+    params = [f"{rng.choice(WORDS)}_p{i}" for i in range(rng.randint(0, 4))]
+    names = list(params)
+    lines = [f"function fn_{index}({', '.join(params)}) {{\n"]
+    for i in range(rng.randint(2, 12)):
+        choice = rng.random()
+        if choice < 0.6 or not names:
+            name = f"{rng.choice(WORDS)}_{i}"
+            lines.append(f"    var {name} = {generate_expression(rng, names, rng.randint(0, 4))};\n")
+            names.append(name)
+        elif choice < 0.8:
+            lines.append(f"    var text_{i} = {generate_string(rng)};\n")
+        else:
+            lines.append(f"    {generate_expression(rng, names, rng.randint(1, 4))};\n")
+    lines.append(f"    return {generate_expression(rng, names, 1)};\n")
+    lines.append("}\n\n")
+    return "".join(lines)
+
+
+def generate_repetitive_program(size: int, seed: int = 0) -> str:
+    # like generate_program, but every function builds its expressions out of a few subexpressions over its
+    # parameters, the way generated code repeats itself
+    rng = random.Random(seed)
+    functions: list[str] = list()
+    total = 0
+    while total < size:
+        function = generate_repetitive_function(rng, len(functions))
+        functions.append(function)
+        total += len(function)
+    return "".join(functions)
+
+
+def generate_repetitive_function(rng: random.Random, index: int) -> str:
+    params = [f"{rng.choice(WORDS)}_p{i}" for i in range(rng.randint(1, 4))]
+    pool = [f"({generate_expression(rng, params, rng.randint(1, 3))})" for _ in range(rng.randint(2, 4))]
+    lines = [f"function fn_{index}({', '.join(params)}) {{\n"]
+    names = list()
+    for i in range(rng.randint(2, 12)):
+        parts = [rng.choice(pool) for _ in range(rng.randint(1, 3))]
+        name = f"{rng.choice(WORDS)}_{i}"
+        lines.append(f"    var {name} = {f' {rng.choice(BINARY_OPERATORS)} '.join(parts)};\n")
+        names.append(name)
+    lines.append(f"    return {rng.choice(names)} + {rng.choice(pool)};\n")
+    lines.append("}\n\n")
+    return "".join(lines)
+
+
+def generate_expression(rng: random.Random, names: list[str], depth: int) -> str:
+    if depth == 0 or rng.random() < 0.2:
+        if names and rng.random() < 0.6:
+            return rng.choice(names)
+        return str(rng.randint(0, 100000))
+    left = generate_expression(rng, names, depth - 1)
+    right = generate_expression(rng, names, depth - 1)
+    return f"{left} {rng.choice(BINARY_OPERATORS)} {right}"
+
+
+def generate_string(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(1, 12))]
+    if rng.random() < 0.1:
+        return '"' + "\n".join(words) + '"'
+    return '"' + " ".join(words) + '"'
+
+
+def generate_realistic_program(size: int, seed: int = 0) -> str:
+    # globals (numbers, floats, long strings) and functions reading them, with deep parenthesized expressions
+    # and long string literals mixed in, closer to hand written code than generate_program
+    rng = random.Random(seed)
+    chunks: list[str] = list()
+    global_names: list[str] = list()
+    total = 0
+    while total < size:
+        index = len(chunks)
+        if rng.random() < 0.3:
+            name = f"g_{index}"
+            if rng.random() < 0.3:
+                chunk = f"var {name} = {generate_long_string(rng)};\n\n"
+            else:
+                chunk = f"var {name} = {generate_deep_expression(rng, global_names, rng.randint(1, 6))};\n\n"
+            global_names.append(name)
+        else:
+            chunk = generate_realistic_function(rng, index, global_names)
+        chunks.append(chunk)
+        total += len(chunk)
+    return "".join(chunks)
+
+
+def generate_realistic_function(rng: random.Random, index: int, global_names: list[str]) -> str:
+    params = [f"{rng.choice(WORDS)}_p{i}" for i in range(rng.randint(0, 5))]
+    names = params + rng.sample(global_names, min(len(global_names), 4))
+    lines = [f"function fn_{index}({', '.join(params)}) {{\n"]
+    for i in range(rng.randint(2, 20)):
+        choice = rng.random()
+        if choice < 0.65 or not names:
+            name = f"{rng.choice(WORDS)}_{i}"
+            lines.append(f"    var {name} = {generate_deep_expression(rng, names, rng.randint(0, 12))};\n")
+            names.append(name)
+        elif choice < 0.8:
+            lines.append(f"    var text_{i} = {generate_long_string(rng)} + {rng.choice(names)};\n")
+        else:
+            lines.append(f"    {generate_deep_expression(rng, names, rng.randint(1, 8))};\n")
+    lines.append(f"    return {generate_deep_expression(rng, names, rng.randint(0, 4))};\n")
+    lines.append("}\n\n")
+    return "".join(lines)
+
+
+def generate_deep_expression(rng: random.Random, names: list[str], depth: int) -> str:
+    # one side of every operator is a leaf most of the time, so a depth of n is about n operators deep
+    if depth == 0 or rng.random() < 0.1:
+        choice = rng.random()
+        if names and choice < 0.55:
+            return rng.choice(names)
+        if choice < 0.85:
+            return str(rng.randint(0, 100000))
+        return f"{rng.randint(0, 999)}.{rng.randint(0, 999)}"
+    if rng.random() < 0.1:
+        return f"{rng.choice(['-', '!'])}({generate_deep_expression(rng, names, depth - 1)})"
+    deep = f"({generate_deep_expression(rng, names, depth - 1)})"
+    shallow = generate_deep_expression(rng, names, rng.randint(0, 1))
+    parts = (deep, shallow) if rng.random() < 0.5 else (shallow, deep)
+    return f"{parts[0]} {rng.choice(BINARY_OPERATORS)} {parts[1]}"
+
+
+def generate_long_string(rng: random.Random) -> str:
+    return '"' + " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 400))) + '"'
+
+
+def generate_arithmetic_program(functions: int, seed: int = 0) -> str:
+    # functions of three int parameters doing only int arithmetic (+, -, *, '/' by a literal that is not
+    # zero) and a few comparisons, called with ints nothing panics. globals compute the same way from literals
+    rng = random.Random(seed)
+    chunks: list[str] = list()
+    for index in range(functions):
+        global_names = [f"g_{i}" for i in range(index)]
+        chunks.append(f"var g_{index} = {generate_arithmetic(rng, global_names, 4)};\n")
+        names = ["a", "b", "c"]
+        lines = [f"function fn_{index}(a, b, c) {{\n"]
+        for i in range(rng.randint(4, 16)):
+            if rng.random() < 0.15:     # a comparison, its bool is not an operand of the arithmetic
+                lines.append(f"    var v_{i} = {rng.choice(names)} {rng.choice(['<', '>=', '=='])} "
+                             f"{generate_arithmetic(rng, names, 2)};\n")
+                continue
+            lines.append(f"    var v_{i} = {generate_arithmetic(rng, names, rng.randint(2, 5))};\n")
+            names.append(f"v_{i}")
+        lines.append(f"    return {generate_arithmetic(rng, names[-4:], 2)};\n")
+        lines.append("}\n\n")
+        chunks.append("".join(lines))
+    return "".join(chunks)
+
+
+def generate_arithmetic(rng: random.Random, names: list[str], depth: int) -> str:
+    if depth == 0 or rng.random() < 0.15:
+        if names and rng.random() < 0.7:
+            return rng.choice(names)
+        return str(rng.randint(1, 1000))
+    left = generate_arithmetic(rng, names, depth - 1)
+    if rng.random() < 0.15:
+        return f"{left} / {rng.randint(1, 9)}"
+    return f"({left} {rng.choice(['+', '-', '*'])} {generate_arithmetic(rng, names, depth - 1)})"
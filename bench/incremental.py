@@ -0,0 +1,129 @@
+import random
+import re
+import statistics
+import sys
+import time
+
+from bench.generator import generate_program
+from lang.incremental import IncrementalParser
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.parserUtils import iter_children
+from lang.utils.tokenUtils import TokenIterator
+
+SNIPPETS = [";", "}", "{", "(", ")", '"', "'", ".", "\n", " ", "x", "1", "1.5", "==", "=", "-", "!", "+ 2",
+            "var q = 1;\n", "function g(a) {\n return a;\n}\n", "return", "alpha\n"]
+STATEMENTS = ["    var q = 1 + alpha;\n", "var q = \"a\nb\";\n", "q\n;\n", "function g(a) {\n return a\n;\n}\n",
+              "function h() { return 'x\n\ny'; }\n", "-(1 + 2) * 3;\n"]
+NUMBER = re.compile(r"\b[0-9]+\b")
+WORD_BEFORE_OPERATOR = re.compile(r"([a-z_][a-z0-9_]+) [-+*/<>=!]")
+
+
+def signature(program) -> list[tuple]:
+    # the whole tree (kinds, lines, names, values, operators and shape) in pre order, without recursion
+    nodes = list()
+    pending = [program]
+    while pending:
+        node = pending.pop()
+        children = list(iter_children(node))
+        nodes.append((node.kind, getattr(node, "line", None), getattr(node, "name", None),
+                      getattr(node, "value", None), getattr(node, "operator", None),
+                      len(children), len(getattr(node, "param", ()))))
+        pending.extend(reversed(children))
+    return nodes
+
+
+def outcome(parse) -> list[tuple] | tuple:
+    try:
+        return signature(parse())
+    except Exception as err:    # the parser can fail with more than LoomSyntaxError, both sides must agree
+        return type(err).__name__, str(err), getattr(err, "line", None)
+
+
+def full_parse(source: str):
+    return Parse(TokenIterator(TableLexer(source).tokenize())).parse()
+
+
+def random_edit(rng: random.Random, source: str) -> tuple[int, int, str]:
+    # mostly edits that keep the program valid (some of them change the line numbers the lexer counts),
+    # the rest are random insertions and deletions
+    choice = rng.random()
+    if choice < 0.2 and (numbers := list(NUMBER.finditer(source))):
+        matched = rng.choice(numbers)
+        return matched.start(), matched.end(), str(rng.randint(0, 10 ** rng.randint(1, 6)))
+    if choice < 0.3 and (words := list(WORD_BEFORE_OPERATOR.finditer(source))):
+        position = rng.choice(words).end(1)
+        return position, position, "\n"     # a word right before a newline counts a line
+    line_starts = [0] + [matched.end() for matched in re.finditer("\n", source)]
+    start = rng.choice(line_starts)
+    line_end = source.find("\n", start) + 1 or len(source)
+    if choice < 0.4:
+        return start, line_end, ""
+    if choice < 0.55:
+        return start, start, rng.choice(STATEMENTS)
+    position = rng.randint(0, len(source))
+    if choice < 0.85:
+        return position, position, rng.choice(SNIPPETS)
+    return position, min(len(source), position + rng.randint(1, 6)), ""
+
+
+def check(rounds: int, size: int = 4000, seed: int = 0) -> int:
+    # differential test: after every edit the incremental result must equal a full parse, errors included.
+    # edits that break the program (or end it early with a top level '}') are undone right away, checked as
+    # well, so every edit starts on a valid program
+    rng = random.Random(seed)
+    source = generate_program(size, seed)
+    parser = IncrementalParser(source)
+    failures = incremental = applied = 0
+    for _ in range(rounds):
+        start, end, text = random_edit(rng, source)
+        undo = (start, start + len(text), source[start:end])
+        for start, end, text in (start, end, text), undo:
+            source = source[:start] + text + source[end:]
+            expected = outcome(lambda: full_parse(source))
+            if outcome(lambda: parser.edit(start, end, text)) != expected:
+                failures += 1
+                print(f"mismatch after replacing [{start}:{end}] with {text!r}")
+                parser = IncrementalParser("")     # start over from the current source
+                parser.source, parser.program = source, None
+            applied += 1
+            incremental += parser.last_reparsed >= 0
+            if isinstance(expected, list) and parser.complete:
+                break
+    print(f"check: {applied} edits, {incremental} incremental, {'ok' if failures == 0 else f'{failures} mismatches'}")
+    return failures
+
+
+def benchmark(lines: int, edits: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    source = generate_program(lines * 40, seed)     # generated lines are about 37 bytes long
+    source = "".join(source.splitlines(keepends=True)[:lines]).rsplit("function", 1)[0]
+    start = time.perf_counter()
+    full_parse(source)
+    full = time.perf_counter() - start
+    start = time.perf_counter()
+    parser = IncrementalParser(source)
+    initial = time.perf_counter() - start
+    numbers = list(NUMBER.finditer(source))
+    samples = list()
+    for matched in sorted(rng.sample(numbers, edits), key=lambda matched: -matched.start()):
+        text = str(int(matched.group()) * 10 + 1)     # back to front, so the offsets of the next ones stay valid
+        start = time.perf_counter()
+        parser.edit(matched.start(), matched.end(), text)
+        samples.append((time.perf_counter() - start) * 1000)
+    same = signature(parser.program) == signature(full_parse(parser.source))
+    print(f"{source.count(chr(10))} lines, {len(source)} bytes, {len(parser.program.body)} functions")
+    print(f"full parse {full:.3f}s, incremental initial parse {initial:.3f}s")
+    print(f"single line edit: median {statistics.median(samples):.2f}ms, max {max(samples):.2f}ms, "
+          f"{full * 1000 / statistics.median(samples):.0f}x faster than a full parse")
+    print(f"after {edits} edits the tree {'equals' if same else 'DIFFERS from'} a full parse")
+
+
+def main(args: list[str]) -> None:
+    if len(args) > 1 and args[1] == "--check":
+        exit(1 if check(int(args[2]) if len(args) > 2 else 2000) else 0)
+    benchmark(int(args[1]) if len(args) > 1 else 100_000, int(args[2]) if len(args) > 2 else 200)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
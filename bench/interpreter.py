@@ -0,0 +1,122 @@
+import random
+import sys
+import time
+
+from bench.generator import generate_arithmetic_program
+from lang.exception import LoomRuntimeError
+from lang.interpreter import OPERATIONS, UNARY_OPERATIONS, Interpreter
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.parserUtils import (BinaryExpression, BoolLiteral, ExpressionStatement, FloatLiteral,
+                                    FunctionDeclaration, Identifier, IntLiteral, ReturnStatement, StringLiteral,
+                                    UnaryExpression, VariableDeclaration)
+from lang.utils.tokenUtils import TokenIterator
+
+
+class TreeWalker:
+    # the baseline: a plain tree walking interpreter, every evaluation walks the nodes again, finds out what
+    # a node is with isinstance and looks names up in dicts. same runtime operations as lang/interpreter.py
+    def __init__(self, program) -> None:
+        self.program = program
+        self.globals: dict = dict()
+        self.functions: dict[str, FunctionDeclaration] = dict()
+
+    def run(self) -> int:
+        for statement in self.program.body:
+            if isinstance(statement, FunctionDeclaration):
+                self.functions[statement.name] = self.globals[statement.name] = statement
+            elif isinstance(statement, VariableDeclaration):
+                self.globals[statement.identifier.name] = self.evaluate(statement.init, None)
+            elif isinstance(statement, ReturnStatement):
+                value = self.evaluate(statement.expression, None)
+                return value if type(value) is int else 0
+            else:
+                self.evaluate(statement.expression, None)
+        return 0
+
+    def call(self, name: str, *args):
+        function = self.functions[name]
+        names = {param.name: arg for param, arg in zip(function.param, args)}
+        for statement in function.body:
+            if isinstance(statement, VariableDeclaration):
+                value = self.evaluate(statement.init, names)
+                names[statement.identifier.name] = value
+            elif isinstance(statement, ReturnStatement):
+                return self.evaluate(statement.expression, names)
+            else:
+                self.evaluate(statement.expression, names)
+        return None
+
+    def evaluate(self, node, names: dict | None):
+        if isinstance(node, BinaryExpression):
+            return OPERATIONS[node.operator](self.evaluate(node.left, names), self.evaluate(node.right, names))
+        if isinstance(node, Identifier):
+            if names is not None and node.name in names:
+                return names[node.name]
+            return self.globals[node.name]
+        if isinstance(node, (IntLiteral, FloatLiteral, StringLiteral, BoolLiteral)):
+            return node.value
+        if isinstance(node, UnaryExpression):
+            return UNARY_OPERATIONS[node.operator](self.evaluate(node.expression, names))
+        if isinstance(node, ExpressionStatement):
+            return self.evaluate(node.expression, names)
+        raise TypeError(f"can not evaluate a {type(node).__name__}")
+
+
+def outcome(engine, name: str, args: tuple):
+    try:
+        return engine.call(name, *args)
+    except LoomRuntimeError as error:
+        return str(error)
+
+
+def best(run, repeat: int = 5) -> float:
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args: list[str]) -> None:
+    functions = int(args[1]) if len(args) > 1 else 200
+    calls = int(args[2]) if len(args) > 2 else 50
+    source = generate_arithmetic_program(functions)
+    program = Parse(TokenIterator(TableLexer(source).tokenize())).parse()
+    rng = random.Random(0)
+    arguments = [tuple(rng.randint(-10**6, 10**6) for _ in range(3)) for _ in range(calls)]
+    names = [f"fn_{index}" for index in range(functions)]
+    start = time.perf_counter()
+    interpreter = Interpreter(program)
+    compile_time = time.perf_counter() - start
+    walker = TreeWalker(program)
+    status = interpreter.run(), walker.run()
+    values = [interpreter.get(f"g_{index}") for index in range(functions)]
+    mismatches = int(status[0] != status[1]) + sum(value != walker.globals[f"g_{index}"]
+                                                   for index, value in enumerate(values))
+    for name in names:
+        for call_args in arguments[:5]:
+            mismatches += outcome(interpreter, name, call_args) != outcome(walker, name, call_args)
+    print(f"{functions} functions, {len(source)} bytes, compiled to closures in {compile_time * 1000:.1f}ms, "
+          f"{'results agree' if mismatches == 0 else f'{mismatches} results differ'}")
+
+    def call_all(engine):
+        def run():
+            for name in names:
+                for call_args in arguments:
+                    engine.call(name, *call_args)
+        return run
+
+    print(f"{'engine':>12} {'top level':>10} {'calls':>10}")
+    times = dict()
+    for title, engine in (("tree walker", walker), ("closures", interpreter)):
+        times[title] = best(engine.run), best(call_all(engine))
+        print(f"{title:>12} {times[title][0] * 1000:>8.1f}ms {times[title][1]:>9.3f}s")
+    print(f"speedup: top level {times['tree walker'][0] / times['closures'][0]:.1f}x "
+          f"(typed ints), calls {times['tree walker'][1] / times['closures'][1]:.1f}x "
+          f"({functions * calls} calls with int arguments, parameters are untyped)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,60 @@
+import random
+import sys
+import time
+
+from bench.generator import generate_program
+from lang.exception import LoomSyntaxError
+from lang.tokenizer import LEXER_ENGINES
+
+FUZZ_ALPHABET = "abz_09 \n\t\"'.(){};,+-*/!=<>²٣ A"
+
+
+def run_engine(engine: str, program: str) -> list[tuple] | tuple:
+    try:
+        tokens = LEXER_ENGINES[engine](program).tokenize()
+    except LoomSyntaxError as err:
+        return str(err), err.line
+    return [(token.get_raw(), token.get_type(), token.get_line()) for token in tokens]
+
+
+def diff_engines(program: str) -> bool:
+    expected = run_engine("legacy", program)
+    return all(run_engine(engine, program) == expected for engine in LEXER_ENGINES if engine != "legacy")
+
+
+def fuzz(rounds: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    for _ in range(rounds):
+        program = "".join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 40)))
+        if not diff_engines(program):
+            failures += 1
+            print(f"mismatch: {program!r}")
+    return failures
+
+
+def throughput(engine: str, program: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        LEXER_ENGINES[engine](program).tokenize()
+        best = min(best, time.perf_counter() - start)
+    return len(program.encode()) / best / 1e6
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 4_000_000
+    program = generate_program(size)
+    failures = fuzz(20000)
+    if not diff_engines(program):
+        failures += 1
+        print("mismatch on the generated program")
+    print(f"diff: {'ok' if failures == 0 else f'{failures} mismatches'}")
+    for engine in LEXER_ENGINES:
+        print(f"{engine:>8}: {throughput(engine, program):7.2f} MB/s")
+    if failures:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,176 @@
+import json
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from bench.generator import generate_program
+from bench.incremental import NUMBER, random_edit
+from lang.lsp import Document, read_message
+
+URI = "file:///bench.ls"
+NAME = re.compile(r"\b[a-z_][a-z0-9_]*\b")
+TYPED = "var typed_value = 2 * 21;\n"
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    return (f"p50 {statistics.median(samples):6.2f}ms  "
+            f"p99 {samples[max(0, int(len(samples) * 0.99) - 1)]:6.2f}ms  max {samples[-1]:6.2f}ms")
+
+
+def state(document: Document) -> tuple:
+    document.flush()
+    return document.diagnostics(), document.symbols()
+
+
+def check(rounds: int, size: int = 3000, seed: int = 0) -> int:
+    # differential test: a document fed bursts of changes (coalesced into one edit of the parser) must give
+    # the diagnostics and symbols of a document opened on the final text. then every name in the valid
+    # documents must lead to a declaration of that name. the random edits mostly break the program, now and
+    # then it is replaced by a valid one
+    rng = random.Random(seed)
+    text = generate_program(size, seed)
+    document = Document(URI, 0, text)
+    failures = checked = definitions = 0
+    for _ in range(rounds):
+        for _ in range(rng.randint(1, 4)):
+            start, end, new_text = random_edit(rng, document.text)
+            document.change(start, end, new_text)
+        if state(document) != state(Document(URI, 0, document.text)):
+            failures += 1
+            print(f"mismatch after {checked} rounds")
+            document = Document(URI, 0, document.text)
+        checked += 1
+        if document.parser.diagnostics:
+            if rng.random() < 0.3:  # back to a valid program, a change of the whole text
+                document.change(0, len(document.text), generate_program(size, rng.randint(0, 1000)))
+            continue
+        for matched in NAME.finditer(document.text):
+            span = document.definition(matched.start())
+            if span is None:
+                continue    # a keyword, or a name of a statement that does not declare it
+            definitions += 1
+            if document.text[span[0]:span[1]] != matched.group():
+                failures += 1
+                print(f"definition of {matched.group()!r} at {matched.start()} is {document.text[span[0]:span[1]]!r}")
+    print(f"check: {checked} bursts, {definitions} definitions, {'ok' if failures == 0 else f'{failures} failures'}")
+    return failures
+
+
+class Client:
+    # the editor side: json-rpc over the pipes of `main.py --lsp`
+    def __init__(self) -> None:
+        self.process = subprocess.Popen([sys.executable, "main.py", "--lsp"], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+        self.next_id = 0
+        self.version = 0
+        self.publishes = 0
+        self.published: tuple[int, list] | None = None  # the version and diagnostics published last
+
+    def send(self, message: dict) -> None:
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode()
+        self.process.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        self.process.stdin.flush()
+
+    def request(self, method: str, params: dict):
+        self.next_id += 1
+        self.send({"id": self.next_id, "method": method, "params": params})
+        while True:
+            message = self.receive()
+            if message.get("id") == self.next_id:
+                return message.get("result")
+
+    def receive(self) -> dict:
+        message = read_message(self.process.stdout)
+        if not isinstance(message, dict):
+            raise RuntimeError("the language server went away")
+        if message.get("method") == "textDocument/publishDiagnostics":
+            self.publishes += 1
+            self.published = message["params"].get("version"), message["params"]["diagnostics"]
+        return message
+
+    def change(self, start: dict, end: dict, text: str) -> None:
+        self.version += 1
+        self.send({"method": "textDocument/didChange",
+                   "params": {"textDocument": {"uri": URI, "version": self.version},
+                              "contentChanges": [{"range": {"start": start, "end": end}, "text": text}]}})
+
+    def diagnostics(self) -> list:
+        # waits for the diagnostics of the last change (a request may have brought them already)
+        while self.published is None or self.published[0] != self.version:
+            self.receive()
+        return self.published[1]
+
+    def close(self) -> int:
+        self.request("shutdown", {})
+        self.send({"method": "exit"})
+        return self.process.wait()
+
+
+def main(args: list[str]) -> None:
+    if len(args) > 1 and args[1] == "--check":
+        exit(1 if check(int(args[2]) if len(args) > 2 else 300) else 0)
+    size = int(args[1]) if len(args) > 1 else 200_000
+    edits = int(args[2]) if len(args) > 2 else 200
+    rng = random.Random(0)
+    text = generate_program(size)
+    document = Document(URI, 0, text)   # positions for the client
+    client = Client()
+    client.request("initialize", {"capabilities": {}})
+    client.send({"method": "initialized", "params": {}})
+    start = time.perf_counter()
+    client.send({"method": "textDocument/didOpen",
+                 "params": {"textDocument": {"uri": URI, "languageId": "loomscript", "version": 0, "text": text}}})
+    client.diagnostics()
+    opened = time.perf_counter() - start
+
+    def edit(start: int, end: int, new_text: str) -> None:
+        client.change(document.position(start), document.position(end), new_text)
+        document.change(start, end, new_text)
+
+    valid, invalid, symbols, definitions = list(), list(), list(), list()
+    for _ in range(edits):
+        matched = rng.choice(list(NUMBER.finditer(document.text)))
+        start = time.perf_counter()
+        edit(matched.start(), matched.end(), str(rng.randint(0, 9999)))
+        client.diagnostics()
+        valid.append((time.perf_counter() - start) * 1000)
+    position = document.text.find("\nfunction", len(document.text) // 2) + 1
+    for index in range(len(TYPED)):    # a statement typed into the middle, broken until its ';'
+        start = time.perf_counter()
+        edit(position + index, position + index, TYPED[index])
+        errors = client.diagnostics()
+        invalid.append((time.perf_counter() - start) * 1000)
+    for _ in range(edits):
+        matched = rng.choice(list(NUMBER.finditer(document.text)))
+        edit(matched.start(), matched.end(), str(rng.randint(0, 9999)))
+        start = time.perf_counter()
+        client.request("textDocument/documentSymbol", {"textDocument": {"uri": URI}})
+        symbols.append((time.perf_counter() - start) * 1000)
+        client.diagnostics()
+    names = [matched.start() for matched in NAME.finditer(document.text) if matched.group().startswith("alpha")]
+    for offset in rng.sample(names, min(edits, len(names))):
+        start = time.perf_counter()
+        client.request("textDocument/definition", {"textDocument": {"uri": URI}, "position": document.position(offset)})
+        definitions.append((time.perf_counter() - start) * 1000)
+    publishes = client.publishes
+    for index in range(50):     # a burst of keystrokes faster than the debounce delay
+        edit(position + index, position + index, "x")
+    client.diagnostics()
+    burst = client.publishes - publishes
+    status = client.close()
+    print(f"{len(text)} bytes, {text.count(chr(10))} lines, opened in {opened * 1000:.1f}ms, "
+          f"server exited with {status}")
+    print(f"{'valid edit -> diagnostics':>30}  {percentiles(valid)}  (includes the debounce delay)")
+    print(f"{'typing -> diagnostics':>30}  {percentiles(invalid)}  (broken until the last key, "
+          f"{len(errors)} errors at the end)")
+    print(f"{'edit + documentSymbol':>30}  {percentiles(symbols)}  (the request parses the edit)")
+    print(f"{'definition':>30}  {percentiles(definitions)}")
+    print(f"50 changes in a burst, {burst} diagnostics published")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
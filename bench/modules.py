@@ -0,0 +1,178 @@
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+from bench.generator import generate_program
+from bench.incremental import NUMBER
+from lang.modules import build_modules
+
+FUNCTION = re.compile(r"\bfn_")
+
+
+def module_name(layer: int, index: int) -> str:
+    return f"m{layer}_{index}"
+
+
+def generate_module(layer: int, index: int, imports: list[str], size: int, seed: int) -> str:
+    # functions of generate_program under names of their own, and a global over the globals it imports
+    name = module_name(layer, index)
+    lines = [f"import \"../layer{layer - 1}/{imported}\";\n" for imported in imports]
+    lines.append(f"var {name}_value = {' + '.join(f'{imported}_value' for imported in imports) or str(seed)};\n\n")
+    lines.append(FUNCTION.sub(f"{name}_fn_", generate_program(size, seed)))
+    return "".join(lines)
+
+
+def generate_modules(root: str, layers: int, width: int, size: int, seed: int = 0) -> list[str]:
+    # layer k imports up to 3 modules of layer k - 1, the paths of the modules of the last layer (the roots)
+    rng = random.Random(seed)
+    paths = list()
+    for layer in range(layers):
+        os.makedirs(os.path.join(root, f"layer{layer}"), exist_ok=True)
+        paths = list()
+        for index in range(width):
+            imports = [] if layer == 0 else sorted({module_name(layer - 1, rng.randrange(width))
+                                                    for _ in range(rng.randint(1, 3))})
+            path = os.path.join(root, f"layer{layer}", module_name(layer, index) + ".ls")
+            with open(path, 'w') as file:
+                file.write(generate_module(layer, index, imports, size, rng.randrange(1 << 30)))
+            paths.append(path)
+    return paths
+
+
+def edit(path: str, change) -> None:
+    with open(path, 'r') as file:
+        text = file.read()
+    with open(path, 'w') as file:
+        file.write(change(text))
+
+
+def edit_body(rng: random.Random):
+    # another number inside a function: the interface stays the same
+    def change(text: str) -> str:
+        numbers = [matched for matched in NUMBER.finditer(text) if matched.start() > text.find("function")]
+        matched = rng.choice(numbers)
+        return text[:matched.start()] + str(rng.randint(0, 99999)) + text[matched.end():]
+    return change
+
+
+def edit_signature(rng: random.Random):
+    # one more function: every module importing it is compiled again
+    def change(text: str) -> str:
+        name = f"added_{rng.randrange(1 << 30)}"
+        return text + f"function {name}(first, second) {{\n    return first * second;\n}}\n"
+    return change
+
+
+def toggle_global(path: str):
+    # hides the global of a module and brings it back: the modules using it fail, then compile again
+    name = os.path.basename(path)[:-len(".ls")]
+
+    def change(text: str) -> str:
+        if f"var {name}_value =" in text:
+            return text.replace(f"var {name}_value =", f"var {name}_hidden =", 1)
+        return text.replace(f"var {name}_hidden =", f"var {name}_value =", 1)
+    return change
+
+
+def break_syntax(text: str) -> str:
+    return text + "var = 1;\n"
+
+
+def outcome(root: str, report) -> dict:
+    # per module: its errors, or the bytes of its ast file
+    results = dict()
+    for result in report.results:
+        key = os.path.relpath(os.path.abspath(result.path), root)
+        if result.is_ok():
+            with open(result.output, 'rb') as file:
+                results[key] = file.read()
+        else:
+            results[key] = result.diagnostics
+    return results
+
+
+def check(rounds: int, seed: int = 0) -> int:
+    # differential test: after every round of edits (bodies, signatures, globals hidden and back, syntax errors
+    # and their fixes) an incremental build must give what a clean build of a copy of the tree gives
+    rng = random.Random(seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "tree")
+        state = os.path.join(directory, "state.json")
+        roots = generate_modules(root, 4, 5, 1500, seed)
+        modules = [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names
+                   if name.endswith(".ls")]
+        broken: list[tuple[str, str]] = list()
+        build_modules(roots, state, 1)
+        for index in range(rounds):
+            for _ in range(rng.randint(1, 3)):
+                path = rng.choice(modules)
+                choice = rng.random()
+                if broken and choice < 0.3:
+                    fixed, text = broken.pop()
+                    edit(fixed, lambda _: text)
+                elif choice < 0.6:
+                    edit(path, edit_body(rng))
+                elif choice < 0.75:
+                    edit(path, edit_signature(rng))
+                elif choice < 0.85:
+                    edit(path, toggle_global(path))
+                elif not any(path == item for item, _ in broken):
+                    with open(path, 'r') as file:
+                        broken.append((path, file.read()))
+                    edit(path, break_syntax)
+            incremental = outcome(root, build_modules(roots, state, rng.choice((1, 2))))
+            clean_root = os.path.join(directory, f"clean{index}")
+            shutil.copytree(root, clean_root, ignore=shutil.ignore_patterns("*.lsast"))
+            clean_roots = [os.path.join(clean_root, os.path.relpath(path, root)) for path in roots]
+            clean = outcome(clean_root, build_modules(clean_roots, os.path.join(directory, f"clean{index}.json"), 1))
+            if incremental != clean:
+                failures += 1
+                print(f"round {index}: {sorted(key for key in clean if incremental.get(key) != clean[key])}")
+            shutil.rmtree(clean_root)
+    print(f"check: {rounds} rounds, {'ok' if failures == 0 else f'{failures} failures'}")
+    return failures
+
+
+def timed(roots: list[str], state: str, jobs: int):
+    start = time.perf_counter()
+    report = build_modules(roots, state, jobs)
+    return time.perf_counter() - start, report
+
+
+def main(args: list[str]) -> None:
+    if len(args) > 1 and args[1] == "--check":
+        exit(1 if check(int(args[2]) if len(args) > 2 else 30) else 0)
+    layers = int(args[1]) if len(args) > 1 else 5
+    width = int(args[2]) if len(args) > 2 else 40
+    jobs = int(args[3]) if len(args) > 3 else os.cpu_count() or 1
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "tree")
+        state = os.path.join(directory, "state.json")
+        roots = generate_modules(root, layers, width, 8000)
+        size = sum(os.path.getsize(os.path.join(folder, name)) for folder, _, names in os.walk(root) for name in names)
+        cold, report = timed(roots, state, jobs)
+        print(f"{report.modules} modules in {layers} layers, {size} bytes, {jobs} jobs")
+        print(f"{'cold build':>26} {cold * 1000:9.1f}ms  {len(report.compiled)} compiled")
+        noop = min(timed(roots, state, jobs)[0] for _ in range(5))
+        print(f"{'no-op build':>26} {noop * 1000:9.1f}ms  ({cold / noop:.0f}x faster than cold)")
+        leaf = os.path.join(root, "layer0", module_name(0, 0) + ".ls")
+        edit(leaf, edit_body(rng))
+        elapsed, report = timed(roots, state, jobs)
+        print(f"{'body edit in layer 0':>26} {elapsed * 1000:9.1f}ms  {len(report.compiled)} compiled")
+        edit(leaf, edit_signature(rng))
+        elapsed, report = timed(roots, state, jobs)
+        print(f"{'signature edit in layer 0':>26} {elapsed * 1000:9.1f}ms  {len(report.compiled)} compiled "
+              f"(it and the modules importing it)")
+        os.remove(state)
+        elapsed, report = timed(roots, state, jobs)
+        print(f"{'without the state file':>26} {elapsed * 1000:9.1f}ms  {len(report.compiled)} compiled")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
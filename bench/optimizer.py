@@ -0,0 +1,34 @@
+import io
+import re
+import sys
+import time
+
+from bench.generator import generate_program
+from lang.emitter import GO_PRELUDE, GoEmitter
+from lang.optimizer import OPTIMIZATION_LEVELS, optimize
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+HELPER_CALL = re.compile(r"\bloom[A-Z]\w*\(")    # a runtime helper call, what the go program executes
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    tokens = TableLexer(generate_program(size)).tokenize()
+    print(f"{size} bytes of source")
+    print(f"{'level':>5} {'optimize':>9} {'go bytes':>10} {'helper calls':>13} {'statements':>11}")
+    for level in OPTIMIZATION_LEVELS:
+        program = Parse(TokenIterator(tokens)).parse()
+        start = time.perf_counter()
+        optimize(program, level)
+        elapsed = time.perf_counter() - start
+        statements = sum(len(statement.body) if hasattr(statement, "body") else 1 for statement in program.body)
+        buffer = io.StringIO()
+        GoEmitter(buffer).emit(program)
+        code = buffer.getvalue()[len(GO_PRELUDE):]
+        print(f"{level:>5} {elapsed:>8.3f}s {len(code):>10} {len(HELPER_CALL.findall(code)):>13} {statements:>11}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,46 @@
+import sys
+import time
+
+from bench.generator import generate_program
+from bench.incremental import signature
+from lang.build import get_outline
+from lang.parser import Parse
+from lang.tokenizer import TableLexer, TokenStoreLexer
+from lang.utils.tokenUtils import TokenIterator
+
+LEXERS = {
+    "table": TableLexer,
+    "store": TokenStoreLexer
+}
+
+
+def best_of(runs: int, function) -> float:
+    times = list()
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 4_000_000
+    source = generate_program(size)
+    print(f"{len(source)} bytes")
+    print(f"{'lexer':>6} {'lex':>8} {'outline':>8} {'full parse':>11} {'speedup':>8}")
+    for name, lexer in LEXERS.items():
+        tokens = lexer(source).tokenize()
+        lex = best_of(3, lambda: lexer(source).tokenize())
+        outline = best_of(3, lambda: get_outline(Parse(TokenIterator(tokens), lazy=True).parse()))
+        full = best_of(3, lambda: Parse(TokenIterator(tokens)).parse())
+        print(f"{name:>6} {lex:>7.3f}s {outline:>7.3f}s {full:>10.3f}s {full / outline:>7.1f}x")
+        # every body forced gives the tree an eager parse builds
+        lazy = Parse(TokenIterator(tokens), lazy=True).parse()
+        if signature(lazy) != signature(Parse(TokenIterator(tokens)).parse()):
+            print(f"{name}: the lazy tree DIFFERS from an eager parse")
+            exit(1)
+    print(f"{len(get_outline(lazy))} functions, forced lazy trees equal eager ones")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,40 @@
+import pickle
+import sys
+import tempfile
+import time
+
+from bench.cache import build_tree
+from lang.build import compile_all, compile_file, default_jobs
+
+
+def transfer(tree, repeat: int = 50) -> tuple[int, float]:
+    # bytes and microseconds a worker result costs to pickle in the worker and unpickle in the parent
+    data = pickle.dumps(tree)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        pickle.loads(pickle.dumps(tree))
+    return len(data), (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(args: list[str]) -> None:
+    files = int(args[1]) if len(args) > 1 else 400
+    size = int(args[2]) if len(args) > 2 else 8000
+    with tempfile.TemporaryDirectory() as directory:
+        paths = build_tree(directory, files, size)
+        sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))     # pickle recurses through the graph
+        print(f"{files} files of {size} bytes, {default_jobs()} cores available")
+        graph = transfer(compile_file(paths[0], tree_mode="objects").tree)
+        arrays = transfer(compile_file(paths[0], tree_mode="arena").tree.dump())
+        print(f"result per file: node objects {graph[0]} bytes {graph[1]:.0f}us, "
+              f"arena arrays {arrays[0]} bytes {arrays[1]:.0f}us")
+        print(f"{'jobs':>6} {'time':>8} {'files/s':>8}")
+        for jobs in sorted({1, 2, 4, default_jobs()}):
+            start = time.perf_counter()
+            results = compile_all(paths, tree_mode="arena", jobs=jobs)
+            elapsed = time.perf_counter() - start
+            assert all(result.is_ok() for result in results)
+            print(f"{jobs:>6} {elapsed:>7.3f}s {files / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
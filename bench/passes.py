@@ -0,0 +1,102 @@
+import sys
+import time
+
+from bench.generator import generate_program, generate_realistic_program
+from lang.build import TREE_MODES
+from lang.parser import Parse
+from lang.passes import ExpressionDepth, NameUses, NodeStatistics, Pass, PassManager, TreeValidator
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+PASSES = (NodeStatistics, TreeValidator, NameUses, ExpressionDepth)
+
+
+class FunctionSizes(Pass):
+    # statements per function: only handles function declarations, the walk skips every expression
+    def begin(self, program) -> None:
+        self.sizes: dict[str, int] = dict()
+
+    def visit_function_declaration(self, node) -> None:
+        self.sizes[node.name] = len(node.body)
+
+    def finish(self) -> dict[str, int]:
+        return self.sizes
+
+
+class Renamer(Pass):
+    # rewrites every identifier in place, the passes after it must see the new names
+    rewrites = True
+
+    def visit_identifier(self, node) -> None:
+        if not node.name.endswith("_r"):    # a dag identifier is visited once per use
+            node.name += "_r"
+
+    def visit_function_declaration(self, node) -> None:
+        node.name += "_r"
+
+
+def make_passes(count: int) -> list[Pass]:
+    return [PASSES[index % len(PASSES)]() for index in range(count)]
+
+
+def parse(source: str, mode: str):
+    return Parse(TokenIterator(TableLexer(source).tokenize()), TREE_MODES[mode]()).parse()
+
+
+def check(seeds: int) -> int:
+    # differential test: fused passes give the results of one walk per pass, on every tree mode, and a
+    # rewriting pass splits the walk so that the passes after it see its changes
+    failures = 0
+    for seed in range(seeds):
+        source = generate_realistic_program(20_000, seed)
+        for mode in TREE_MODES:
+            program = parse(source, mode)
+            fused = PassManager(make_passes(4) + [FunctionSizes()]).run(program)
+            separate = [PassManager([current]).run(program)[0] for current in make_passes(4) + [FunctionSizes()]]
+            failures += fused != separate
+            if fused[1]:
+                failures += 1
+                print(f"seed {seed}, {mode}: {fused[1][:3]}")
+            if mode == "arena":
+                continue    # read only nodes
+            manager = PassManager([NameUses(), Renamer(), NameUses()])
+            before, _, after = manager.run(program)
+            renamed = {(function and function + "_r", name + "_r"): uses for (function, name), uses in before.items()}
+            failures += len(manager.groups) != 3 or after != renamed
+    print(f"check: {seeds} programs, {len(TREE_MODES)} tree modes, {'ok' if failures == 0 else f'{failures} failures'}")
+    return failures
+
+
+def best(run, repeat: int = 5) -> float:
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args: list[str]) -> None:
+    if len(args) > 1 and args[1] == "--check":
+        exit(1 if check(int(args[2]) if len(args) > 2 else 10) else 0)
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    program = parse(generate_program(size), "objects")
+    manager = PassManager([NodeStatistics()])
+    manager.run(program)
+    print(f"{size} bytes, {manager.visited} nodes")
+    print(f"{'passes':>6} {'separate walks':>15} {'fused':>8} {'speedup':>8}")
+    single = None
+    for count in (1, 2, 4, 8):
+        separate = best(lambda: [PassManager([current]).run(program) for current in make_passes(count)])
+        fused = best(lambda: PassManager(make_passes(count)).run(program))
+        single = single or fused
+        print(f"{count:>6} {separate:>14.3f}s {fused:>7.3f}s {separate / fused:>7.1f}x   "
+              f"(fused {fused / single:.1f}x the cost of one pass)")
+    pruned = best(lambda: PassManager([FunctionSizes()]).run(program))
+    manager = PassManager([FunctionSizes()])
+    manager.run(program)
+    print(f"a pass on functions only: {pruned:.3f}s, {manager.visited} nodes visited")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,69 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.generator import generate_program
+from lang.client import request
+
+
+def percentiles(samples: list[float]) -> str:
+    samples = sorted(samples)
+    return (f"p50 {statistics.median(samples):6.2f}ms  "
+            f"p95 {samples[int(len(samples) * 0.95) - 1]:6.2f}ms  max {samples[-1]:6.2f}ms")
+
+
+def wait_for(socket_path: str) -> None:
+    for _ in range(200):
+        try:
+            request(socket_path, {"command": "ping"})
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("compile server did not start")
+
+
+def process_time(command: list[str], repeat: int) -> list[float]:
+    samples = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 1000
+    repeat = int(args[2]) if len(args) > 2 else 200
+    with tempfile.TemporaryDirectory() as directory:
+        program_path = os.path.join(directory, "small.ls")
+        with open(program_path, 'w') as file:
+            file.write(generate_program(size))
+        socket_path = os.path.join(directory, "compile.sock")
+        server = subprocess.Popen([sys.executable, "main.py", "--serve", "--no-cache", "--socket", socket_path],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            wait_for(socket_path)
+            message = {"command": "compile", "paths": [program_path]}
+            round_trips, compiles = list(), list()
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = request(socket_path, message)
+                round_trips.append((time.perf_counter() - start) * 1000)
+                compiles.append(response["elapsed"])
+            print(f"{size} byte program, {repeat} requests")
+            print(f"{'server compile':>24}  {percentiles(compiles)}")
+            print(f"{'socket round trip':>24}  {percentiles(round_trips)}")
+            client = [sys.executable, "-m", "lang.client", "--socket", socket_path, program_path]
+            print(f"{'python -m lang.client':>24}  {percentiles(process_time(client, repeat // 10))}")
+        finally:
+            request(socket_path, {"command": "stop"})
+            server.wait()
+        direct = [sys.executable, "main.py", "--no-cache", program_path]
+        print(f"{'python main.py':>24}  {percentiles(process_time(direct, repeat // 10))}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench.generator import generate_realistic_program
+from bench.incremental import signature
+from lang.build import compile_file, default_jobs
+from lang.split import CHUNKS_PER_JOB, compile_chunk, compile_split, merge_chunks, split_points
+
+
+def outcome(result) -> tuple:
+    return (signature(result.tree), None) if result.is_ok() else (None, (result.error, result.line))
+
+
+def check(programs: int) -> int:
+    # differential test: a split compile gives what compile_file gives, for small files cut into small chunks,
+    # also where a cut candidate is the very end of the file (a file ending in the keyword, with or without a
+    # newline before it) and where the keyword starts a longer name
+    failures = cases = 0
+    endings = ("", "\nfunction", "\nfunction\n", "\nfunctions", "\nfunction f() {\n}\n")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "split.ls")
+        for seed in range(programs):
+            source = generate_realistic_program(40_000, seed)
+            for ending in endings:
+                with open(path, 'w') as file:
+                    file.write(source + ending)
+                cases += 1
+                expected = outcome(compile_file(path))
+                for jobs in (2, 4):
+                    if outcome(compile_split(path, jobs=jobs, chunk_size=4096)) != expected:
+                        failures += 1
+                        print(f"seed {seed}, ending {ending!r}, {jobs} jobs: split differs from compile_file")
+                data = (source + ending).encode()
+                points = split_points(data, len(data) // 64)
+                cuts = points[1:]
+                if points != sorted(set(points)) or not all(data.startswith(b"function", cut) for cut in cuts):
+                    failures += 1
+                    print(f"seed {seed}, ending {ending!r}: cut points {points[-3:]}")
+    print(f"check: {cases} files, {'ok' if failures == 0 else f'{failures} failures'}")
+    return failures
+
+
+def main(args: list[str]) -> None:
+    if len(args) > 1 and args[1] == "--check":
+        exit(1 if check(int(args[2]) if len(args) > 2 else 5) else 0)
+    size = int(args[1]) if len(args) > 1 else 20_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "split.ls")
+        with open(path, 'w') as file:
+            file.write(generate_realistic_program(size))
+        print(f"{size} bytes, {default_jobs()} cores available")
+        start = time.perf_counter()
+        serial = compile_file(path)
+        serial_time = time.perf_counter() - start
+        print(f"serial compile_file {serial_time:.3f}s")
+        expected = signature(serial.tree)
+        del serial
+        jobs_list = sorted({2, 4, 8, default_jobs()} - {1})
+        # the parts of a split compile only the parent runs: finding the cuts and merging the chunks
+        parts = max(jobs_list) * CHUNKS_PER_JOB
+        with open(path, 'rb') as file:
+            data = file.read()
+        start = time.perf_counter()
+        points = split_points(data, parts)
+        cutting = time.perf_counter() - start
+        ends = points[1:] + [len(data)]
+        with ProcessPoolExecutor(1) as executor:
+            start = time.perf_counter()
+            chunks = list(executor.map(compile_chunk, [path] * len(points), points, ends,
+                                       [end == len(data) for end in ends]))
+            workers = time.perf_counter() - start
+        start = time.perf_counter()
+        merged = merge_chunks(chunks)
+        merging = time.perf_counter() - start
+        assert signature(merged) == expected
+        serial_part = (cutting + merging) / (cutting + merging + workers)
+        print(f"{len(points)} chunks: cutting {cutting:.3f}s, chunks {workers:.3f}s on one worker, merging "
+              f"{merging:.3f}s, the parent is {serial_part * 100:.1f}% of the work")
+        print(f"{'jobs':>6} {'time':>8} {'speedup':>8} {'amdahl':>8}")
+        for jobs in jobs_list:
+            start = time.perf_counter()
+            result = compile_split(path, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            assert signature(result.tree) == expected
+            bound = 1 / (serial_part + (1 - serial_part) / jobs)
+            print(f"{jobs:>6} {elapsed:>7.3f}s {serial_time / elapsed:>7.2f}x {bound:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
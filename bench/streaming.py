@@ -0,0 +1,62 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+from bench.generator import generate_program
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator, TokenStream
+
+from main import load_raw_program, stream_raw_program
+
+SIZES = [1_000_000, 4_000_000, 16_000_000, 32_000_000]
+
+
+def walk(tokens: TokenIterator) -> int:
+    count = 0
+    while tokens.has_token():
+        tokens.move()
+        count += 1
+    return count
+
+
+def generate(size: int, program_path: str) -> None:
+    with open(program_path, "w") as file:
+        file.write(generate_program(size))
+
+
+def measure(mode: str, program_path: str) -> None:
+    if mode == "stream":
+        count = walk(TokenStream(TableLexer(chunks=stream_raw_program(program_path))))
+    else:
+        count = walk(TokenIterator(TableLexer(load_raw_program(program_path)).tokenize()))
+    print(count, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def run(*args: str) -> list[str]:
+    # every step gets its own process, so ru_maxrss never includes the generator or another mode
+    command = [sys.executable, "-m", "bench.streaming", *args]
+    return subprocess.run(command, capture_output=True, text=True, check=True).stdout.split()
+
+
+def main() -> None:
+    print(f"{'size':>10} {'tokens':>10} {'list rss':>10} {'stream rss':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        program_path = os.path.join(directory, "program.ls")
+        for size in SIZES:
+            run("--generate", str(size), program_path)
+            results = {mode: run("--measure", mode, program_path) for mode in ("list", "stream")}
+            tokens = results["stream"][0]
+            list_rss = int(results["list"][1]) // 1024
+            stream_rss = int(results["stream"][1]) // 1024
+            print(f"{size // 1_000_000:>8}MB {tokens:>10} {list_rss:>8}MB {stream_rss:>9}MB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--generate":
+        generate(int(sys.argv[2]), sys.argv[3])
+    elif len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
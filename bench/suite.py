@@ -0,0 +1,170 @@
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.generator import generate_realistic_program
+from lang.build import compile_file, decode_source, emit_result
+from lang.emitter import GoEmitter
+from lang.optimizer import DEFAULT_OPTIMIZATION, optimize
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.parserUtils import iter_children
+from lang.utils.tokenUtils import TokenIterator
+
+RESULTS_FORMAT = 1  # bumped when the layout of the json changes, results of another format are not compared
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+PHASES = ("load", "tokenize", "parse", "optimize", "emit", "compile")
+METRICS = ("seconds", "peak_bytes")     # what --baseline compares, both lower is better
+MIN_DIFFERENCE = {"seconds": 0.002, "peak_bytes": 64 * 1024}   # below this a change is noise, whatever the ratio
+MIN_MEASURED = 0.5  # seconds, a short phase runs more than repeat times until its runs add up to this
+MAX_RUNS = 1000
+
+
+def count_nodes(program) -> int:
+    nodes = 0
+    pending = [program]
+    while pending:
+        node = pending.pop()
+        nodes += 1
+        pending.extend(iter_children(node))
+    return nodes
+
+
+def measure(repeat: int, run, prepare=lambda: None) -> tuple[float, int]:
+    # (best time of at least repeat runs, peak memory of one more run under tracemalloc). prepare builds the input of
+    # a run outside of the measurement, the optimizer and the emitter change or consume their tree. what is
+    # alive before a run is frozen, the collector only walks what the run allocates (otherwise a phase gets
+    # slower with everything else the process holds)
+    times = list()
+    while len(times) < repeat or (sum(times) < MIN_MEASURED and len(times) < MAX_RUNS):
+        argument = prepare()
+        gc.collect()
+        gc.freeze()
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+        gc.unfreeze()
+    argument = prepare()
+    gc.collect()
+    tracemalloc.start()
+    run(argument)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def read_source(path: str) -> str:
+    with open(path, 'rb') as file:
+        return decode_source(file.read())
+
+
+def emit(program) -> None:
+    GoEmitter(io.StringIO()).emit(program)
+
+
+def run_size(size: int, seed: int, repeat: int, directory: str) -> dict:
+    source = generate_realistic_program(size, seed)
+    path = os.path.join(directory, f"suite_{size}.ls")
+    with open(path, 'w') as file:
+        file.write(source)
+    tokens = TableLexer(source).tokenize()
+
+    def parse():
+        return Parse(TokenIterator(tokens)).parse()
+
+    nodes = count_nodes(parse())
+    phases = {
+        "load": measure(repeat, lambda _: read_source(path)),
+        "tokenize": measure(repeat, lambda _: TableLexer(source).tokenize()),
+        "parse": measure(repeat, lambda _: parse()),
+        "optimize": measure(repeat, lambda program: optimize(program, DEFAULT_OPTIMIZATION), parse),
+        "emit": measure(repeat, emit, lambda: optimize(parse(), DEFAULT_OPTIMIZATION)),
+        # what `main.py --emit go --no-cache` does with one file, reading it to writing the go file
+        "compile": measure(repeat, lambda _: emit_result(compile_file(path))),
+    }
+    results = {"bytes": len(source), "tokens": len(tokens), "nodes": nodes}
+    for phase, (seconds, peak) in phases.items():
+        results[phase] = {"seconds": seconds, "peak_bytes": peak, "bytes_per_second": len(source) / seconds}
+    results["tokenize"]["tokens_per_second"] = len(tokens) / phases["tokenize"][0]
+    results["parse"]["nodes_per_second"] = nodes / phases["parse"][0]
+    return results
+
+
+def run_suite(sizes: list[int], seed: int, repeat: int) -> dict:
+    results = {"format": RESULTS_FORMAT, "python": platform.python_version(), "platform": platform.platform(),
+               "seed": seed, "repeat": repeat, "sizes": dict()}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            results["sizes"][str(size)] = run_size(size, seed, repeat, directory)
+    return results
+
+
+def print_results(results: dict) -> None:
+    print(f"{'size':>10} {'phase':>9} {'time':>9} {'MB/s':>8} {'peak':>9} {'per second':>22}")
+    for size, phases in results["sizes"].items():
+        for phase in PHASES:
+            measured = phases[phase]
+            rate = ""
+            if "tokens_per_second" in measured:
+                rate = f"{measured['tokens_per_second']:>12.0f} tokens"
+            elif "nodes_per_second" in measured:
+                rate = f"{measured['nodes_per_second']:>12.0f} nodes"
+            print(f"{size:>10} {phase:>9} {measured['seconds']:>8.4f}s {measured['bytes_per_second'] / 1e6:>8.2f} "
+                  f"{measured['peak_bytes'] / 1e6:>7.2f}MB {rate:>22}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # the (size, phase, metric) that got worse than baseline by more than threshold (0.1 is 10%)
+    if baseline.get("format") != results["format"]:
+        raise ValueError(f"baseline has results format {baseline.get('format')}, not {results['format']}")
+    regressions = list()
+    for size, phases in results["sizes"].items():
+        base_phases = baseline["sizes"].get(size)
+        if base_phases is None:
+            continue
+        for phase in PHASES:
+            if phase not in base_phases:
+                continue
+            for metric in METRICS:
+                old, new = base_phases[phase][metric], phases[phase][metric]
+                if new - old > MIN_DIFFERENCE[metric] and new > old * (1 + threshold):
+                    regressions.append(f"{size:>10} {phase:>9} {metric:>10} {old:.6g} -> {new:.6g} "
+                                       f"({(new / old - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main(args: list[str]) -> None:
+    arg_parser = argparse.ArgumentParser(prog="python -m bench.suite")
+    arg_parser.add_argument("--sizes", type=lambda text: [int(size) for size in text.split(",")], default=DEFAULT_SIZES,
+                            help="source sizes in bytes, comma separated")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--repeat", type=int, default=5, help="runs per phase, the best one counts")
+    arg_parser.add_argument("--output", help="write the results as json")
+    arg_parser.add_argument("--baseline", help="results json of an earlier run, exit 1 when a phase regressed")
+    arg_parser.add_argument("--threshold", type=float, default=0.25, help="allowed regression, 0.25 is 25%%")
+    options = arg_parser.parse_args(args[1:])
+    results = run_suite(options.sizes, options.seed, options.repeat)
+    print_results(results)
+    if options.output is not None:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=1)
+    if options.baseline is not None:
+        with open(options.baseline) as file:
+            regressions = compare(results, json.load(file), options.threshold)
+        if regressions:
+            print(f"regressed by more than {options.threshold * 100:.0f}%:")
+            for line in regressions:
+                print(line)
+            exit(1)
+        print(f"no phase regressed by more than {options.threshold * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
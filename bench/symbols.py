@@ -0,0 +1,46 @@
+import random
+import sys
+import time
+
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+
+def generate_wide_function(locals_count: int, seed: int = 0) -> str:
+    # one function declaring locals_count locals, each reading two earlier ones (and a global)
+    rng = random.Random(seed)
+    lines = ["var base = 1;\n", "function wide(first) {\n", "    var local_0 = first + base;\n"]
+    for index in range(1, locals_count):
+        lines.append(f"    var local_{index} = local_{rng.randrange(index)} + local_{rng.randrange(index)} * base;\n")
+    lines.append(f"    return local_{locals_count - 1};\n}}\n")
+    return "".join(lines)
+
+
+def best_of(runs: int, function) -> float:
+    times = list()
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(args: list[str]) -> None:
+    counts = [int(arg) for arg in args[1:]] or [100, 1_000, 10_000, 100_000]
+    print(f"{'locals':>8} {'parse/local':>12} {'lookup':>8} {'list scan':>10}")
+    for count in counts:
+        tokens = TableLexer(generate_wide_function(count)).tokenize()
+        parse = best_of(3, lambda: Parse(TokenIterator(tokens)).parse())
+        # name lookups against the filled function scope, and the same names searched in a list of them
+        scope = Parse(TokenIterator(tokens)).parse().symbols.functions["wide"]
+        rng = random.Random(1)
+        names = [f"local_{rng.randrange(count)}" for _ in range(1000)] + ["base"] * 100
+        lookup = best_of(3, lambda: [scope.lookup(name) for name in names]) / len(names)
+        declared = list(scope.symbols)
+        scan = best_of(3, lambda: [name in declared for name in names[:100]]) / 100
+        print(f"{count:>8} {parse / count * 1e6:>10.2f}us {lookup * 1e9:>6.0f}ns {scan * 1e9:>8.0f}ns")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,45 @@
+import sys
+import time
+import tracemalloc
+
+from bench.generator import generate_program
+from lang.parser import Parse
+from lang.tokenizer import TableLexer, TokenStoreLexer
+from lang.utils.tokenUtils import TokenIterator
+
+TOKEN_STORES = {
+    "objects": TableLexer,
+    "store": TokenStoreLexer
+}
+
+
+def bytes_per_token(lexer: type, program: str) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tokens = lexer(program).tokenize()
+    # the store keeps a copy of the program (with the trailing "\n"), charge it to the tokens as well
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(tokens)
+
+
+def parse_time(lexer: type, program: str, repeat: int = 3) -> float:
+    tokens = lexer(program).tokenize()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Parse(TokenIterator(tokens)).parse()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    program = generate_program(size)
+    print(f"{'store':>8} {'bytes/token':>12} {'parse':>8}")
+    for name, lexer in TOKEN_STORES.items():
+        print(f"{name:>8} {bytes_per_token(lexer, program):>12.1f} {parse_time(lexer, program):>7.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
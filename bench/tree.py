@@ -0,0 +1,48 @@
+import sys
+import time
+import tracemalloc
+
+from bench.generator import generate_program
+from lang.build import TREE_MODES
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.parserUtils import NodeVisitor
+from lang.utils.tokenUtils import TokenIterator
+
+
+class NodeCounter(NodeVisitor):
+    def __init__(self) -> None:
+        self.count = 0
+
+    def generic_visit(self, node) -> None:
+        self.count += 1
+        super().generic_visit(node)
+
+
+def measure(mode: str, tokens: list) -> tuple[int, float, float, float]:
+    tracemalloc.start()
+    program = Parse(TokenIterator(tokens), TREE_MODES[mode]()).parse()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del program
+    start = time.perf_counter()
+    program = Parse(TokenIterator(tokens), TREE_MODES[mode]()).parse()
+    build = time.perf_counter() - start
+    counter = NodeCounter()
+    start = time.perf_counter()
+    counter.visit(program)
+    traverse = time.perf_counter() - start
+    return counter.count, memory / counter.count, build, traverse
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    tokens = TableLexer(generate_program(size)).tokenize()
+    print(f"{'mode':>8} {'nodes':>8} {'bytes/node':>11} {'build':>8} {'traverse':>9}")
+    for mode in TREE_MODES:
+        nodes, per_node, build, traverse = measure(mode, tokens)
+        print(f"{mode:>8} {nodes:>8} {per_node:>11.1f} {build:>7.3f}s {traverse:>8.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,37 @@
+import io
+import re
+import sys
+import time
+
+from bench.generator import generate_program, generate_repetitive_program
+from lang.emitter import GO_PRELUDE, GoEmitter
+from lang.inference import infer_types
+from lang.optimizer import optimize
+from lang.parser import Parse
+from lang.tokenizer import TableLexer
+from lang.utils.tokenUtils import TokenIterator
+
+DECLARATION = re.compile(r"^\s*var \w+ (\w+)", re.MULTILINE)
+HELPER_CALL = re.compile(r"\bloom[A-Z]\w*\(")
+ASSERTION = re.compile(r"\)\.\((?:int64|float64|string|bool)\)")
+
+
+def main(args: list[str]) -> None:
+    size = int(args[1]) if len(args) > 1 else 2_000_000
+    for name, generate in (("generated", generate_program), ("repetitive", generate_repetitive_program)):
+        program = optimize(Parse(TokenIterator(TableLexer(generate(size)).tokenize())).parse(), 1)
+        start = time.perf_counter()
+        infer_types(program)
+        elapsed = time.perf_counter() - start
+        buffer = io.StringIO()
+        GoEmitter(buffer).emit(program)
+        code = buffer.getvalue()[len(GO_PRELUDE):]
+        declarations = DECLARATION.findall(code)
+        typed = sum(go_type != "any" for go_type in declarations)
+        print(f"{name}: {size} bytes, inference {elapsed:.3f}s")
+        print(f"  declarations {len(declarations)}, typed {typed} ({typed * 100 / len(declarations):.0f}%), "
+              f"helper calls {len(HELPER_CALL.findall(code))}, type assertions {len(ASSERTION.findall(code))}")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,319 @@
+import io
+import json
+import os
+from functools import partial
+
+from lang.cache import MAX_CACHED_OUTPUT, CacheEntry, CompileCache
+from lang.emitter import emit_file, write_code
+from lang.exception import LoomSyntaxError
+from lang.optimizer import DEFAULT_OPTIMIZATION, optimize
+from lang.parser import Parse
+from lang.stats import NO_STATS, Recorder, token_types
+from lang.tokenizer import LEXER_ENGINES
+from lang.utils.arenaUtils import ArenaBuilder, ArenaProgram, arena_to_objects
+from lang.utils.astFileUtils import write_program
+from lang.utils.parserUtils import FunctionDeclaration, HashConsFactory, NodeFactory, Program
+from lang.utils.tokenUtils import TokenIterator
+
+SOURCE_SUFFIX = ".ls"
+OUTPUT_SUFFIX = ".go"
+AST_SUFFIX = ".lsast"
+# how each --tree mode builds its nodes: node objects, the arena arrays, or node objects sharing every
+# repeated expression
+TREE_MODES = {
+    "objects": lambda: NodeFactory,
+    "arena": ArenaBuilder,
+    "dag": HashConsFactory
+}
+ERROR_FORMATS = ("text", "json")   # text: <path>:<line>: error: <message>, json: one object per line
+
+
+class CompileResult:
+    # outcome of one source file: the tree (or the go file it was written to), or the error that stopped it
+    # (line is None when it is not a syntax error). a recovering parse keeps every (line, error) it found in
+    # diagnostics, error and line are the first of them. results coming back from a worker hold
+    # ArenaProgram.dump() until load()
+    __slots__ = ("path", "tree", "error", "line", "output", "diagnostics", "stats")
+
+    def __init__(self, path: str, tree=None, error: str | None = None, line: int | None = None,
+                 output: str | None = None, diagnostics: list[tuple[int | None, str]] | None = None) -> None:
+        self.path = path
+        self.tree = tree
+        self.error = error
+        self.line = line
+        self.output = output
+        self.diagnostics = diagnostics
+        self.stats: tuple | None = None     # Recorder.dump() of the worker that compiled it, if it recorded
+
+    @classmethod
+    def from_errors(cls, path: str, errors: list[LoomSyntaxError]) -> "CompileResult":
+        return cls(path, error=str(errors[0]), line=errors[0].line,
+                   diagnostics=[(err.line, str(err)) for err in errors])
+
+    def is_ok(self) -> bool:
+        return self.error is None
+
+    def get_diagnostic(self, error_format: str = "text") -> str:
+        return format_diagnostic(self.path, self.line, self.error, error_format)
+
+    def get_diagnostics(self, error_format: str = "text") -> list[str]:
+        if self.diagnostics is None:
+            return [self.get_diagnostic(error_format)]
+        return [format_diagnostic(self.path, line, error, error_format) for line, error in self.diagnostics]
+
+    def load(self, tree_mode: str = "objects") -> "CompileResult":
+        if isinstance(self.tree, tuple):
+            program = ArenaProgram.load(self.tree)
+            self.tree = program if tree_mode == "arena" else arena_to_objects(program, TREE_MODES[tree_mode]())
+        return self
+
+
+def format_diagnostic(path: str, line: int | None, error: str, error_format: str = "text") -> str:
+    if error_format == "json":
+        return json.dumps({"path": path, "line": line, "severity": "error", "message": error})
+    if line is not None:
+        return f"{path}:{line}: error: {error}"
+    return f"{path}: error: {error}"
+
+
+def report(results: list[CompileResult], error_format: str = "text") -> tuple[list[str], list[str]]:
+    # (output lines, diagnostic lines), trees are printed with their path once there is more than one file
+    output: list[str] = list()
+    diagnostics: list[str] = list()
+    for result in results:
+        if not result.is_ok():
+            diagnostics.extend(result.get_diagnostics(error_format))
+        elif result.output is not None:
+            continue    # nothing to print, the go code is in result.output
+        elif len(results) == 1:
+            output.append(str(result.tree))
+        else:
+            output.append(f"{result.path}: {result.tree}")
+    return output, diagnostics
+
+
+def default_jobs() -> int:
+    try:
+        return len(os.sched_getaffinity(0))     # cores this process may run on, not the whole machine
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def collect_sources(paths: list[str]) -> list[str]:
+    # files as given, directories walked for .ls files in sorted order, every file once
+    sources: list[str] = list()
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = list()
+            for directory, directories, files in os.walk(path):
+                directories.sort()
+                found.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith(SOURCE_SUFFIX))
+        else:
+            found = [path]
+        for source in found:
+            if os.path.normpath(source) not in seen:
+                seen.add(os.path.normpath(source))
+                sources.append(source)
+    return sources
+
+
+def output_path(program_path: str, suffix: str = OUTPUT_SUFFIX) -> str:
+    root, extension = os.path.splitext(program_path)
+    return (root if extension == SOURCE_SUFFIX else program_path) + suffix
+
+
+def decode_source(raw_program: bytes) -> str:
+    # the same text open(path, 'r') reads: locale encoding, universal newlines
+    return io.TextIOWrapper(io.BytesIO(raw_program)).read()
+
+
+def compile_file(program_path: str, lexer: str = "table", tree_mode: str = "objects",
+                 cache: CompileCache | None = None, recover: bool = False,
+                 stats: Recorder | None = None, emit: int | None = None) -> CompileResult:
+    # unchanged sources (same bytes, same compiler version) come out of the cache without lexing or parsing.
+    # with recover every syntax error of the file is reported, not only the first (see Parse). stats records
+    # the phases (lang/stats.py). with emit (an optimization level, tree_mode objects) the go code is written
+    # next to the file instead (see emit_result) and kept in the cache entry per level, up to
+    # MAX_CACHED_OUTPUT: an unchanged source is written out of the cache without decoding, optimizing or
+    # emitting its tree. the go file is always streamed, it is read back for the entry once it is written
+    recorder = stats if stats is not None else NO_STATS
+    try:
+        with recorder.phase("load", program_path):
+            with open(program_path, 'rb') as file:
+                raw_program = file.read()
+        nodes = None if tree_mode == "arena" else TREE_MODES[tree_mode]()
+        entry = None
+        if cache is not None:
+            with recorder.phase("cache", program_path):
+                key = cache.key(raw_program)
+                entry = cache.load(key)
+                hit = entry is not None
+                code = entry.get_output(emit) if entry is not None and emit is not None else None
+                tree = entry.get_tree(nodes) if entry is not None and code is None else None
+            if entry is not None and stats is not None:     # counted like a compile, from the entry
+                if entry.token_types is None:   # stored by a compile without stats, counted once and kept
+                    with recorder.phase("tokenize", program_path):
+                        tokens = LEXER_ENGINES[lexer](decode_source(raw_program)).tokenize()
+                    entry.token_types = dict(token_types(tokens))
+                    with recorder.phase("cache", program_path):
+                        cache.store(key, entry)
+                recorder.count_token_types(entry.token_types)
+                recorder.count_tree(tree if tree is not None else entry.get_tree(), program_path)
+            if code is not None:
+                return write_code_result(program_path, code, recorder)
+        if entry is None:
+            with recorder.phase("tokenize", program_path):
+                tokens = LEXER_ENGINES[lexer](decode_source(raw_program)).tokenize()
+            types = token_types(tokens) if cache is not None and stats is not None else None
+            if types is not None:
+                recorder.count_token_types(types)
+            else:
+                recorder.count_tokens(tokens)
+            with recorder.phase("parse", program_path):
+                # cache entries hold the arena encoding
+                parser = Parse(TokenIterator(tokens), TREE_MODES[tree_mode]() if cache is None else ArenaBuilder(),
+                               recover=recover)
+                tree = parser.parse()
+            if parser.diagnostics:
+                return CompileResult.from_errors(program_path, parser.diagnostics)
+            recorder.count_tree(tree, program_path)
+            if cache is None:
+                result = CompileResult(program_path, tree)
+                return result if emit is None else emit_result(result, emit, stats)
+            with recorder.phase("cache", program_path):
+                entry = CacheEntry.from_compile(tree, types)
+                if emit is None:
+                    cache.store(key, entry)
+                if nodes is not None:
+                    symbols, tree = tree.symbols, arena_to_objects(tree, nodes)
+                    tree.symbols = symbols
+        if emit is None:
+            return CompileResult(program_path, tree)
+        with recorder.phase("optimize", program_path):
+            program = optimize(tree, emit)
+        with recorder.phase("emit", program_path):
+            emit_file(program, output_path(program_path))
+        with recorder.phase("cache", program_path):
+            code = read_code(output_path(program_path))
+            if code is not None:
+                cache.store(key, entry.with_output(emit, code))
+            elif not hit:
+                cache.store(key, entry)
+        return CompileResult(program_path, output=output_path(program_path))
+    except LoomSyntaxError as err:
+        return CompileResult(program_path, error=str(err), line=err.line)
+    except FileNotFoundError:
+        return CompileResult(program_path, error="file not found")
+    except (OSError, UnicodeDecodeError) as err:
+        return CompileResult(program_path, error=str(err))
+
+
+def write_code_result(program_path: str, code: str, recorder) -> CompileResult:
+    with recorder.phase("emit", program_path):
+        write_code(code, output_path(program_path))
+    return CompileResult(program_path, output=output_path(program_path))
+
+
+def read_code(path: str) -> str | None:
+    # the go code just written to path for the cache entry, None when it is larger than MAX_CACHED_OUTPUT
+    if os.path.getsize(path) > MAX_CACHED_OUTPUT:
+        return None
+    with open(path, 'r', encoding="utf-8", newline="") as file:
+        return file.read()
+
+
+def emit_result(result: CompileResult, optimization: int = DEFAULT_OPTIMIZATION,
+                stats: Recorder | None = None) -> CompileResult:
+    # optimizes the tree of a compiled file and writes its go code next to it, the tree is dropped after
+    if not result.is_ok():
+        return result
+    recorder = stats if stats is not None else NO_STATS
+    try:
+        with recorder.phase("optimize", result.path):
+            program = optimize(result.tree, optimization)
+        with recorder.phase("emit", result.path):
+            emit_file(program, output_path(result.path))
+    except LoomSyntaxError as err:
+        return CompileResult(result.path, error=str(err), line=err.line)
+    except OSError as err:
+        return CompileResult(result.path, error=str(err))
+    return CompileResult(result.path, output=output_path(result.path))
+
+
+def write_ast_result(result: CompileResult) -> CompileResult:
+    # writes the tree of a compiled file as it was parsed to <name>.lsast (lang/utils/astFileUtils.py)
+    if not result.is_ok():
+        return result
+    try:
+        write_program(result.tree, output_path(result.path, AST_SUFFIX))
+    except OSError as err:
+        return CompileResult(result.path, error=str(err))
+    return CompileResult(result.path, output=output_path(result.path, AST_SUFFIX))
+
+
+def outline_file(program_path: str, lexer: str = "table") -> CompileResult:
+    # parses a file with its function bodies skipped, errors that are only inside bodies are not reported
+    try:
+        with open(program_path, 'rb') as file:
+            tokens = LEXER_ENGINES[lexer](decode_source(file.read())).tokenize()
+        return CompileResult(program_path, Parse(TokenIterator(tokens), lazy=True).parse())
+    except LoomSyntaxError as err:
+        return CompileResult(program_path, error=str(err), line=err.line)
+    except FileNotFoundError:
+        return CompileResult(program_path, error="file not found")
+    except (OSError, UnicodeDecodeError) as err:
+        return CompileResult(program_path, error=str(err))
+
+
+def get_outline(program: Program) -> list[tuple[int, str]]:
+    # (line, signature) of every top level function, reading name and params leaves a lazy body alone
+    return [(statement.line, f"{statement.name}({', '.join(param.name for param in statement.param)})")
+            for statement in program.body if isinstance(statement, FunctionDeclaration)]
+
+
+def compile_job(program_path: str, lexer: str, cache_dir: str | None, emit: bool = False,
+                optimization: int = DEFAULT_OPTIMIZATION, recover: bool = False, stats: bool = False,
+                trace_memory: bool = False) -> CompileResult:
+    # runs in a worker, the tree goes back as the arena arrays (a few bytes objects) instead of a pickled graph.
+    # with stats the phases are recorded in the worker and go back in result.stats
+    cache = CompileCache(cache_dir) if cache_dir is not None else None
+    recorder = Recorder(trace_memory) if stats else None
+    if emit:    # the worker writes the go file, only the path goes back
+        result = compile_file(program_path, lexer, "objects", cache, recover, recorder, optimization)
+    else:
+        result = compile_file(program_path, lexer, "arena", cache, recover, recorder)
+        if result.tree is not None:
+            result.tree = result.tree.dump()
+    if recorder is not None:
+        result.stats = recorder.dump()
+    return result
+
+
+def compile_all(program_paths: list[str], lexer: str = "table", tree_mode: str = "objects",
+                cache_dir: str | None = None, jobs: int | None = None, emit: bool = False,
+                optimization: int = DEFAULT_OPTIMIZATION, recover: bool = False,
+                stats: Recorder | None = None) -> list[CompileResult]:
+    # results come back in the order of program_paths, whatever order the workers finish in. with emit the
+    # go code of every file is written next to it (see emit_result) instead of returning the trees. the phases
+    # workers record are merged into stats, their hooks and profiles only run in the process itself
+    jobs = min(jobs or default_jobs(), len(program_paths))
+    if jobs <= 1:
+        cache = CompileCache(cache_dir) if cache_dir is not None else None
+        if emit:
+            return [compile_file(path, lexer, "objects", cache, recover, stats, optimization)
+                    for path in program_paths]
+        return [compile_file(path, lexer, tree_mode, cache, recover, stats) for path in program_paths]
+    chunk_size = max(1, len(program_paths) // (jobs * 8))   # fewer round trips, still balanced at the end
+    from concurrent.futures import ProcessPoolExecutor  # a single file never pays for importing multiprocessing
+    with ProcessPoolExecutor(jobs) as executor:
+        results = executor.map(partial(compile_job, lexer=lexer, cache_dir=cache_dir, emit=emit,
+                                       optimization=optimization, recover=recover, stats=stats is not None,
+                                       trace_memory=stats is not None and stats.trace_memory), program_paths,
+                               chunksize=chunk_size)
+        results = [result.load(tree_mode) for result in results]
+    if stats is not None:
+        for result in results:
+            stats.merge(result.stats)
+            result.stats = None
+    return results
@@ -0,0 +1,150 @@
+import hashlib
+import marshal
+import os
+import tempfile
+import time
+
+from lang.utils.arenaUtils import ArenaProgram, arena_to_objects
+from lang.utils.parserUtils import Program
+
+COMPILER_VERSION = Program().version
+# layout of an entry, the checks it passed and the go runtime of its output, part of the key so old entries are
+# never read
+CACHE_FORMAT = 6
+DEFAULT_CACHE_SIZE = 256 << 20
+MAX_CACHED_OUTPUT = 4 << 20     # bytes of go code an entry keeps per level, larger files are emitted every time
+BUCKETS = 16    # entries are spread over <dir>/0 .. <dir>/f by the first hex digit of their key
+STALE_TEMP_AGE = 3600   # seconds before a temp file is taken as left behind by a killed job
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "loomscript")
+
+
+class CacheEntry:
+    # everything compiled from one source, kept in its serialized form and only decoded when asked for: the
+    # tree, and the go code of every optimization level it was emitted at (--emit go). of the tokens only
+    # their number by type, for the stats of a hit (lang/stats.py), None until a compile with stats counts them
+    __slots__ = ("tree", "token_types", "output")
+
+    def __init__(self, tree: tuple, token_types: dict[int, int] | None,
+                 output: dict[int, str] | None = None) -> None:
+        self.tree = tree        # ArenaProgram.dump()
+        self.token_types = token_types
+        self.output = output if output is not None else dict()  # optimization level -> go code
+
+    @classmethod
+    def from_compile(cls, program: ArenaProgram, token_types: dict[int, int] | None) -> "CacheEntry":
+        return cls(program.dump(), dict(token_types) if token_types is not None else None)
+
+    def get_output(self, optimization: int) -> str | None:
+        return self.output.get(optimization)
+
+    def with_output(self, optimization: int, code: str) -> "CacheEntry":
+        return CacheEntry(self.tree, self.token_types, {**self.output, optimization: code})
+
+    def get_tree(self, nodes=None):
+        # the stored arena as is, or rebuilt through nodes (NodeFactory for node objects) when given
+        program = ArenaProgram.load(self.tree)
+        return program if nodes is None else arena_to_objects(program, nodes)
+
+
+class CompileCache:
+    # content addressed: the key is the hash of the source bytes and the compiler version, so an entry
+    # never goes stale, it only stops being asked for. every write goes to a temp file renamed over the
+    # entry, parallel jobs only ever see whole entries. least recently used entries (a hit refreshes the
+    # mtime) are evicted per bucket, so a store only scans 1/BUCKETS of the cache
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, source: bytes) -> str:
+        digest = hashlib.sha256(f"loomscript {COMPILER_VERSION} {CACHE_FORMAT}\0".encode())
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:1], key[1:])
+
+    def load(self, key: str) -> CacheEntry | None:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        try:
+            tree, token_types, output = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            self.__remove(path)     # torn by a crash or a full disk, compile it again
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return CacheEntry(tree, token_types, output)
+
+    def store(self, key: str, entry: CacheEntry) -> None:
+        # a cache that can not be written (read only, disk full) only costs the next run a compile
+        path = self.path(key)
+        data = marshal.dumps((entry.tree, entry.token_types, entry.output))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            self.__remove(temp_path)
+            return
+        self.evict(os.path.dirname(path), path)
+
+    def evict(self, bucket: str, keep: str | None = None) -> None:
+        entries: list[tuple[float, int, str]] = list()
+        now = time.time()
+        try:
+            with os.scandir(bucket) as scan:
+                for item in scan:
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue    # evicted by another job meanwhile
+                    if item.name.endswith(".tmp"):
+                        if now - stat.st_mtime > STALE_TEMP_AGE:
+                            self.__remove(item.path)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, item.path))
+        except OSError:
+            return
+        size = sum(entry[1] for entry in entries)
+        limit = self.max_size // BUCKETS
+        if size <= limit:
+            return
+        entries.sort()
+        for _, entry_size, path in entries:
+            if size <= limit * 3 // 4:   # some headroom, so the next stores do not evict again
+                break
+            if path == keep:
+                continue
+            self.__remove(path)
+            size -= entry_size
+
+    def clear(self) -> None:
+        for bucket in range(BUCKETS):
+            bucket_path = os.path.join(self.directory, f"{bucket:x}")
+            try:
+                names = os.listdir(bucket_path)
+            except OSError:
+                continue
+            for name in names:
+                self.__remove(os.path.join(bucket_path, name))
+
+    def __remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
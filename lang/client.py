@@ -0,0 +1,80 @@
+import json
+import os
+import socket
+import sys
+import time
+
+# thin client for the compile server (lang/server.py): nothing from the compiler and not even argparse (as
+# much import time as the rest of the client), so it starts in interpreter time.
+# the protocol is one JSON object per line each way, any socket tool can speak it
+
+
+def default_socket_path() -> str:
+    directory = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(directory, f"loomscript-{os.getuid()}.sock")
+
+
+def request(socket_path: str, message: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        with connection.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("compile server closed the connection")
+    return json.loads(line)
+
+
+def print_usage() -> None:
+    print("USAGE:")
+    print("lscript-client [--socket <path>] [--lexer <engine>] [--tree {objects,arena,dag}] [--time] [--all-errors] "
+          "[--ping | --stop | <name>.ls | <dir> ...]")
+    exit(1)
+
+
+def parse_args(args: list[str]) -> dict:
+    options = {"socket": default_socket_path(), "lexer": "table", "tree": "objects", "time": False,
+               "ping": False, "stop": False, "all-errors": False, "program_paths": list()}
+    arguments = iter(args)
+    for argument in arguments:
+        if argument in ("--socket", "--lexer", "--tree"):
+            options[argument[2:]] = next(arguments, None) or print_usage()
+        elif argument in ("--time", "--ping", "--stop", "--all-errors"):
+            options[argument[2:]] = True
+        elif argument.startswith("--"):
+            print_usage()
+        else:
+            options["program_paths"].append(argument)
+    if not (options["program_paths"] or options["ping"] or options["stop"]):
+        print_usage()
+    return options
+
+
+def main(args: list[str]) -> None:
+    options = parse_args(args[1:])
+    if options["stop"]:
+        message = {"command": "stop"}
+    elif options["ping"]:
+        message = {"command": "ping"}
+    else:
+        message = {"command": "compile", "paths": [os.path.abspath(path) for path in options["program_paths"]],
+                   "lexer": options["lexer"], "tree": options["tree"], "recover": options["all-errors"]}
+    start = time.perf_counter()
+    try:
+        response = request(options["socket"], message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"Error : no compile server on {options['socket']}, start one with main.py --serve", file=sys.stderr)
+        exit(2)
+    round_trip = (time.perf_counter() - start) * 1000
+    for line in response.get("output", ()):
+        print(line)
+    for line in response.get("diagnostics", ()):
+        print(line, file=sys.stderr)
+    if options["time"]:
+        print(f"round trip {round_trip:.2f}ms, compile {response.get('elapsed', 0):.2f}ms", file=sys.stderr)
+    if not response.get("ok", False):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
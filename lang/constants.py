@@ -8,6 +8,7 @@ KW_FUNCTION = 100
 KW_RAW = 101
 KW_RETURN = 102
 KW_VAR = 103
+KW_IMPORT = 104
 
 SEMICOLON = 200
 OPEN_PARAM = 201
@@ -29,14 +30,36 @@ NOT_EQUAL = 216
 EQUAL = 217
 DOT = 218
 
+NODE_PROGRAM = 300
+NODE_IDENTIFIER = 301
+NODE_INT_LITERAL = 302
+NODE_STRING_LITERAL = 303
+NODE_UNARY_EXPRESSION = 304
+NODE_BINARY_EXPRESSION = 305
+NODE_EXPRESSION_STATEMENT = 306
+NODE_FUNCTION_DECLARATION = 307
+NODE_RETURN_STATEMENT = 308
+NODE_VARIABLE_DECLARATION = 309
+NODE_RAW_CODE_STATEMENT = 310
+NODE_BOOL_LITERAL = 311  # only built by the optimizer, comparisons folded to a constant
+NODE_FLOAT_LITERAL = 312
+NODE_IMPORT_STATEMENT = 313
+
+SYMBOL_FUNCTION = 400
+SYMBOL_PARAMETER = 401
+SYMBOL_VARIABLE = 402
+
+WORD_TABLE = {
+    "function": KW_FUNCTION,
+    "raw": KW_RAW,
+    "return": KW_RETURN,
+    "var": KW_VAR,
+    "import": KW_IMPORT
+}
+
+
 def find_word_type(raw_word: str) -> int:
-    word_table = {
-        "function": KW_FUNCTION,
-        "raw": KW_RAW,
-        "return": KW_RETURN,
-        "var": KW_VAR
-    }
-    return word_table.get(raw_word, ID)
+    return WORD_TABLE.get(raw_word, ID)
 
 
 def get_constants_name(constants: int) -> str:
@@ -50,6 +73,7 @@ def get_constants_name(constants: int) -> str:
         101: "raw keyword",
         102: "return keyword",
         103: "var keyword",
+        104: "import keyword",
         200: ";",
         201: "(",
         202: ")",
@@ -0,0 +1,437 @@
+import math
+import os
+import threading
+from typing import TextIO
+
+from lang import constants
+from lang.exception import LoomSyntaxError
+from lang.inference import BOOL, FLOAT, INT, LITERAL_TYPES, NUMBERS, STRING, TypeInference, infer_types
+
+FLUSH_PARTS = 4096  # pieces buffered before they are joined and handed to the file
+INT64_MAX = (1 << 63) - 1
+
+# LoomScript values are dynamically typed, a value of unknown type is an `any` holding an int64, a float64, a
+# string or a bool and its operators are these helpers (an int64 and a float64 mix as float64). fmt and os
+# are always used, so the imports never go unused
+GO_PRELUDE = """package main
+
+import (
+\t"fmt"
+\t"os"
+)
+
+func loomOperandError(operator string, a, b any) string {
+\treturn fmt.Sprintf("unsupported operand types for %s: %T and %T", operator, a, b)
+}
+
+func loomInts(operator string, a, b any) (int64, int64) {
+\tx, xOk := a.(int64)
+\ty, yOk := b.(int64)
+\tif !xOk || !yOk {
+\t\tpanic(loomOperandError(operator, a, b))
+\t}
+\treturn x, y
+}
+
+// both operands as float64 when one is a float64 and the other a number, ok is false otherwise
+func loomFloats(a, b any) (float64, float64, bool) {
+\tx, xFloat := a.(float64)
+\ty, yFloat := b.(float64)
+\tif !xFloat && !yFloat {
+\t\treturn 0, 0, false
+\t}
+\tif !xFloat {
+\t\ti, ok := a.(int64)
+\t\tif !ok {
+\t\t\treturn 0, 0, false
+\t\t}
+\t\tx = float64(i)
+\t}
+\tif !yFloat {
+\t\ti, ok := b.(int64)
+\t\tif !ok {
+\t\t\treturn 0, 0, false
+\t\t}
+\t\ty = float64(i)
+\t}
+\treturn x, y, true
+}
+
+func loomCompare(operator string, a, b any) int {
+\tif x, ok := a.(string); ok {
+\t\tif y, ok := b.(string); ok {
+\t\t\tif x < y {
+\t\t\t\treturn -1
+\t\t\t} else if x > y {
+\t\t\t\treturn 1
+\t\t\t}
+\t\t\treturn 0
+\t\t}
+\t}
+\tx, y := loomInts(operator, a, b)
+\tif x < y {
+\t\treturn -1
+\t} else if x > y {
+\t\treturn 1
+\t}
+\treturn 0
+}
+
+func loomTruthy(a any) bool {
+\tswitch value := a.(type) {
+\tcase nil:
+\t\treturn false
+\tcase bool:
+\t\treturn value
+\tcase int64:
+\t\treturn value != 0
+\tcase float64:
+\t\treturn value != 0
+\tcase string:
+\t\treturn value != ""
+\t}
+\treturn true
+}
+
+func loomAdd(a, b any) any {
+\t_, aString := a.(string)
+\t_, bString := b.(string)
+\tif aString || bString {
+\t\treturn fmt.Sprint(a) + fmt.Sprint(b)
+\t}
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x + y
+\t}
+\tx, y := loomInts("+", a, b)
+\treturn x + y
+}
+
+func loomSub(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x - y
+\t}
+\tx, y := loomInts("-", a, b)
+\treturn x - y
+}
+
+func loomMul(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x * y
+\t}
+\tx, y := loomInts("*", a, b)
+\treturn x * y
+}
+
+func loomDiv(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x / y
+\t}
+\tx, y := loomInts("/", a, b)
+\treturn x / y
+}
+
+// floats are compared as floats, a NaN is neither less, equal nor greater
+func loomLess(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x < y
+\t}
+\treturn loomCompare("<", a, b) < 0
+}
+
+func loomGreater(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x > y
+\t}
+\treturn loomCompare(">", a, b) > 0
+}
+
+func loomLessEqual(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x <= y
+\t}
+\treturn loomCompare("<=", a, b) <= 0
+}
+
+func loomGreaterEqual(a, b any) any {
+\tif x, y, ok := loomFloats(a, b); ok {
+\t\treturn x >= y
+\t}
+\treturn loomCompare(">=", a, b) >= 0
+}
+
+func loomEqual(a, b any) any { return loomSame(a, b) }
+func loomNotEqual(a, b any) any { return !loomSame(a, b) }
+
+// a function is never equal to anything, itself included: == on two funcs of one type panics in go
+func loomSame(a, b any) bool {
+\tswitch a.(type) {
+\tcase nil, int64, float64, string, bool:
+\t\treturn a == b
+\t}
+\treturn false
+}
+
+func loomNegate(a any) any {
+\tswitch x := a.(type) {
+\tcase int64:
+\t\treturn -x
+\tcase float64:
+\t\treturn -x
+\t}
+\tpanic(fmt.Sprintf("unsupported operand type for -: %T", a))
+}
+
+// a top level return ends the program, an int is the exit status
+func loomExit(a any) {
+\tif status, ok := a.(int64); ok {
+\t\tos.Exit(int(status))
+\t}
+\tos.Exit(0)
+}
+"""
+
+BINARY_HELPERS = {
+    constants.PLUS: "loomAdd(",
+    constants.MINUS: "loomSub(",
+    constants.STAR: "loomMul(",
+    constants.SLASH: "loomDiv(",
+    constants.LESSER: "loomLess(",
+    constants.GREATER: "loomGreater(",
+    constants.LESSER_EQUAL: "loomLessEqual(",
+    constants.GREATER_EQUAL: "loomGreaterEqual(",
+    constants.DOUBLE_EQUAL: "loomEqual(",
+    constants.NOT_EQUAL: "loomNotEqual("
+}
+GO_OPERATORS = {
+    constants.PLUS: " + ",
+    constants.MINUS: " - ",
+    constants.STAR: " * ",
+    constants.SLASH: " / ",
+    constants.LESSER: " < ",
+    constants.GREATER: " > ",
+    constants.LESSER_EQUAL: " <= ",
+    constants.GREATER_EQUAL: " >= ",
+    constants.DOUBLE_EQUAL: " == ",
+    constants.NOT_EQUAL: " != "
+}
+COMPARISONS = (constants.LESSER, constants.GREATER, constants.LESSER_EQUAL, constants.GREATER_EQUAL)
+GO_TYPES = {None: "any", INT: "int64", FLOAT: "float64", STRING: "string", BOOL: "bool"}
+
+# go keywords and predeclared names, plus what the generated file declares or imports. a LoomScript name
+# that is one of them, or starts with loom (the runtime helpers), becomes loom_<name>, which never clashes
+GO_RESERVED = frozenset((
+    "break", "case", "chan", "const", "continue", "default", "defer", "else", "fallthrough", "for", "func", "go",
+    "goto", "if", "import", "interface", "map", "package", "range", "return", "select", "struct", "switch", "type",
+    "var", "any", "bool", "byte", "comparable", "complex64", "complex128", "error", "float32", "float64", "int",
+    "int8", "int16", "int32", "int64", "rune", "string", "uint", "uint8", "uint16", "uint32", "uint64", "uintptr",
+    "true", "false", "iota", "nil", "append", "cap", "clear", "close", "complex", "copy", "delete", "imag", "len",
+    "make", "max", "min", "new", "panic", "print", "println", "real", "recover", "fmt", "os", "main", "init", "_"
+))
+
+# the source text of a string literal as a go string literal (no escapes in LoomScript, every char is itself)
+GO_STRING_ESCAPES = {char: f"\\x{char:02x}" for char in range(0x20)}
+GO_STRING_ESCAPES.update({ord('\t'): "\\t", ord('\n'): "\\n", ord('\r'): "\\r", ord('"'): '\\"',
+                          ord('\\'): "\\\\", 0x7f: "\\x7f", 0xfeff: "\\ufeff"})
+
+
+def go_string(value: str) -> str:
+    return '"' + value.translate(GO_STRING_ESCAPES) + '"'
+
+
+class GoEmitter:
+    # writes the go translation of a Program to out while walking it: the pieces of a few statements are
+    # kept in a list and written together, so memory stays flat however large the output gets.
+    # top level functions become go functions, the other top level statements run in order from init()
+    # functions (go runs them in source order) and their variables are package level variables, declared
+    # up front from the global scope of the symbol table (every name is declared once, the parser checks).
+    # what lang/inference.py types is declared with its go type and its operators are plain go operators,
+    # only values of unknown type (parameters and what is computed from them) are `any` and go through the
+    # runtime helpers. expressions are walked with an explicit stack, like the parser builds them
+    def __init__(self, out: TextIO) -> None:
+        self.out = out
+        self.parts: list[str] = list()
+        self.names: dict[str, str] = dict()     # LoomScript name -> go name
+        self.in_init = False
+        self.types: TypeInference | None = None     # types the statements again while they are emitted
+
+    def emit(self, program) -> None:
+        symbols = infer_types(program)
+        self.types = TypeInference(symbols)
+        self.out.write(GO_PRELUDE)
+        for symbol in symbols.globals.symbols.values():
+            if symbol.kind == constants.SYMBOL_VARIABLE:
+                self.parts.append(f"\nvar {self.go_name(symbol.name)} {GO_TYPES[symbol.type]}\n")
+        for statement in program.body:
+            if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+                self.__close_init()
+                self.emit_function(statement)
+            else:
+                if not self.in_init:
+                    self.parts.append("\nfunc init() {\n")
+                    self.in_init = True
+                self.emit_statement(statement, False)
+            if len(self.parts) > FLUSH_PARTS:
+                self.flush()
+        self.__close_init()
+        self.parts.append("\nfunc main() {}\n")
+        self.flush()
+
+    def flush(self) -> None:
+        self.out.write("".join(self.parts))
+        self.parts.clear()
+
+    def __close_init(self) -> None:
+        if not self.in_init:
+            return
+        self.parts.append("}\n")
+        self.in_init = False
+
+    def go_name(self, name: str) -> str:
+        go_name = self.names.get(name)
+        if go_name is None:
+            go_name = self.names[name] = "loom_" + name if name in GO_RESERVED or name.startswith("loom") else name
+        return go_name
+
+    def emit_function(self, function) -> None:
+        return_type = GO_TYPES[self.types.enter_function(function).type]
+        params = [self.go_name(param.name) for param in function.param]
+        self.parts.append(f"\nfunc {self.go_name(function.name)}({', '.join(f'{param} any' for param in params)}) "
+                          f"{return_type} {{\n")
+        for statement in function.body:
+            self.emit_statement(statement, True)
+            if statement.kind == constants.NODE_RETURN_STATEMENT:
+                break   # what follows never runs, and a later return may not have the return type
+        else:
+            self.parts.append("\treturn nil\n")     # go wants a terminating statement
+        self.parts.append("}\n")
+        self.types.leave_function()
+
+    def emit_statement(self, statement, in_function: bool) -> None:
+        parts = self.parts
+        kind = statement.kind
+        value_type = self.types.statement(statement)
+        if kind == constants.NODE_VARIABLE_DECLARATION:
+            name = self.go_name(statement.identifier.name)
+            if not in_function:     # a package level variable
+                parts.append(f"\t{name} = ")
+                self.emit_expression(statement.init)
+                parts.append("\n")
+            else:
+                parts.append(f"\tvar {name} {GO_TYPES[value_type]} = ")
+                self.emit_expression(statement.init)
+                parts.append(f"\n\t_ = {name}\n")    # go rejects variables that are never read
+        elif kind == constants.NODE_RETURN_STATEMENT:
+            parts.append("\treturn " if in_function else "\tloomExit(")
+            self.emit_expression(statement.expression)
+            parts.append("\n" if in_function else ")\n")
+        elif kind == constants.NODE_EXPRESSION_STATEMENT:
+            parts.append("\t_ = ")
+            self.emit_expression(statement.expression)
+            parts.append("\n")
+        else:
+            raise LoomSyntaxError(f"can not generate go for a {type(statement).__name__}", statement.line)
+        self.types.declare(statement, value_type)
+
+    def emit_expression(self, expression) -> None:
+        # expression belongs to the statement last passed to self.types
+        parts = self.parts
+        pending = [expression]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, str):
+                parts.append(node)
+                continue
+            kind = node.kind
+            if kind == constants.NODE_IDENTIFIER:
+                symbol = self.types.lookup(node.name)
+                name = self.go_name(node.name)
+                parts.append(f"any({name})" if symbol.kind == constants.SYMBOL_FUNCTION else name)
+            elif kind == constants.NODE_INT_LITERAL:
+                if node.value > INT64_MAX:
+                    raise LoomSyntaxError(f"integer literal {node.value} does not fit in 64 bits", node.line)
+                parts.append(f"int64({node.value})")
+            elif kind == constants.NODE_FLOAT_LITERAL:
+                if not math.isfinite(node.value):
+                    raise LoomSyntaxError("float literal does not fit in 64 bits", node.line)
+                parts.append(f"float64({node.value!r})")
+            elif kind == constants.NODE_STRING_LITERAL:
+                parts.append(go_string(node.value))
+            elif kind == constants.NODE_BOOL_LITERAL:
+                parts.append("true" if node.value else "false")
+            elif kind == constants.NODE_BINARY_EXPRESSION:
+                pending.extend(reversed(self.__binary(node)))
+            elif kind == constants.NODE_UNARY_EXPRESSION:
+                pending.extend(reversed(self.__unary(node)))
+            elif kind == constants.NODE_EXPRESSION_STATEMENT:    # initializers and returns hold one
+                pending.append(node.expression)
+            else:
+                raise LoomSyntaxError(f"can not generate go for a {type(node).__name__}", node.line)
+
+    def __binary(self, node) -> list:
+        # the pieces of a binary expression in output order, go operators when the operand types allow them.
+        # an operation on two constants stays a helper call, go would fold it at compile time and reject
+        # what overflows or divides by zero instead of wrapping or panicking at runtime
+        types = self.types
+        left, operator, right = node.left, node.operator, node.right
+        left_type, right_type, node_type = types.type_of(left), types.type_of(right), types.type_of(node)
+        go_operator = GO_OPERATORS[operator]
+        if node_type in NUMBERS and not (types.is_constant(left) and types.is_constant(right)) and \
+                not (operator == constants.SLASH and right.kind in LITERAL_TYPES and right.value == 0):
+            return ["(", *as_type(left, left_type, node_type), go_operator,
+                    *as_type(right, right_type, node_type), ")"]
+        if node_type == STRING:
+            return ["(", *as_string(left, left_type), " + ", *as_string(right, right_type), ")"]
+        if operator in COMPARISONS and \
+                (left_type in NUMBERS and right_type in NUMBERS or left_type == right_type == STRING):
+            operand_type = FLOAT if FLOAT in (left_type, right_type) else left_type
+            return ["(", *as_type(left, left_type, operand_type), go_operator,
+                    *as_type(right, right_type, operand_type), ")"]
+        if operator in (constants.DOUBLE_EQUAL, constants.NOT_EQUAL) and \
+                left_type is not None and right_type is not None:   # an untyped operand may be a function
+            if left_type == right_type:
+                return ["(", left, go_operator, right, ")"]
+            return ["(any(", left, ")", go_operator, "any(", right, "))"]     # never equal, like loomEqual
+        return [BINARY_HELPERS[operator], left, ", ", right,
+                ")" if node_type is None else f").({GO_TYPES[node_type]})"]
+
+    def __unary(self, node) -> list:
+        operand = node.expression
+        operand_type = self.types.type_of(operand)
+        if node.operator == constants.NOT:
+            return ["(!", operand, ")"] if operand_type == BOOL else ["(!loomTruthy(", operand, "))"]
+        if operand_type in NUMBERS and not self.types.is_constant(operand):
+            return ["(-", operand, ")"]
+        node_type = self.types.type_of(node)
+        return ["loomNegate(", operand, ")" if node_type is None else f").({GO_TYPES[node_type]})"]
+
+
+def as_type(node, node_type: str | None, target_type: str) -> list:
+    return ["float64(", node, ")"] if node_type == INT and target_type == FLOAT else [node]
+
+
+def as_string(node, node_type: str | None) -> list:
+    # what loomAdd concatenates, fmt.Sprint of the value
+    return [node] if node_type == STRING else ["fmt.Sprint(", node, ")"]
+
+
+def emit_file(program, path: str, buffer_size: int = 1 << 16) -> None:
+    write_output(path, lambda file: GoEmitter(file).emit(program), buffer_size)
+
+
+def write_code(code: str, path: str) -> None:
+    write_output(path, lambda file: file.write(code))
+
+
+def write_output(path: str, write, buffer_size: int = 1 << 16) -> None:
+    # written to a temp file next to path and renamed over it, an error halfway never leaves half a file.
+    # not mkstemp, the output gets the usual permissions
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    handle = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        with open(handle, 'w', buffering=buffer_size, encoding="utf-8", newline="\n") as file:
+            write(file)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
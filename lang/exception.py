@@ -2,3 +2,9 @@ class LoomSyntaxError(Exception):
     def __init__(self, message: str, line: int = None) -> None:
         super().__init__(message)
         self.line = line
+        self.token: int | None = None   # index of the token a recovering parse stopped at, when it recorded the error
+
+
+class LoomRuntimeError(Exception):
+    # what panics in the generated go, raised by lang/interpreter.py with the message of the panic
+    pass
@@ -0,0 +1,178 @@
+import re
+from bisect import bisect_left
+
+from lang import constants
+from lang.exception import LoomSyntaxError
+from lang.parser import Parse
+from lang.tokenizer import TokenStoreLexer
+from lang.utils.parserUtils import Program, Statement, iter_children
+from lang.utils.symbolUtils import SymbolTable, declared_symbol
+from lang.utils.tokenUtils import TokenIterator
+
+NON_SPACE = re.compile(r"\S")
+
+
+class IncrementalParser:
+    # keeps the source and Program of a file plus the source span of every top level statement, so an edit
+    # only re-lexes and re-parses the statements it touches. top level statements are independent: the lexer
+    # state at a statement boundary is just (index, line) and the parser never looks past a ';' or '}' that
+    # ends a statement. the statements after the edit are reused as they are (their spans and lines shifted),
+    # anything that does not line up falls back to a full parse. the region is parsed with the globals
+    # declared before it, and it has to declare the same globals as before (or the statements after it may
+    # not be valid anymore). reused nodes move into the new Program, the previous one is not valid anymore
+    # after an edit.
+    # with recover no error is raised: every syntax error goes to diagnostics with the source offset of the
+    # token the parse stopped at, program holds the statements that did parse (starts and friends their
+    # spans) and, as long as there are diagnostics, every edit is a full parse
+    def __init__(self, source: str, recover: bool = False) -> None:
+        self.source = source
+        self.recover = recover
+        self.diagnostics: list[tuple[LoomSyntaxError, int]] = list()
+        self.program: Program | None = None
+        self.starts: list[int] = list()         # source span of every top level statement
+        self.ends: list[int] = list()
+        self.end_lines: list[int] = list()      # line of the last token of every statement
+        self.complete = True    # False when a top level '}' ended the parse before the end of the source
+        self.last_reparsed = 0  # statements parsed again by the last edit, -1 when it was a full parse
+        self.full_parse()
+
+    def full_parse(self) -> Program:
+        self.program = None     # stays None if the source does not parse, the next edit starts over
+        self.last_reparsed = -1
+        self.diagnostics = list()
+        lexer = TokenStoreLexer(self.source)
+        symbols = SymbolTable()
+        try:
+            store = lexer.tokenize()
+        except LoomSyntaxError as err:
+            if not self.recover:
+                raise
+            store = lexer.tokens    # what lexed before the error, the error goes right after it
+            self.diagnostics.append((err, self.__offset(store, len(store))))
+        statements, spans, self.complete = self.__parse_region(lexer, store, True, symbols,
+                                                                self.diagnostics if self.recover else None)
+        self.starts, self.ends, self.end_lines = (list(span) for span in zip(*spans)) if spans else ([], [], [])
+        self.program = Program(statements)
+        self.program.symbols = symbols
+        return self.program
+
+    def edit(self, start: int, end: int, text: str) -> Program:
+        # replaces source[start:end] with text and returns the updated Program, a LoomSyntaxError is raised
+        # exactly when a full parse of the new source raises it
+        source = self.source[:start] + text + self.source[end:]
+        delta = len(text) - (end - start)
+        old_length = len(self.source)
+        self.source = source
+        if self.program is None or self.diagnostics:
+            return self.full_parse()
+        try:
+            return self.__reparse(start, end, delta, old_length)
+        except Exception:   # lexing or parsing the region did not work out, the full parse has the last word
+            return self.full_parse()
+
+    def __reparse(self, start: int, end: int, delta: int, old_length: int) -> Program:
+        starts, ends, end_lines = self.starts, self.ends, self.end_lines
+        # the statement whose last token touches the edit is parsed again as well, the edit may glue on to it
+        first = bisect_left(ends, start)
+        # statements starting after the edit are kept (one starting right at its end might be glued to it)
+        after = max(bisect_left(starts, end + 1), first)
+        region_start = ends[first - 1] if first > 0 else 0
+        region_line = end_lines[first - 1] if first > 0 else 1
+        old_region_end = starts[after] if after < len(starts) else old_length
+        region_end = old_region_end + delta
+        if after == len(starts) and not self.complete:
+            raise ValueError("the source after a top level '}' is never parsed")
+
+        lexer = TokenStoreLexer(self.source)
+        if lexer.tokenize_range(region_start, region_end, region_line) != region_end:
+            raise ValueError("a token crosses the end of the region")
+        body = self.program.body
+        region_symbols = SymbolTable()
+        for statement in body[:first]:
+            declared = declared_symbol(statement)
+            if declared is not None:
+                region_symbols.globals.declare(*declared)
+        statements, spans, complete = self.__parse_region(lexer, lexer.tokens, False, region_symbols)
+        if not complete:
+            raise ValueError("a top level '}' in the region")
+        declared = [declared_symbol(statement) for statement in statements]
+        if declared != [declared_symbol(statement) for statement in body[first:after]]:
+            raise ValueError("the region declares other globals")
+
+        line_delta = lexer.line - (end_lines[after - 1] if after > 0 else 1)
+        kept = body[after:]
+        if line_delta:
+            shift_lines(kept, line_delta)
+        symbols = self.program.symbols
+        for name, scope in region_symbols.functions.items():   # the global scope itself is the same
+            scope.parent = symbols.globals
+            symbols.functions[name] = scope
+        self.program = Program(body[:first] + statements + kept)
+        self.program.symbols = symbols
+        tail = first + len(spans)
+        starts[first:after] = [span[0] for span in spans]
+        ends[first:after] = [span[1] for span in spans]
+        end_lines[first:after] = [span[2] for span in spans]
+        if delta:
+            starts[tail:] = [position + delta for position in starts[tail:]]
+            ends[tail:] = [position + delta for position in ends[tail:]]
+        if line_delta:
+            end_lines[tail:] = [line + line_delta for line in end_lines[tail:]]
+        self.last_reparsed = len(statements)
+        return self.program
+
+    def __parse_region(self, lexer: TokenStoreLexer, store, is_full: bool, symbols: SymbolTable,
+                       diagnostics: list | None = None) -> tuple[list[Statement], list, bool]:
+        # parses statement by statement to know the span of each one: (start, end, line of the last token).
+        # with diagnostics (a recovering full parse) a statement that does not parse is skipped the way
+        # Parse.recover_statements skips it
+        tokens = TokenIterator(store)
+        parser = Parse(tokens, symbols=symbols, recover=diagnostics is not None)
+        statements: list[Statement] = list()
+        spans: list[tuple[int, int, int]] = list()
+        complete = True
+        while tokens.has_token():
+            if tokens.get().is_of_type(constants.CLOSE_BRACE):   # Parse.parse_statements stops here as well
+                complete = False
+                break
+            first = tokens.pointer
+            try:
+                statements.append(parser.parse_statement())
+            except LoomSyntaxError as err:
+                if diagnostics is None:
+                    raise
+                err.token = tokens.pointer
+                parser.diagnostics.append(err)
+                parser.scope = symbols.globals
+                parser.synchronize(first, store.types[first] == constants.KW_FUNCTION)
+                continue
+            last = tokens.pointer - 1
+            start = store.starts[first]
+            if store.types[first] in (constants.STRING_LITERAL, constants.DOT):
+                start -= 1  # the store spans the string without its quotes
+            spans.append((start, store.ends[last], store.lines[last]))
+        if diagnostics is not None:
+            diagnostics.extend((err, self.__offset(store, err.token)) for err in parser.diagnostics)
+        if not is_full and tokens.pointer != len(store):
+            complete = False
+        return statements, spans, complete
+
+    def __offset(self, store, index: int | None) -> int:
+        # source offset of the token at index, past the end of the tokens the first character after them that
+        # is not whitespace (where a lexer error is)
+        if index is not None and index < len(store):
+            return store.starts[index] - (store.types[index] in (constants.STRING_LITERAL, constants.DOT))
+        if len(store) == 0:
+            end = 0
+        else:
+            end = store.ends[-1] + (store.types[-1] in (constants.STRING_LITERAL, constants.DOT))
+        matched = NON_SPACE.search(self.source, end)
+        return matched.start() if matched is not None else len(self.source)
+
+
+def shift_lines(statements: list[Statement], line_delta: int) -> None:
+    pending = list(statements)
+    while pending:
+        node = pending.pop()
+        node.line += line_delta
+        pending.extend(iter_children(node))
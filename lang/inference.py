@@ -0,0 +1,170 @@
+from lang import constants
+from lang.utils.symbolUtils import Scope, Symbol, SymbolTable
+
+INT = "int"     # what an expression evaluates to, when it is known (None otherwise)
+FLOAT = "float"
+STRING = "string"
+BOOL = "bool"
+NUMBERS = (INT, FLOAT)
+LITERAL_TYPES = {
+    constants.NODE_INT_LITERAL: INT,
+    constants.NODE_FLOAT_LITERAL: FLOAT,
+    constants.NODE_STRING_LITERAL: STRING,
+    constants.NODE_BOOL_LITERAL: BOOL
+}
+ARITHMETIC = (constants.PLUS, constants.MINUS, constants.STAR, constants.SLASH)
+NUMBER_ONLY = (constants.MINUS, constants.STAR, constants.SLASH)   # operators that panic on anything but numbers
+
+
+def result_type(node, left_type: str | None, right_type: str | None = None) -> str | None:
+    # type of a unary or binary expression from the types of its operands (if it does not panic). an int and
+    # a float make a float, '+' with a string on either side makes a string, comparisons make a bool
+    operator = node.operator
+    if node.kind == constants.NODE_UNARY_EXPRESSION:
+        if operator == constants.NOT:
+            return BOOL
+        return left_type if left_type in NUMBERS else None
+    if operator == constants.PLUS and (left_type == STRING or right_type == STRING):
+        return STRING
+    if operator in ARITHMETIC:
+        if left_type in NUMBERS and right_type in NUMBERS:
+            return INT if left_type == right_type == INT else FLOAT
+        return None
+    return BOOL
+
+
+class TypeInference:
+    # types a program statement by statement in source order. a variable is declared once (the parser checks)
+    # so its type is the type of its initializer, a parameter has no call site to take a type from and stays
+    # unknown, a function returns the type of its first return (bodies are straight line code, the first
+    # return always ends the call). names are declared before they are used, so source order is also the
+    # order in which functions and globals depend on each other and one pass types everything.
+    # the types land on the symbols of the table, expression types are memoized by node for the current
+    # function (dag nodes are shared, a shared subexpression is typed once) and dropped when a local shadows
+    # a global, after which the same identifier node means another variable
+    def __init__(self, symbols: SymbolTable) -> None:
+        self.symbols = symbols
+        self.global_names: dict[str, Symbol] = dict()   # declared so far
+        self.local_names: dict[str, Symbol] | None = None
+        self.scope: Scope = symbols.globals
+        self.types: dict[int, tuple[str | None, bool]] = dict()    # id(node) -> (type, only literal leaves)
+
+    def run(self, program) -> SymbolTable:
+        for statement in program.body:
+            if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+                function = self.enter_function(statement)
+                for inner in statement.body:
+                    inner_type = self.statement(inner)
+                    if inner.kind == constants.NODE_RETURN_STATEMENT:
+                        function.type = inner_type
+                        break
+                    self.declare(inner, inner_type)
+                self.leave_function()
+            else:
+                self.declare(statement, self.statement(statement))
+        return self.symbols
+
+    def enter_function(self, function) -> Symbol:
+        symbol = self.__declare(self.symbols.globals, function.name, constants.SYMBOL_FUNCTION)
+        self.global_names[symbol.name] = symbol
+        self.scope = self.symbols.functions.get(function.name) or self.symbols.open_function(function.name)
+        self.local_names = dict()
+        for param in function.param:
+            self.local_names[param.name] = self.__declare(self.scope, param.name, constants.SYMBOL_PARAMETER)
+        self.types.clear()
+        return symbol
+
+    def leave_function(self) -> None:
+        self.scope = self.symbols.globals
+        self.local_names = None
+        self.types.clear()
+
+    def statement(self, statement) -> str | None:
+        # types the expression of a statement, returns its type
+        if statement.kind in (constants.NODE_FUNCTION_DECLARATION, constants.NODE_IMPORT_STATEMENT):
+            return None
+        if statement.kind == constants.NODE_VARIABLE_DECLARATION:
+            return self.infer(statement.init.expression)
+        if statement.kind == constants.NODE_RETURN_STATEMENT:
+            return self.infer(statement.expression.expression)
+        return self.infer(statement.expression)
+
+    def declare(self, statement, value_type: str | None) -> None:
+        # declares what a typed statement declares. separate from statement(), the initializer of a variable
+        # still sees the names from before it (`var x = x + 1` in a function reads the global x)
+        if statement.kind != constants.NODE_VARIABLE_DECLARATION:
+            return
+        name = statement.identifier.name
+        symbol = self.__declare(self.scope, name, constants.SYMBOL_VARIABLE)
+        symbol.type = value_type
+        if self.local_names is None:
+            self.global_names[name] = symbol
+            return
+        if name in self.global_names:
+            self.types.clear()  # the same identifier node means the local from now on
+        self.local_names[name] = symbol
+
+    def lookup(self, name: str) -> Symbol | None:
+        if self.local_names is not None:
+            symbol = self.local_names.get(name)
+            if symbol is not None:
+                return symbol
+        return self.global_names.get(name)
+
+    def type_of(self, node) -> str | None:
+        # type of an expression of the statement last passed to statement()
+        kind = node.kind
+        if kind in LITERAL_TYPES:
+            return LITERAL_TYPES[kind]
+        if kind == constants.NODE_IDENTIFIER:
+            return self.__identifier_type(node.name)
+        return self.types[id(node)][0]
+
+    def is_constant(self, node) -> bool:
+        # only literals in it, go evaluates such an expression at compile time
+        kind = node.kind
+        if kind in LITERAL_TYPES:
+            return True
+        if kind == constants.NODE_IDENTIFIER:
+            return False
+        return self.types[id(node)][1]
+
+    def infer(self, expression) -> str | None:
+        types = self.types
+        order = list()
+        pending = [expression]
+        while pending:
+            node = pending.pop()
+            if id(node) in types:
+                continue
+            order.append(node)
+            if node.kind == constants.NODE_BINARY_EXPRESSION:
+                pending.append(node.left)
+                pending.append(node.right)
+            elif node.kind == constants.NODE_UNARY_EXPRESSION:
+                pending.append(node.expression)
+        for node in reversed(order):    # operands first
+            kind = node.kind
+            if kind == constants.NODE_BINARY_EXPRESSION:
+                types[id(node)] = (result_type(node, self.type_of(node.left), self.type_of(node.right)),
+                                   self.is_constant(node.left) and self.is_constant(node.right))
+            elif kind == constants.NODE_UNARY_EXPRESSION:
+                types[id(node)] = (result_type(node, self.type_of(node.expression)),
+                                   self.is_constant(node.expression))
+        return self.type_of(expression)
+
+    def __identifier_type(self, name: str) -> str | None:
+        symbol = self.lookup(name)
+        # a function used as a value is an `any` holding it
+        return symbol.type if symbol is not None and symbol.kind != constants.SYMBOL_FUNCTION else None
+
+    @staticmethod
+    def __declare(scope: Scope, name: str, kind: int) -> Symbol:
+        return scope.symbols.get(name) or scope.declare(name, kind)
+
+
+def infer_types(program) -> SymbolTable:
+    # fills in the types of the symbol table of program, building the table when it has none (cached trees)
+    if program.symbols is None:
+        program.symbols = SymbolTable()
+    return TypeInference(program.symbols).run(program)
@@ -0,0 +1,534 @@
+import math
+from operator import add, itemgetter, mul, sub
+
+from lang import constants
+from lang.exception import LoomRuntimeError, LoomSyntaxError
+from lang.inference import BOOL, FLOAT, INT, NUMBERS, STRING, TypeInference, infer_types
+from lang.optimizer import INT64_MAX, INT64_MIN, go_sprint, wrap
+from lang.utils.arenaUtils import ArenaProgram, arena_to_objects
+
+# runs a Program without go, with the semantics of the generated go (lang/emitter.py runtime): int64
+# arithmetic wraps and '/' truncates, an int and a float compute in float64, '+' with a string concatenates
+# fmt.Sprint of both sides, '<' and friends only take two numbers or two strings, '==' is false for values
+# of different types and for functions, '!' is loomTruthy. what panics in go raises LoomRuntimeError with the
+# same message. values are python ints (always within int64), floats, strs, bools, None (nil, what a function
+# without a return gives) and LoomFunction
+MAX_CLOSURE_DEPTH = 200     # deeper expressions run on a value stack, nested closures would hit the recursion limit
+ZERO_VALUES = {INT: 0, FLOAT: 0.0, STRING: "", BOOL: False, None: None}   # a global before its initializer ran
+RUNTIME_TYPES = {int: "int64", float: "float64", str: "string", bool: "bool", type(None): "<nil>"}
+GO_TYPE_NAMES = {None: "interface {}", INT: "int64", FLOAT: "float64", STRING: "string", BOOL: "bool"}   # as %T
+
+
+class LoomFunction:
+    # a function of the program and what an identifier naming it evaluates to. a call runs in a frame, a
+    # list holding the parameters and locals at the symbol index of their name in the function scope and
+    # after them the constants of the function, copied from template
+    __slots__ = ("name", "go_type", "params", "template", "steps", "result")
+
+    def __init__(self, name: str, go_type: str, params: int) -> None:
+        self.name = name
+        self.go_type = go_type  # %T of the function value, what go panics and prints with
+        self.params = params
+        self.template: list = list()
+        self.steps: list = list()   # a closure per statement before the first return
+        self.result = None          # the closure of the first return, None returns nil
+
+    def __call__(self, *args):
+        if len(args) != self.params:
+            raise TypeError(f"{self.name} takes {self.params} arguments, {len(args)} given")
+        for arg in args:
+            check_value(arg)
+        frame = self.template.copy()
+        frame[:self.params] = args
+        for step in self.steps:
+            step(frame)
+        return None if self.result is None else self.result(frame)
+
+    def __repr__(self) -> str:
+        return f"<LoomFunction {self.name}>"
+
+
+def check_value(value) -> None:
+    # a value python hands to a program has to be one the program can have
+    value_type = type(value)
+    if value_type is int:
+        if not INT64_MIN <= value <= INT64_MAX:
+            raise ValueError(f"{value} does not fit in an int64")
+    elif value_type not in RUNTIME_TYPES and value_type is not LoomFunction:
+        raise TypeError(f"a {value_type.__name__} is not a LoomScript value")
+
+
+def type_name(value) -> str:
+    # %T of a value
+    if type(value) is LoomFunction:
+        return value.go_type
+    return RUNTIME_TYPES[type(value)]
+
+
+def sprint(value) -> str:
+    # fmt.Sprint of a value, a function prints as an address like in go
+    if value is None:
+        return "<nil>"
+    if type(value) is LoomFunction:
+        return hex(id(value))
+    return go_sprint(value)
+
+
+def operand_error(operator: str, a, b) -> LoomRuntimeError:
+    return LoomRuntimeError(f"unsupported operand types for {operator}: {type_name(a)} and {type_name(b)}")
+
+
+def floats(a, b) -> tuple[float, float] | None:
+    # loomFloats: both as floats when one is a float and the other a number
+    a_type, b_type = type(a), type(b)
+    if a_type is float:
+        if b_type is float or b_type is int:
+            return a, float(b)
+    elif b_type is float and a_type is int:
+        return float(a), b
+    return None
+
+
+def int_divide(a: int, b: int) -> int:
+    if b == 0:
+        raise LoomRuntimeError("runtime error: integer divide by zero")
+    quotient = abs(a) // abs(b)
+    return wrap(quotient if (a < 0) == (b < 0) else -quotient)
+
+
+def float_divide(a: float, b: float) -> float:
+    # ieee division, python raises on a zero divisor where go gives an infinity or nan
+    if b == 0:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+def loom_add(a, b):
+    if type(a) is int and type(b) is int:
+        value = a + b
+        return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    if type(a) is str or type(b) is str:
+        return sprint(a) + sprint(b)
+    pair = floats(a, b)
+    if pair is None:
+        raise operand_error("+", a, b)
+    return pair[0] + pair[1]
+
+
+def loom_subtract(a, b):
+    if type(a) is int and type(b) is int:
+        value = a - b
+        return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    pair = floats(a, b)
+    if pair is None:
+        raise operand_error("-", a, b)
+    return pair[0] - pair[1]
+
+
+def loom_multiply(a, b):
+    if type(a) is int and type(b) is int:
+        value = a * b
+        return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    pair = floats(a, b)
+    if pair is None:
+        raise operand_error("*", a, b)
+    return pair[0] * pair[1]
+
+
+def loom_divide(a, b):
+    if type(a) is int and type(b) is int:
+        return int_divide(a, b)
+    pair = floats(a, b)
+    if pair is None:
+        raise operand_error("/", a, b)
+    return float_divide(*pair)
+
+
+def comparison(operator: str, compare):
+    # loomLess and friends: floats compare as floats (an int made a float first, python would compare them
+    # exactly), then two strings or two ints
+    def run(a, b):
+        a_type, b_type = type(a), type(b)
+        if a_type is b_type and (a_type is int or a_type is str or a_type is float):
+            return compare(a, b)
+        pair = floats(a, b)
+        if pair is None:
+            raise operand_error(operator, a, b)
+        return compare(*pair)
+    return run
+
+
+def loom_equal(a, b) -> bool:
+    # loomSame: different dynamic types are never equal, a function is not even equal to itself
+    if type(a) is not type(b) or type(a) is LoomFunction:
+        return False
+    return a == b
+
+
+def loom_not_equal(a, b) -> bool:
+    return not loom_equal(a, b)
+
+
+def loom_negate(a):
+    if type(a) is int:
+        return wrap(-a)
+    if type(a) is float:
+        return -a
+    raise LoomRuntimeError(f"unsupported operand type for -: {type_name(a)}")
+
+
+def loom_not(a) -> bool:
+    # loomTruthy is python truthiness: nil, false, 0, 0.0 and "" are false
+    return not a
+
+
+OPERATIONS = {
+    constants.PLUS: loom_add,
+    constants.MINUS: loom_subtract,
+    constants.STAR: loom_multiply,
+    constants.SLASH: loom_divide,
+    constants.LESSER: comparison("<", lambda a, b: a < b),
+    constants.GREATER: comparison(">", lambda a, b: a > b),
+    constants.LESSER_EQUAL: comparison("<=", lambda a, b: a <= b),
+    constants.GREATER_EQUAL: comparison(">=", lambda a, b: a >= b),
+    constants.DOUBLE_EQUAL: loom_equal,
+    constants.NOT_EQUAL: loom_not_equal
+}
+UNARY_OPERATIONS = {constants.NOT: loom_not, constants.MINUS: loom_negate}
+
+
+# closure makers: (operand closures) -> closure of the expression. the typed ones are for operands whose
+# type lang/inference.py knows, like the plain go operators the emitter writes for them, the others take
+# any value. arithmetic, what arithmetic-heavy code mostly computes, also gets the frame slots of operands
+# that are locals or constants (None for other operands) and reads those in place instead of calling
+# their closures, and the values that are not known to be ints take an inline path for two ints
+def any_arithmetic(operation, fallback, left, right, left_slot: int | None, right_slot: int | None):
+    if left_slot is not None and right_slot is not None:
+        def run(frame):
+            a = frame[left_slot]
+            b = frame[right_slot]
+            if type(a) is int and type(b) is int:
+                value = operation(a, b)
+                return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+            return fallback(a, b)
+    elif left_slot is not None:
+        def run(frame):
+            a = frame[left_slot]
+            b = right(frame)
+            if type(a) is int and type(b) is int:
+                value = operation(a, b)
+                return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+            return fallback(a, b)
+    elif right_slot is not None:
+        def run(frame):
+            a = left(frame)
+            b = frame[right_slot]
+            if type(a) is int and type(b) is int:
+                value = operation(a, b)
+                return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+            return fallback(a, b)
+    else:
+        def run(frame):
+            a = left(frame)
+            b = right(frame)
+            if type(a) is int and type(b) is int:
+                value = operation(a, b)
+                return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+            return fallback(a, b)
+    return run
+
+
+def int_arithmetic(operation, left, right, left_slot: int | None, right_slot: int | None):
+    if left_slot is not None and right_slot is not None:
+        def run(frame):
+            value = operation(frame[left_slot], frame[right_slot])
+            return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    elif left_slot is not None:
+        def run(frame):
+            value = operation(frame[left_slot], right(frame))
+            return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    elif right_slot is not None:
+        def run(frame):
+            value = operation(left(frame), frame[right_slot])
+            return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    else:
+        def run(frame):
+            value = operation(left(frame), right(frame))
+            return value if INT64_MIN <= value <= INT64_MAX else wrap(value)
+    return run
+
+
+def any_operation(operation):
+    def make(left, right):
+        return lambda frame: operation(left(frame), right(frame))
+    return make
+
+
+INT_OPERATIONS = {constants.PLUS: add, constants.MINUS: sub, constants.STAR: mul, constants.SLASH: int_divide}
+FLOAT_CLOSURES = {  # python mixes an int into a float the way go converts it, rounded to nearest
+    constants.PLUS: lambda left, right: lambda frame: left(frame) + right(frame),
+    constants.MINUS: lambda left, right: lambda frame: left(frame) - right(frame),
+    constants.STAR: lambda left, right: lambda frame: left(frame) * right(frame),
+    constants.SLASH: lambda left, right: lambda frame: float_divide(left(frame), right(frame))
+}
+SAME_TYPE_CLOSURES = {  # two operands of one known type, for two numbers that are not both ints see compile_binary
+    constants.LESSER: lambda left, right: lambda frame: left(frame) < right(frame),
+    constants.GREATER: lambda left, right: lambda frame: left(frame) > right(frame),
+    constants.LESSER_EQUAL: lambda left, right: lambda frame: left(frame) <= right(frame),
+    constants.GREATER_EQUAL: lambda left, right: lambda frame: left(frame) >= right(frame),
+    constants.DOUBLE_EQUAL: lambda left, right: lambda frame: left(frame) == right(frame),
+    constants.NOT_EQUAL: lambda left, right: lambda frame: left(frame) != right(frame)
+}
+ANY_CLOSURES = {operator: any_operation(operation) for operator, operation in OPERATIONS.items()}
+
+
+def as_float(operand, operand_type: str | None):
+    return operand if operand_type == FLOAT else lambda frame: float(operand(frame))
+
+
+class Interpreter:
+    # compiles a Program once into python closures and runs it. every function body becomes a list of
+    # statement closures, every expression node a closure taking the frame of the running function, with
+    # the dispatch on node kinds, operators and known operand types done while compiling: a local or
+    # parameter is read as frame[slot], a global as values[slot] (slots are the symbol indices of the
+    # scopes), a literal is a constant in the frame, a function name is the LoomFunction itself. nothing
+    # looks at a node while the program runs.
+    # the types of lang/inference.py pick the closures, the way the emitter picks go operators with them.
+    # run() runs the top level statements in order (what init() does in go), call() a function
+    def __init__(self, program) -> None:
+        if isinstance(program, ArenaProgram):
+            program = arena_to_objects(program)
+        symbols = infer_types(program)
+        self.types = TypeInference(symbols)
+        self.values: list = [ZERO_VALUES[symbol.type] if symbol.kind == constants.SYMBOL_VARIABLE else None
+                             for symbol in symbols.globals.symbols.values()]
+        self.slots: dict[str, int] = {name: symbol.index for name, symbol in symbols.globals.symbols.items()}
+        self.functions: dict[str, LoomFunction] = dict()
+        self.steps: list[tuple] = list()   # (closure, whether it is a return) per top level statement
+        self.frame: list = list()   # the frame of the top level statements, their constants (globals are values)
+        self.constants = self.frame     # the constants of the function being compiled, or of the top level
+        self.constant_slots: dict[tuple, int] = dict()
+        self.top_level_slots = self.constant_slots
+        self.frame_base = 0     # where the constants start in the frame
+        for statement in program.body:
+            if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+                self.compile_function(statement)
+            else:
+                self.compile_top_level(statement)
+
+    def run(self) -> int:
+        # the exit status: the int of a top level return (os.Exit, nothing after it runs), 0 for any other
+        # value or the end of the program
+        for step, is_return in self.steps:
+            value = step(self.frame)
+            if is_return:
+                return value if type(value) is int else 0
+        return 0
+
+    def call(self, name: str, *args):
+        function = self.functions.get(name)
+        if function is None:
+            raise KeyError(f"no function {name}")
+        return function(*args)
+
+    def get(self, name: str):
+        # the value of a global, the zero value of its type until its declaration ran
+        return self.values[self.slots[name]]
+
+    def compile_function(self, function) -> None:
+        types = self.types
+        return_type = types.enter_function(function).type
+        scope = types.scope
+        go_type = f"func({', '.join(GO_TYPE_NAMES[None] for _ in function.param)}) {GO_TYPE_NAMES[return_type]}"
+        loom_function = LoomFunction(function.name, go_type, len(function.param))
+        self.constants, self.constant_slots, self.frame_base = list(), dict(), len(scope.symbols)
+        self.functions[function.name] = self.values[self.slots[function.name]] = loom_function
+        for statement in function.body:
+            value_type = types.statement(statement)
+            if statement.kind == constants.NODE_RETURN_STATEMENT:
+                loom_function.result = self.compile_expression(statement.expression.expression)
+                break   # what follows never runs
+            value = self.compile_expression(self.__expression(statement))
+            if statement.kind == constants.NODE_VARIABLE_DECLARATION:
+                types.declare(statement, value_type)
+                loom_function.steps.append(assign(value, types.local_names[statement.identifier.name].index))
+            else:
+                loom_function.steps.append(value)
+        types.leave_function()
+        loom_function.template = [None] * self.frame_base + self.constants
+        self.constants, self.constant_slots, self.frame_base = self.frame, self.top_level_slots, 0
+
+    def compile_top_level(self, statement) -> None:
+        types = self.types
+        value_type = types.statement(statement)
+        value = self.compile_expression(self.__expression(statement))
+        if statement.kind == constants.NODE_VARIABLE_DECLARATION:
+            types.declare(statement, value_type)
+            self.steps.append((assign_global(value, self.values, self.slots[statement.identifier.name]), False))
+        else:
+            self.steps.append((value, statement.kind == constants.NODE_RETURN_STATEMENT))
+
+    @staticmethod
+    def __expression(statement):
+        if statement.kind == constants.NODE_VARIABLE_DECLARATION:
+            return statement.init.expression
+        if statement.kind == constants.NODE_RETURN_STATEMENT:
+            return statement.expression.expression
+        if statement.kind == constants.NODE_EXPRESSION_STATEMENT:
+            return statement.expression
+        raise LoomSyntaxError(f"can not run a {type(statement).__name__}", statement.line)
+
+    def compile_expression(self, expression):
+        # operands first with an explicit stack, a shared dag node is compiled once per statement (it means
+        # the same there, types are per statement as well)
+        closures: dict[int, object] = dict()
+        slots: dict[int, int | None] = dict()     # the frame slot of a leaf that is a local or a constant
+        depths: dict[int, int] = dict()
+        pending = [(expression, False)]
+        while pending:
+            node, ready = pending.pop()
+            if id(node) in closures:
+                continue
+            kind = node.kind
+            if kind == constants.NODE_BINARY_EXPRESSION:
+                if not ready:
+                    pending.extend(((node, True), (node.right, False), (node.left, False)))
+                    continue
+                closures[id(node)] = self.compile_binary(node, closures[id(node.left)], closures[id(node.right)],
+                                                         slots.get(id(node.left)), slots.get(id(node.right)))
+                depths[id(node)] = max(depths[id(node.left)], depths[id(node.right)]) + 1
+            elif kind == constants.NODE_UNARY_EXPRESSION:
+                if not ready:
+                    pending.extend(((node, True), (node.expression, False)))
+                    continue
+                closures[id(node)] = self.compile_unary(node, closures[id(node.expression)])
+                depths[id(node)] = depths[id(node.expression)] + 1
+            else:
+                slot = self.leaf_slot(node)
+                if slot is None:
+                    closures[id(node)] = self.compile_leaf(node)
+                else:
+                    closures[id(node)] = itemgetter(slot)
+                    slots[id(node)] = slot
+                depths[id(node)] = 1
+        if depths[id(expression)] > MAX_CLOSURE_DEPTH:
+            return self.compile_stack(expression, closures)
+        return closures[id(expression)]
+
+    def leaf_slot(self, node) -> int | None:
+        # the frame slot of a local or a literal (the first use of a literal adds it to the constants of the
+        # frame), None for a global or a function
+        kind = node.kind
+        if kind == constants.NODE_IDENTIFIER:
+            types = self.types
+            if types.local_names is None:
+                return None
+            symbol = types.local_names.get(node.name)
+            return symbol.index if symbol is not None else None
+        self.check_literal(node)
+        key = (type(node.value), repr(node.value))  # 0.0 and -0.0 are equal, they are not the same constant
+        slot = self.constant_slots.get(key)
+        if slot is None:
+            slot = self.constant_slots[key] = self.frame_base + len(self.constants)
+            self.constants.append(node.value)
+        return slot
+
+    def compile_leaf(self, node):
+        # a global, read from values, or a function, the LoomFunction itself
+        symbol = self.types.lookup(node.name)
+        if symbol.kind == constants.SYMBOL_FUNCTION:
+            function = self.functions[node.name]
+            return lambda frame: function
+        values = self.values
+        slot = symbol.index
+        return lambda frame: values[slot]
+
+    @staticmethod
+    def check_literal(node) -> None:
+        kind = node.kind
+        if kind == constants.NODE_INT_LITERAL:
+            if node.value > INT64_MAX:
+                raise LoomSyntaxError(f"integer literal {node.value} does not fit in 64 bits", node.line)
+        elif kind == constants.NODE_FLOAT_LITERAL:
+            if not math.isfinite(node.value):
+                raise LoomSyntaxError("float literal does not fit in 64 bits", node.line)
+        elif kind not in (constants.NODE_STRING_LITERAL, constants.NODE_BOOL_LITERAL):
+            raise LoomSyntaxError(f"can not run a {type(node).__name__}", node.line)
+
+    def compile_binary(self, node, left, right, left_slot: int | None, right_slot: int | None):
+        types = self.types
+        operator = node.operator
+        left_type, right_type, node_type = types.type_of(node.left), types.type_of(node.right), types.type_of(node)
+        if node_type == INT:
+            return int_arithmetic(INT_OPERATIONS[operator], left, right, left_slot, right_slot)
+        if node_type is None and operator in INT_OPERATIONS:
+            return any_arithmetic(INT_OPERATIONS[operator], OPERATIONS[operator], left, right, left_slot, right_slot)
+        if node_type == FLOAT:
+            return FLOAT_CLOSURES[operator](left, right)
+        if node_type == STRING:
+            if left_type == right_type == STRING:
+                return lambda frame: left(frame) + right(frame)
+            return lambda frame: sprint(left(frame)) + sprint(right(frame))
+        if left_type is not None and right_type is not None and operator in SAME_TYPE_CLOSURES:
+            if left_type == right_type and (left_type != BOOL or operator in (constants.DOUBLE_EQUAL,
+                                                                              constants.NOT_EQUAL)):
+                return SAME_TYPE_CLOSURES[operator](left, right)
+            if left_type in NUMBERS and right_type in NUMBERS and operator not in (constants.DOUBLE_EQUAL,
+                                                                                   constants.NOT_EQUAL):
+                return SAME_TYPE_CLOSURES[operator](as_float(left, left_type), as_float(right, right_type))
+        return ANY_CLOSURES[operator](left, right)
+
+    def compile_unary(self, node, operand):
+        operand_type = self.types.type_of(node.expression)
+        if node.operator == constants.NOT:
+            return lambda frame: not operand(frame)
+        if operand_type == INT:
+            return lambda frame: wrap(-operand(frame))
+        if operand_type == FLOAT:
+            return lambda frame: -operand(frame)
+        return lambda frame: loom_negate(operand(frame))
+
+    @staticmethod
+    def compile_stack(expression, closures: dict):
+        # an expression too deep for nested closures, as a postfix program over a value stack: a leaf pushes
+        # the value of its closure, an operator pops its operands and pushes its result
+        program = list()
+        pending = [expression]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, tuple):
+                program.append(node)
+            elif node.kind == constants.NODE_BINARY_EXPRESSION:
+                pending.extend(((2, OPERATIONS[node.operator]), node.right, node.left))
+            elif node.kind == constants.NODE_UNARY_EXPRESSION:
+                pending.extend(((1, UNARY_OPERATIONS[node.operator]), node.expression))
+            else:
+                program.append((0, closures[id(node)]))
+
+        def run(frame):
+            stack = list()
+            push, pop = stack.append, stack.pop
+            for operands, operation in program:
+                if operands == 0:
+                    push(operation(frame))
+                elif operands == 1:
+                    push(operation(pop()))
+                else:
+                    right = pop()
+                    push(operation(pop(), right))
+            return stack[0]
+        return run
+
+
+def assign(value, slot: int):
+    def run(frame):
+        frame[slot] = value(frame)
+    return run
+
+
+def assign_global(value, values: list, slot: int):
+    def run(frame):
+        values[slot] = value(frame)
+    return run
@@ -0,0 +1,381 @@
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from bisect import bisect_right
+from typing import BinaryIO
+
+from lang import constants
+from lang.incremental import IncrementalParser
+from lang.tokenizer import TokenStoreLexer
+from lang.utils.symbolUtils import declared_symbol
+
+# a language server (the language server protocol, json-rpc over stdio with Content-Length framing) keeping
+# every open document in memory with its IncrementalParser: text changes are applied to the text as they
+# come, and once a document had no change for DEBOUNCE seconds all of them are handed to the parser as one
+# edit and the diagnostics are published. a request on a document catches it up first
+DEBOUNCE = 0.05
+NEWLINE = re.compile(r"\n")
+DECLARED_NAME = re.compile(r"(?:var|function)\s+([a-z_][a-z0-9_]*)")   # at the start of a declaration
+TOKEN_TEXT = re.compile(r"[a-z0-9_.]+|\S")     # what a diagnostic underlines
+SYMBOL_KIND_FUNCTION = 12
+SEVERITY_ERROR = 1
+PARSE_ERROR = -32700
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+INVALID_REQUEST = -32600
+
+
+class Document:
+    # an open file: the text as the editor has it and a recovering IncrementalParser of it. the changes not
+    # parsed yet are kept as one edit of the parsed text, the smallest span covering all of them: pending is
+    # (start, end in the parsed text, end in the current text)
+    def __init__(self, uri: str, version: int, text: str) -> None:
+        self.uri = uri
+        self.version = version
+        self.text = text
+        self.parser = IncrementalParser(text, recover=True)
+        self.pending: tuple[int, int, int] | None = None
+        self.deadline: float | None = None  # when the pending changes get parsed
+        self.line_starts: list[int] | None = None
+        self.declarations: dict[str, int] | None = None     # global name -> index of its top level statement
+
+    def change(self, start: int, end: int, text: str) -> None:
+        self.text = self.text[:start] + text + self.text[end:]
+        if self.pending is None:
+            self.pending = (start, end, start + len(text))
+        else:
+            low, old_end, new_end = self.pending
+            high = max(new_end, end)
+            self.pending = (min(low, start), old_end + high - new_end, high + len(text) - (end - start))
+        self.line_starts = None
+
+    def flush(self) -> bool:
+        # parses the pending changes, False when there were none
+        self.deadline = None
+        if self.pending is None:
+            return False
+        start, end, new_end = self.pending
+        self.pending = None
+        self.parser.edit(start, end, self.text[start:new_end])
+        self.declarations = None
+        return True
+
+    def get_line_starts(self) -> list[int]:
+        if self.line_starts is None:
+            self.line_starts = [0] + [matched.end() for matched in NEWLINE.finditer(self.text)]
+        return self.line_starts
+
+    def offset(self, position: dict) -> int:
+        # offset of an lsp position, whose character counts utf-16 code units
+        line_starts = self.get_line_starts()
+        line = position["line"]
+        if line >= len(line_starts):
+            return len(self.text)
+        start = line_starts[line]
+        end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(self.text)
+        character = position["character"]
+        if self.text.isascii():
+            return min(start + character, end)
+        units = 0
+        for index in range(start, end):
+            if units >= character:
+                return index
+            units += 2 if ord(self.text[index]) > 0xffff else 1
+        return end
+
+    def position(self, offset: int) -> dict:
+        line_starts = self.get_line_starts()
+        line = bisect_right(line_starts, offset) - 1
+        prefix = self.text[line_starts[line]:offset]
+        character = len(prefix) if prefix.isascii() else len(prefix.encode("utf-16-le")) // 2
+        return {"line": line, "character": character}
+
+    def range(self, start: int, end: int) -> dict:
+        return {"start": self.position(start), "end": self.position(end)}
+
+    def diagnostics(self) -> list[dict]:
+        diagnostics = list()
+        for err, offset in self.parser.diagnostics:
+            matched = TOKEN_TEXT.match(self.text, offset)
+            end = matched.end() if matched is not None else offset
+            diagnostics.append({"range": self.range(offset, end), "severity": SEVERITY_ERROR,
+                                "source": "loomscript", "message": str(err)})
+        return diagnostics
+
+    def symbols(self) -> list[dict]:
+        # the top level functions, with their parameters
+        parser = self.parser
+        symbols = list()
+        for statement, start, end in zip(parser.program.body, parser.starts, parser.ends):
+            if statement.kind != constants.NODE_FUNCTION_DECLARATION:
+                continue
+            name = DECLARED_NAME.match(self.text, start)
+            params = [param.name for param in statement.param]
+            symbols.append({"name": statement.name, "detail": f"({', '.join(params)})",
+                            "kind": SYMBOL_KIND_FUNCTION, "range": self.range(start, end),
+                            "selectionRange": self.range(*name.span(1))})
+        return symbols
+
+    def definition(self, offset: int) -> tuple[int, int] | None:
+        # span of the declaration of the name at offset: a variable, a parameter or a function
+        parser = self.parser
+        index = bisect_right(parser.starts, offset) - 1
+        if index < 0 or offset > parser.ends[index]:
+            return None     # not in a statement that parsed
+        lexer = TokenStoreLexer(self.text)
+        lexer.tokenize_range(parser.starts[index], parser.ends[index], 1)
+        store = lexer.tokens
+        found = None
+        for token in range(len(store)):
+            if store.starts[token] <= offset <= store.ends[token] and store.types[token] == constants.ID:
+                found = token
+                break
+        if found is None:
+            return None
+        name = store.get_raw(found)
+        statement = parser.program.body[index]
+        if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+            local = local_declaration(store, found, name)
+            if local is not None:
+                return store.starts[local], store.ends[local]
+        elif statement.kind == constants.NODE_VARIABLE_DECLARATION and found == 1:
+            return store.starts[found], store.ends[found]   # the declared name itself
+        declaration = self.get_declarations().get(name)
+        if declaration is None:
+            return None
+        matched = DECLARED_NAME.match(self.text, parser.starts[declaration])
+        return matched.span(1)
+
+    def get_declarations(self) -> dict[str, int]:
+        if self.declarations is None:
+            self.declarations = dict()
+            for index, statement in enumerate(self.parser.program.body):
+                declared = declared_symbol(statement)
+                if declared is not None:
+                    self.declarations[declared[0]] = index
+        return self.declarations
+
+
+def local_declaration(store, found: int, name: str) -> int | None:
+    # the token declaring name where the function in store uses it at token found: a parameter or a local
+    # declared before (a local is declared after its initializer, `var x = x` reads the global x), the name of
+    # the function itself, None for a global
+    if found == 1:
+        return found
+    declared: dict[str, int] = dict()
+    pending = None  # the local of the var statement being read
+    in_params = False
+    for token in range(found + 1):
+        token_type = store.types[token]
+        if token_type == constants.OPEN_PARAM and token == 2:
+            in_params = True
+        elif token_type == constants.CLOSE_PARAM:
+            in_params = False
+        elif token_type == constants.ID and (in_params or (token > 0 and store.types[token - 1] == constants.KW_VAR)):
+            if token == found:
+                return found
+            if in_params:
+                declared[store.get_raw(token)] = token
+            else:
+                pending = token
+        elif token_type == constants.SEMICOLON and pending is not None:
+            declared[store.get_raw(pending)] = pending
+            pending = None
+    return declared.get(name)
+
+
+class LanguageServer:
+    # reads messages on a thread and handles them on the thread calling serve(), one at a time: a document
+    # is only ever touched by that thread. the queue is read with the timeout of the earliest deadline, so
+    # changes that keep coming are all applied before the document is parsed
+    def __init__(self, reader: BinaryIO, writer: BinaryIO, debounce: float = DEBOUNCE) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.debounce = debounce
+        self.messages: queue.Queue = queue.Queue()
+        self.documents: dict[str, Document] = dict()
+        self.initialized = False
+        self.shutdown = False
+        self.running = True
+        self.requests = {
+            "initialize": self.initialize,
+            "shutdown": self.stop,
+            "textDocument/documentSymbol": self.document_symbol,
+            "textDocument/definition": self.definition
+        }
+        self.notifications = {
+            "initialized": lambda params: None,
+            "exit": self.exit,
+            "textDocument/didOpen": self.did_open,
+            "textDocument/didChange": self.did_change,
+            "textDocument/didClose": self.did_close
+        }
+
+    def serve(self) -> int:
+        # the exit code: 0 after a shutdown request, 1 when the client went away or sent exit without one
+        threading.Thread(target=self.__read, daemon=True).start()
+        while self.running:
+            deadlines = [document.deadline for document in self.documents.values() if document.deadline is not None]
+            try:
+                message = self.messages.get(timeout=max(0.0, min(deadlines) - time.monotonic()) if deadlines else None)
+            except queue.Empty:
+                message = queue.Empty   # None is a message that did not parse, answered with a parse error
+            if message is EOFError:
+                break
+            if message is not queue.Empty:
+                self.handle(message)
+            now = time.monotonic()
+            for document in list(self.documents.values()):
+                if document.deadline is not None and document.deadline <= now:
+                    document.flush()
+                    self.publish(document)
+        return 0 if self.shutdown else 1
+
+    def handle(self, message) -> None:
+        if not isinstance(message, dict) or "method" not in message:
+            if isinstance(message, dict) and "id" in message:
+                return  # a response, the server sends no requests
+            self.respond(None, error=(INVALID_REQUEST if message is not None else PARSE_ERROR, "invalid message"))
+            return
+        method = message["method"]
+        params = message.get("params") or dict()
+        if "id" not in message:
+            handler = self.notifications.get(method)
+            if handler is not None and (self.initialized or method == "exit"):
+                handler(params)
+            return
+        handler = self.requests.get(method)
+        if handler is None:
+            self.respond(message["id"], error=(METHOD_NOT_FOUND, f"unknown method {method}"))
+        elif not self.initialized and method != "initialize":
+            self.respond(message["id"], error=(SERVER_NOT_INITIALIZED, "initialize first"))
+        else:
+            try:
+                self.respond(message["id"], handler(params))
+            except (KeyError, TypeError, ValueError) as err:
+                self.respond(message["id"], error=(INVALID_PARAMS, f"bad params: {err}"))
+            except Exception as err:
+                self.respond(message["id"], error=(INTERNAL_ERROR, f"{type(err).__name__}: {err}"))
+
+    def initialize(self, params: dict) -> dict:
+        self.initialized = True
+        return {"capabilities": {"positionEncoding": "utf-16",
+                                 "textDocumentSync": {"openClose": True, "change": 2},     # incremental
+                                 "documentSymbolProvider": True,
+                                 "definitionProvider": True},
+                "serverInfo": {"name": "loomscript"}}
+
+    def stop(self, params: dict) -> None:
+        self.shutdown = True
+        return None
+
+    def exit(self, params: dict) -> None:
+        self.running = False
+
+    def did_open(self, params: dict) -> None:
+        item = params["textDocument"]
+        document = self.documents[item["uri"]] = Document(item["uri"], item.get("version", 0), item["text"])
+        self.publish(document)
+
+    def did_change(self, params: dict) -> None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return
+        document.version = params["textDocument"].get("version", document.version)
+        for change in params["contentChanges"]:
+            if "range" in change:
+                document.change(document.offset(change["range"]["start"]), document.offset(change["range"]["end"]),
+                                change["text"])
+            else:
+                document.change(0, len(document.text), change["text"])
+        document.deadline = time.monotonic() + self.debounce
+
+    def did_close(self, params: dict) -> None:
+        uri = params["textDocument"]["uri"]
+        if self.documents.pop(uri, None) is not None:
+            self.notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def document_symbol(self, params: dict) -> list[dict]:
+        return self.__current(params).symbols()
+
+    def definition(self, params: dict) -> dict | None:
+        document = self.__current(params)
+        span = document.definition(document.offset(params["position"]))
+        if span is None:
+            return None
+        return {"uri": document.uri, "range": document.range(*span)}
+
+    def __current(self, params: dict) -> Document:
+        # the document of a request, its pending changes parsed (and their diagnostics published) first
+        document = self.documents[params["textDocument"]["uri"]]
+        if document.flush():
+            self.publish(document)
+        return document
+
+    def publish(self, document: Document) -> None:
+        self.notify("textDocument/publishDiagnostics", {"uri": document.uri, "version": document.version,
+                                                         "diagnostics": document.diagnostics()})
+
+    def respond(self, request_id, result=None, error: tuple[int, str] | None = None) -> None:
+        message = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            message["error"] = {"code": error[0], "message": error[1]}
+        else:
+            message["result"] = result
+        self.write(message)
+
+    def notify(self, method: str, params: dict) -> None:
+        self.write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def write(self, message: dict) -> None:
+        body = json.dumps(message, separators=(",", ":")).encode()
+        self.writer.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+        self.writer.flush()
+
+    def __read(self) -> None:
+        # messages into the queue, None for one that is not json, EOFError when the input ends
+        try:
+            while (message := read_message(self.reader)) is not EOFError:
+                self.messages.put(message)
+        finally:
+            self.messages.put(EOFError)
+
+
+def read_message(reader: BinaryIO):
+    # one framed message: headers up to an empty line, then Content-Length bytes of json. None for a message
+    # that is not json or has no valid length (the server answers with a parse error and reads on)
+    length = None
+    while True:
+        line = reader.readline()
+        if not line:
+            return EOFError
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            try:
+                length = int(value)
+            except ValueError:
+                length = -1
+    if length is None or length < 0:
+        return None
+    body = reader.read(length)
+    if len(body) < length:
+        return EOFError
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def serve_stdio(debounce: float = DEBOUNCE) -> int:
+    # the reader thread is still blocked reading when serve() returns, holding the lock of its file: it gets
+    # its own file over stdin that is never closed, closing sys.stdin at shutdown would wait for that lock
+    reader = open(sys.stdin.fileno(), 'rb', closefd=False)
+    return LanguageServer(reader, sys.stdout.buffer, debounce).serve()
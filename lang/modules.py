@@ -0,0 +1,388 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from lang import constants
+from lang.build import (AST_SUFFIX, SOURCE_SUFFIX, CompileResult, collect_sources, decode_source, default_jobs,
+                        output_path)
+from lang.cache import COMPILER_VERSION, default_cache_dir
+from lang.exception import LoomSyntaxError
+from lang.parser import Parse
+from lang.tokenizer import LEXER_ENGINES, TableLexer
+from lang.utils.astFileUtils import AST_FORMAT, write_program
+from lang.utils.tokenUtils import TokenIterator
+
+# a build of modules, files that import each other with `import "<path>";` (relative to the importing file,
+# .ls may be left out). a module is compiled once the modules it imports are, modules that do not depend on
+# each other in parallel, and its result is its .lsast file (lang/utils/astFileUtils.py) and its interface:
+# the names it declares, with the parameters of its functions. the state of the last build is kept in a json
+# file, per module the size, mtime and hash of its source, its imports, its interface and the interfaces of
+# the imports it was compiled against. a module is compiled again only when its source changed or the
+# interface of one of its imports did: a change inside a function body stops at its own module, and a build
+# where nothing changed only stats the files
+STATE_FORMAT = 1
+IMPORT_STATEMENT = (constants.KW_IMPORT, constants.STRING_LITERAL, constants.SEMICOLON)
+SCAN_CHUNK_SIZE = 4096  # imports come first, the scan lexes the start of a file only
+
+
+class Module:
+    # what the build knows about one source file, what the state file keeps of it
+    __slots__ = ("path", "size", "mtime", "digest", "imports", "exports", "interface", "uses", "errors", "output")
+
+    def __init__(self, path: str) -> None:
+        self.path = path    # absolute
+        self.size = -1
+        self.mtime = -1     # nanoseconds
+        self.digest = ""    # sha256 of the source bytes
+        self.imports: list[tuple[str, int]] = list()    # (path as written, line)
+        self.exports: list[tuple[str, int, list[str] | None]] = list()  # (name, symbol kind, parameters)
+        self.interface: str | None = None   # hash of exports, None while the module has errors
+        self.uses: dict[str, str | None] = dict()   # import -> its interface when this module was compiled
+        self.errors: list[tuple[int | None, str]] | None = None
+        self.output: str | None = None
+
+    def to_json(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__ if field != "path"}
+
+    @classmethod
+    def from_json(cls, path: str, fields: dict) -> "Module":
+        module = cls(path)
+        for field, value in fields.items():
+            setattr(module, field, value)
+        module.imports = [tuple(item) for item in module.imports]
+        module.exports = [tuple(item) for item in module.exports]
+        if module.errors is not None:
+            module.errors = [tuple(item) for item in module.errors]
+        return module
+
+    def result(self, display_path: str) -> CompileResult:
+        if self.errors:
+            return CompileResult(display_path, error=self.errors[0][1], line=self.errors[0][0],
+                                 diagnostics=self.errors)
+        return CompileResult(display_path, output=self.output)
+
+
+class BuildReport:
+    __slots__ = ("results", "compiled", "modules", "elapsed")
+
+    def __init__(self, results: list[CompileResult], compiled: list[str], modules: int, elapsed: float) -> None:
+        self.results = results      # one per module, the given files first, then the modules they import
+        self.compiled = compiled    # the modules compiled by this build, the others were up to date
+        self.modules = modules
+        self.elapsed = elapsed
+
+    def summary(self) -> str:
+        return f"{self.modules} modules, {len(self.compiled)} compiled, in {self.elapsed * 1000:.1f}ms"
+
+
+def resolve_import(importer: str, path: str) -> str:
+    if not path.endswith(SOURCE_SUFFIX):
+        path += SOURCE_SUFFIX
+    return os.path.normpath(os.path.join(os.path.dirname(importer), path))
+
+
+def scan_imports(source: str) -> list[tuple[str, int]]:
+    # (path, line) of the imports at the start of source, where a parse finds them. anything else ends the
+    # scan, a malformed import is left for the parse to report
+    chunks = (source[start:start + SCAN_CHUNK_SIZE] for start in range(0, len(source), SCAN_CHUNK_SIZE))
+    imports = list()
+    statement = list()
+    for token in TableLexer(chunks=chunks):
+        if token.get_type() != IMPORT_STATEMENT[len(statement)]:
+            break
+        statement.append(token)
+        if len(statement) == len(IMPORT_STATEMENT):
+            imports.append((statement[1].get_raw(), statement[0].get_line()))
+            statement = list()
+    return imports
+
+
+def module_exports(program) -> list[tuple[str, int, list[str] | None]]:
+    # what importing the module declares: its functions and global variables, not what it imports itself
+    exports = list()
+    for statement in program.body:
+        if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+            exports.append((statement.name, constants.SYMBOL_FUNCTION, [param.name for param in statement.param]))
+        elif statement.kind == constants.NODE_VARIABLE_DECLARATION:
+            exports.append((statement.identifier.name, constants.SYMBOL_VARIABLE, None))
+    return exports
+
+
+def fingerprint(exports: list) -> str:
+    return hashlib.sha256(json.dumps(exports).encode()).hexdigest()[:32]
+
+
+def compile_module(path: str, source: bytes, imports: dict[str, list], lexer: str = "table",
+                   recover: bool = False) -> tuple:
+    # compiles one module against the exports of its imports (path as written -> exports), in a worker.
+    # (exports, errors, output path)
+    def modules(import_path: str, line: int) -> list[tuple[str, int]]:
+        exports = imports.get(import_path)
+        if exports is None:
+            raise LoomSyntaxError(f"module \"{import_path}\" not found", line)
+        return [(name, kind) for name, kind, _ in exports]
+
+    try:
+        tokens = LEXER_ENGINES[lexer](decode_source(source)).tokenize()
+        parser = Parse(TokenIterator(tokens), recover=recover, modules=modules)
+        program = parser.parse()
+        if parser.diagnostics:
+            return None, [(err.line, str(err)) for err in parser.diagnostics], None
+        output = output_path(path, AST_SUFFIX)
+        write_program(program, output)
+        return module_exports(program), None, output
+    except LoomSyntaxError as err:
+        return None, [(err.line, str(err))], None
+    except (OSError, UnicodeDecodeError) as err:
+        return None, [(None, str(err))], None
+
+
+def default_state_path(paths: list[str]) -> str:
+    # one state file per set of build roots, in the compile cache directory
+    roots = json.dumps(sorted(os.path.abspath(path) for path in paths))
+    return os.path.join(default_cache_dir(), "builds", hashlib.sha256(roots.encode()).hexdigest()[:32] + ".json")
+
+
+class ModuleBuild:
+    # one run of the scheduler. modules are found from the given files through their imports, a module is
+    # ready once every module it imports is done: it is taken from the state when nothing it depends on
+    # changed, fails without a compile when an import failed, and is compiled otherwise (in a worker process
+    # when there are jobs > 1, the pool is only started once there is something to compile)
+    def __init__(self, state_path: str, jobs: int = 1, lexer: str = "table", recover: bool = False) -> None:
+        self.state_path = state_path
+        self.jobs = jobs
+        self.lexer = lexer
+        self.recover = recover
+        self.previous: dict[str, Module] = self.load_state()
+        self.modules: dict[str, Module] = dict()    # in the order they were found
+        self.sources: dict[str, bytes] = dict()     # sources read for this build, of the changed modules
+        self.changed: set[str] = set()
+        self.dependencies: dict[str, list[str]] = dict()
+        self.missing: dict[str, list[tuple[str, int]]] = dict()   # imports that are not a file
+        self.compiled: list[str] = list()
+        self.dirty = False  # the state file is out of date
+        self.display: dict[str, str] = dict()   # the path to report a module by: as given, or as imported from it
+
+    def load_state(self) -> dict[str, Module]:
+        try:
+            with open(self.state_path, 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return dict()
+        if state.get("options") != self.options():
+            return dict()   # another compiler or .lsast format, or errors reported differently
+        return {path: Module.from_json(path, fields) for path, fields in state["modules"].items()}
+
+    def options(self) -> list:
+        # what the outputs of the last build depend on besides the sources, any change compiles every module
+        return [STATE_FORMAT, COMPILER_VERSION, AST_FORMAT, self.recover]
+
+    def save_state(self) -> None:
+        modules = {path: module.to_json() for path, module in self.modules.items()}
+        state = {"options": self.options(), "modules": modules}
+        directory = os.path.dirname(self.state_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        except OSError:
+            return  # the next build starts from nothing
+        try:
+            with os.fdopen(handle, 'w') as file:
+                json.dump(state, file, separators=(",", ":"))
+            os.replace(temp_path, self.state_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def run(self, paths: list[str]) -> BuildReport:
+        start = time.perf_counter()
+        for path in collect_sources(paths):
+            self.display.setdefault(os.path.abspath(path), path)
+        roots = dict(self.display)
+        unreadable = dict()
+        pending = list(reversed(roots))
+        while pending:
+            path = pending.pop()
+            if path in self.modules or path in unreadable:
+                continue
+            try:
+                self.find(path)
+            except OSError as err:
+                unreadable[path] = CompileResult(self.display[path], error=str(err))
+                continue
+            for import_path, _ in reversed(self.modules[path].imports):
+                dependency = resolve_import(path, import_path)
+                if dependency in self.dependencies[path]:
+                    self.display.setdefault(dependency, resolve_import(self.display[path], import_path))
+                    pending.append(dependency)
+        self.schedule()
+        if self.dirty or self.modules.keys() != self.previous.keys():
+            self.save_state()
+        results = [unreadable.get(path) or self.modules[path].result(self.display[path]) for path in roots]
+        results.extend(module.result(self.display[path]) for path, module in self.modules.items()
+                       if path not in roots)
+        return BuildReport(results, self.compiled, len(self.modules), time.perf_counter() - start)
+
+    def find(self, path: str) -> Module:
+        # the module of path with its imports, from the state when the file did not change (same size and
+        # mtime, or else the same bytes). OSError when it can not be read
+        stat = os.stat(path)
+        module = self.previous.get(path)
+        if module is None or module.size != stat.st_size or module.mtime != stat.st_mtime_ns:
+            with open(path, 'rb') as file:
+                source = file.read()
+            digest = hashlib.sha256(source).hexdigest()
+            if module is None or module.digest != digest:
+                module = Module(path)
+                module.digest = digest
+                try:
+                    module.imports = scan_imports(decode_source(source))
+                except (LoomSyntaxError, UnicodeDecodeError):
+                    module.imports = list()     # the compile reports it
+                self.sources[path] = source
+                self.changed.add(path)
+            module.size, module.mtime = stat.st_size, stat.st_mtime_ns
+            self.dirty = True
+        self.modules[path] = module
+        dependencies = list()
+        for import_path, line in module.imports:
+            dependency = resolve_import(path, import_path)
+            if os.path.isfile(dependency):
+                dependencies.append(dependency)
+            else:
+                self.missing.setdefault(path, list()).append((import_path, line))
+        self.dependencies[path] = list(dict.fromkeys(dependencies))
+        return module
+
+    def schedule(self) -> None:
+        waiting = {path: set(dependencies) for path, dependencies in self.dependencies.items()}
+        dependents: dict[str, list[str]] = {path: list() for path in self.modules}
+        for path, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                dependents[dependency].append(path)
+        ready = [path for path, dependencies in waiting.items() if not dependencies]
+        done: set[str] = set()
+        running = dict()
+        executor = None
+        try:
+            while ready or running:
+                while ready:
+                    path = ready.pop()
+                    job = self.prepare(path)
+                    if job is None:
+                        finished = [path]
+                    elif self.jobs <= 1 or not (ready or running):     # nothing to run it alongside
+                        self.finish(path, compile_module(*job))
+                        finished = [path]
+                    else:
+                        if executor is None:
+                            executor = ProcessPoolExecutor(self.jobs)
+                        running[executor.submit(compile_module, *job)] = path
+                        continue
+                    ready.extend(self.release(finished, done, waiting, dependents))
+                if running:
+                    completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                    finished = list()
+                    for future in completed:
+                        path = running.pop(future)
+                        self.finish(path, future.result())
+                        finished.append(path)
+                    ready.extend(self.release(finished, done, waiting, dependents))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        for path in self.modules:
+            if path not in done:
+                self.fail(path, self.cycle(path, done))
+
+    @staticmethod
+    def release(finished: list[str], done: set[str], waiting: dict[str, set[str]],
+                dependents: dict[str, list[str]]) -> list[str]:
+        # the modules that become ready now that finished are done
+        ready = list()
+        for path in finished:
+            done.add(path)
+            for dependent in dependents[path]:
+                waiting[dependent].discard(path)
+                if not waiting[dependent]:
+                    ready.append(dependent)
+        return ready
+
+    def prepare(self, path: str) -> tuple | None:
+        # the arguments of compile_module for a module that has to be compiled, None when it is done already
+        # (up to date, or failed because of its imports)
+        module = self.modules[path]
+        uses = {dependency: self.modules[dependency].interface for dependency in self.dependencies[path]}
+        errors = [(line, f"module \"{import_path}\" not found") for import_path, line in self.missing.get(path, ())]
+        for import_path, line in module.imports:
+            dependency = resolve_import(path, import_path)
+            if dependency in uses and uses[dependency] is None:
+                errors.append((line, f"imported module \"{import_path}\" has errors"))
+        if errors:
+            if module.errors != errors or module.uses != uses:
+                module.errors, module.exports, module.interface, module.output = errors, list(), None, None
+                module.uses = uses
+                self.dirty = True
+            return None
+        if path not in self.changed and module.uses == uses and module.errors is None and module.output is not None \
+                and os.path.isfile(module.output):
+            return None
+        if path not in self.changed and module.uses == uses and module.errors is not None:
+            return None     # the same errors again
+        source = self.sources.pop(path, None)
+        if source is None:
+            try:
+                with open(path, 'rb') as file:
+                    source = file.read()
+            except OSError as err:
+                self.fail(path, [(None, str(err))])
+                return None
+        module.uses = uses
+        imports = {import_path: self.modules[resolve_import(path, import_path)].exports
+                   for import_path, _ in module.imports}
+        return path, source, imports, self.lexer, self.recover
+
+    def finish(self, path: str, compiled: tuple) -> None:
+        exports, errors, output = compiled
+        module = self.modules[path]
+        module.errors, module.output = errors, output
+        module.exports = exports if exports is not None else list()
+        module.interface = fingerprint(module.exports) if errors is None else None
+        self.compiled.append(path)
+        self.dirty = True
+
+    def fail(self, path: str, errors: list[tuple[int | None, str]]) -> None:
+        module = self.modules[path]
+        if module.errors != errors or module.uses:
+            module.errors, module.exports, module.interface, module.output = errors, list(), None, None
+            module.uses = dict()
+            self.dirty = True
+
+    def cycle(self, path: str, done: set[str]) -> list[tuple[int | None, str]]:
+        # the error of a module that was never ready: it is on an import cycle or imports a module that is.
+        # a module that is not done waits on an import that is not done either, followed until one repeats
+        trail = [path]
+        while True:
+            following = next(dependency for dependency in self.dependencies[trail[-1]] if dependency not in done)
+            if following in trail:
+                start = trail.index(following)
+                names = " -> ".join(self.display[item] for item in trail[start:] + [following])
+                line = self.import_line(path, trail[1] if len(trail) > 1 else following)
+                if start == 0:
+                    return [(line, f"import cycle: {names}")]
+                return [(line, f"imports a module of the import cycle {names}")]
+            trail.append(following)
+
+    def import_line(self, path: str, dependency: str) -> int | None:
+        return next((line for import_path, line in self.modules[path].imports
+                     if resolve_import(path, import_path) == dependency), None)
+
+
+def build_modules(paths: list[str], state_path: str | None = None, jobs: int | None = None, lexer: str = "table",
+                  recover: bool = False) -> BuildReport:
+    return ModuleBuild(state_path or default_state_path(paths), jobs or default_jobs(), lexer, recover).run(paths)
@@ -0,0 +1,465 @@
+import math
+from decimal import Decimal
+
+from lang import constants
+from lang.inference import BOOL, INT, LITERAL_TYPES, NUMBER_ONLY, NUMBERS, result_type
+from lang.utils.parserUtils import (BinaryExpression, BoolLiteral, ExpressionStatement, FloatLiteral, Identifier,
+                                    IntLiteral, Program, StringLiteral, UnaryExpression, VariableDeclaration)
+from lang.utils.symbolUtils import Scope
+
+# the passes rewrite a Program of node objects in place, between parsing and emission. every rewrite keeps
+# what the generated go does (lang/emitter.py runtime): int64 arithmetic wraps, '/' truncates, an int and a
+# float compute in float64, '+' with a string concatenates, '<' and friends only take two numbers or two
+# strings. what would panic at runtime (1 / 0, "a" - 1, literals past int64) is left alone so it still does,
+# and so is a float that is not finite or a negative zero (go constants have neither)
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+NUMBER_KINDS = (constants.NODE_INT_LITERAL, constants.NODE_FLOAT_LITERAL)
+COMPARISONS = {
+    constants.LESSER: lambda a, b: a < b,
+    constants.GREATER: lambda a, b: a > b,
+    constants.LESSER_EQUAL: lambda a, b: a <= b,
+    constants.GREATER_EQUAL: lambda a, b: a >= b
+}
+TEMPORARY_PREFIX = "Cse"    # LoomScript names are lower case, a temporary never clashes with one
+
+
+def wrap(value: int) -> int:
+    return (value - INT64_MIN) % (1 << 64) + INT64_MIN
+
+
+def go_sprint(value: int | float | str | bool) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return go_float(value)
+    return str(value)
+
+
+def go_float(value: float) -> str:
+    # fmt.Sprint of a float64: the shortest digits reading back as value, with an exponent below 1e-4 and
+    # from 1e6 on (%g with the shortest precision)
+    if value == 0:
+        return "-0" if math.copysign(1, value) < 0 else "0"
+    sign, digits, exponent = Decimal(repr(value)).as_tuple()
+    point = len(digits) + exponent      # digits before the decimal point
+    digits = "".join(map(str, digits)).rstrip("0")
+    if point - 1 < -4 or point - 1 >= 6:
+        text = digits[0] + ("." + digits[1:] if len(digits) > 1 else "") + \
+            ("e+" if point >= 1 else "e-") + f"{abs(point - 1):02d}"
+    elif point <= 0:
+        text = "0." + "0" * -point + digits
+    elif point >= len(digits):
+        text = digits + "0" * (point - len(digits))
+    else:
+        text = digits[:point] + "." + digits[point:]
+    return "-" + text if sign else text
+
+
+def fits(node) -> bool:
+    # an int literal past int64 (or a float one past float64) stays as it is, the emitter reports it
+    if node.kind == constants.NODE_FLOAT_LITERAL:
+        return math.isfinite(node.value)
+    return node.kind != constants.NODE_INT_LITERAL or INT64_MIN <= node.value <= INT64_MAX
+
+
+def go_float64(value: float) -> float | None:
+    # a float result go can have as a constant, None for inf, nan and -0
+    if not math.isfinite(value) or (value == 0 and math.copysign(1, value) < 0):
+        return None
+    return value
+
+
+def fold_binary(operator: int, left, right) -> int | float | str | bool | None:
+    # value of two constant operands, None when go would panic on them
+    a, b = left.value, right.value
+    if operator == constants.DOUBLE_EQUAL:
+        return left.kind == right.kind and a == b
+    if operator == constants.NOT_EQUAL:
+        return left.kind != right.kind or a != b
+    both_ints = left.kind == right.kind == constants.NODE_INT_LITERAL
+    numbers = left.kind in NUMBER_KINDS and right.kind in NUMBER_KINDS
+    if operator == constants.PLUS and constants.NODE_STRING_LITERAL in (left.kind, right.kind):
+        return go_sprint(a) + go_sprint(b)
+    if operator in COMPARISONS:
+        if both_ints or left.kind == right.kind == constants.NODE_STRING_LITERAL:
+            return COMPARISONS[operator](a, b)
+        if numbers:     # as go compares them, an int made a float64 first
+            return COMPARISONS[operator](float(a), float(b))
+        return None
+    if not numbers:
+        return None
+    if not both_ints:
+        return fold_float(operator, float(a), float(b))
+    if operator == constants.PLUS:
+        return wrap(a + b)
+    if operator == constants.MINUS:
+        return wrap(a - b)
+    if operator == constants.STAR:
+        return wrap(a * b)
+    if b == 0:
+        return None
+    quotient = abs(a) // abs(b)
+    return wrap(quotient if (a < 0) == (b < 0) else -quotient)
+
+
+def fold_float(operator: int, a: float, b: float) -> float | None:
+    if operator == constants.PLUS:
+        return go_float64(a + b)
+    if operator == constants.MINUS:
+        return go_float64(a - b)
+    if operator == constants.STAR:
+        return go_float64(a * b)
+    if b == 0:
+        return None     # inf or nan at runtime, go has no constant for them
+    return go_float64(a / b)
+
+
+def fold_unary(operator: int, operand) -> int | float | bool | None:
+    if operator == constants.NOT:
+        return not operand.value   # the truthiness of loomTruthy: false, 0, 0.0 and "" are false
+    if operand.kind == constants.NODE_FLOAT_LITERAL:
+        return go_float64(-operand.value)
+    if operand.kind != constants.NODE_INT_LITERAL:
+        return None
+    return wrap(-operand.value)
+
+
+def make_literal(value: int | float | str | bool, line: int):
+    if isinstance(value, bool):
+        return BoolLiteral(value, line)
+    if isinstance(value, int):
+        return IntLiteral(value, line)
+    if isinstance(value, float):
+        return FloatLiteral(value, line)
+    return StringLiteral(value, line)
+
+
+def is_literal(node) -> bool:
+    return node.kind in LITERAL_TYPES and fits(node)
+
+
+def is_int_literal(node, value: int) -> bool:
+    return node.kind == constants.NODE_INT_LITERAL and node.value == value
+
+
+class ExpressionRewriter:
+    # rewrites every expression of a program bottom up with an explicit stack (operator chains are as deep as
+    # they are long). rewrite_binary/rewrite_unary get the rewritten operands with their types and return
+    # the node that takes the place of the expression
+    def run(self, program: Program) -> Program:
+        pending = list(program.body)
+        while pending:
+            statement = pending.pop()
+            kind = statement.kind
+            if kind == constants.NODE_FUNCTION_DECLARATION:
+                pending.extend(statement.body)
+            elif kind == constants.NODE_VARIABLE_DECLARATION:
+                statement.init.expression = self.rewrite(statement.init.expression)
+            elif kind in (constants.NODE_RETURN_STATEMENT, constants.NODE_EXPRESSION_STATEMENT):
+                holder = statement.expression if kind == constants.NODE_RETURN_STATEMENT else statement
+                holder.expression = self.rewrite(holder.expression)
+        return program
+
+    def rewrite(self, expression):
+        order = list()
+        pending = [expression]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            if node.kind == constants.NODE_BINARY_EXPRESSION:
+                pending.append(node.left)
+                pending.append(node.right)
+            elif node.kind == constants.NODE_UNARY_EXPRESSION:
+                pending.append(node.expression)
+        results: list[tuple] = list()     # (rewritten node, its type)
+        for node in reversed(order):    # operands before the expression using them, left before right
+            kind = node.kind
+            if kind == constants.NODE_BINARY_EXPRESSION:
+                right, right_type = results.pop()
+                left, left_type = results.pop()
+                node.left = left
+                node.right = right
+                results.append(self.rewrite_binary(node, left_type, right_type))
+            elif kind == constants.NODE_UNARY_EXPRESSION:
+                operand, operand_type = results.pop()
+                node.expression = operand
+                results.append(self.rewrite_unary(node, operand_type))
+            else:
+                results.append((node, LITERAL_TYPES.get(kind)))
+        return results[0][0]
+
+    def rewrite_binary(self, node, left_type: str | None, right_type: str | None) -> tuple:
+        return node, result_type(node, left_type, right_type)
+
+    def rewrite_unary(self, node, operand_type: str | None) -> tuple:
+        return node, result_type(node, operand_type)
+
+
+class ConstantFolder(ExpressionRewriter):
+    # 2 * 3 + 1 -> 7, "a" + 1 -> "a1", 1 < 2 -> true, !"" -> true, -(5) -> -5
+    def rewrite_binary(self, node, left_type: str | None, right_type: str | None) -> tuple:
+        if is_literal(node.left) and is_literal(node.right):
+            value = fold_binary(node.operator, node.left, node.right)
+            if value is not None:
+                literal = make_literal(value, node.line)
+                return literal, LITERAL_TYPES[literal.kind]
+        return super().rewrite_binary(node, left_type, right_type)
+
+    def rewrite_unary(self, node, operand_type: str | None) -> tuple:
+        if is_literal(node.expression):
+            value = fold_unary(node.operator, node.expression)
+            if value is not None:
+                literal = make_literal(value, node.line)
+                return literal, LITERAL_TYPES[literal.kind]
+        return super().rewrite_unary(node, operand_type)
+
+
+class AlgebraicSimplifier(ConstantFolder):
+    # x + 0, 0 + x, x - 0, x * 1, 1 * x, x / 1 -> x and --x -> x, !!x -> x for a bool x. folds as well, so
+    # a constant left behind by a simplification is folded in the same walk.
+    # '+' with a string concatenates and -0.0 + 0 is 0.0, so x + 0 only goes when x is known to be an int.
+    # the number only operators (and '-x') panic when x is not a number, dropping them drops that panic
+    # when the type of x is not known, which is why this pass is only in -O2
+    def rewrite_binary(self, node, left_type: str | None, right_type: str | None) -> tuple:
+        operator, left, right = node.operator, node.left, node.right
+        if operator == constants.PLUS:
+            if is_int_literal(right, 0) and left_type == INT:
+                return left, INT
+            if is_int_literal(left, 0) and right_type == INT:
+                return right, INT
+        elif operator in NUMBER_ONLY and is_int_literal(right, 0 if operator == constants.MINUS else 1) and \
+                may_be_number(left_type):
+            return left, left_type
+        elif operator == constants.STAR and is_int_literal(left, 1) and may_be_number(right_type):
+            return right, right_type
+        return super().rewrite_binary(node, left_type, right_type)
+
+    def rewrite_unary(self, node, operand_type: str | None) -> tuple:
+        operand = node.expression
+        if operand.kind == constants.NODE_UNARY_EXPRESSION and operand.operator == node.operator:
+            inner_type = self.__type_of(operand.expression)
+            if node.operator == constants.MINUS and may_be_number(inner_type):
+                return operand.expression, inner_type
+            if node.operator == constants.NOT and inner_type == BOOL:
+                return operand.expression, BOOL
+        return super().rewrite_unary(node, operand_type)
+
+    @staticmethod
+    def __type_of(node) -> str | None:
+        # type of an already rewritten operand without walking it again, what its root alone tells
+        if node.kind in LITERAL_TYPES:
+            return LITERAL_TYPES[node.kind]
+        if node.kind == constants.NODE_UNARY_EXPRESSION or \
+                (node.kind == constants.NODE_BINARY_EXPRESSION and node.operator != constants.PLUS):
+            return result_type(node, None, None)
+        return None
+
+
+def may_be_number(value_type: str | None) -> bool:
+    return value_type is None or value_type in NUMBERS
+
+
+def fold_constants(program: Program) -> Program:
+    return ConstantFolder().run(program)
+
+
+def simplify_algebra(program: Program) -> Program:
+    return AlgebraicSimplifier().run(program)
+
+
+def remove_dead_code(program: Program) -> Program:
+    # statements after a return in a function body, and statements that are only a literal (after folding)
+    program.body = [statement for statement in program.body if not is_constant_statement(statement)]
+    for statement in program.body:
+        if statement.kind != constants.NODE_FUNCTION_DECLARATION:
+            continue
+        body = list()
+        for inner in statement.body:
+            if is_constant_statement(inner):
+                continue
+            body.append(inner)
+            if inner.kind == constants.NODE_RETURN_STATEMENT:
+                break
+        statement.body = body
+    return program
+
+
+def is_constant_statement(statement) -> bool:
+    return statement.kind == constants.NODE_EXPRESSION_STATEMENT and is_literal(statement.expression)
+
+
+def get_expression_holder(statement):
+    # the node whose .expression is the expression of a statement, None for a function declaration
+    kind = statement.kind
+    if kind == constants.NODE_VARIABLE_DECLARATION:
+        return statement.init
+    if kind == constants.NODE_RETURN_STATEMENT:
+        return statement.expression
+    if kind == constants.NODE_EXPRESSION_STATEMENT:
+        return statement
+    return None
+
+
+class CommonSubexpressions:
+    # value numbering over one function body: an expression is numbered by (kind, operator, numbers of its
+    # operands), an identifier by its name and how many times it was declared or assigned so far, so the
+    # same expression after `var x = ...` changed x is another value. numbers are handed out operands first,
+    # going down from the highest number tells how many times each value is evaluated once the values used
+    # at least twice are computed only once. those are hoisted into `var Cse<n> = ...` right before the
+    # first statement that needs them. a hoisted expression can panic one statement part earlier than it
+    # did, the statement still panics (-O2 only). scope is the function's in the symbol table, the
+    # temporaries are declared there
+    def __init__(self, scope: Scope | None = None) -> None:
+        self.scope = scope
+        self.numbers: dict[tuple, int] = dict()
+        self.operands: list[tuple[int, ...]] = list()   # by value number
+        self.first: list[int] = list()      # first statement the value is evaluated in
+        self.nodes: list = list()           # a node computing the value, in that statement
+        self.versions: dict[str, int] = dict()
+
+    def run(self, body: list) -> list:
+        statement_numbers = [self.__number(statement, index) for index, statement in enumerate(body)]
+        uses = [0] * len(self.operands)
+        for statement, numbers in zip(body, statement_numbers):
+            if numbers is not None:
+                uses[numbers[id(get_expression_holder(statement).expression)]] += 1
+        repeated = list()
+        for number in range(len(uses) - 1, -1, -1):
+            count = uses[number]
+            if count == 0 or not self.operands[number]:     # never evaluated, or a leaf
+                continue
+            if count >= 2:
+                repeated.append(number)
+                count = 1
+            for operand in self.operands[number]:
+                uses[operand] += count
+        if not repeated:
+            return body
+        repeated.reverse()      # operands have lower numbers, they are defined first
+        hoisted = {number: f"{TEMPORARY_PREFIX}{index}" for index, number in enumerate(repeated)}
+        if self.scope is not None:
+            for name in hoisted.values():
+                self.scope.declare(name, constants.SYMBOL_VARIABLE)
+        by_statement: dict[int, list[int]] = dict()
+        for number in repeated:
+            by_statement.setdefault(self.first[number], list()).append(number)
+        result = list()
+        for index, statement in enumerate(body):
+            for number in by_statement.get(index, ()):
+                node = self.nodes[number]
+                expression = self.__substitute(node, statement_numbers[index], hoisted, node)
+                result.append(VariableDeclaration(Identifier(hoisted[number], statement.line),
+                                                  ExpressionStatement(expression, statement.line), statement.line))
+            holder = get_expression_holder(statement)
+            if holder is not None:
+                holder.expression = self.__substitute(holder.expression, statement_numbers[index], hoisted, None)
+            result.append(statement)
+        return result
+
+    def __number(self, statement, index: int) -> dict[int, int] | None:
+        # value numbers of the nodes of one statement, by id (a shared node is the same value within one)
+        holder = get_expression_holder(statement)
+        if holder is None:
+            return None
+        numbers: dict[int, int] = dict()
+        order = list()
+        pending = [holder.expression]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            if node.kind == constants.NODE_BINARY_EXPRESSION:
+                pending.append(node.left)
+                pending.append(node.right)
+            elif node.kind == constants.NODE_UNARY_EXPRESSION:
+                pending.append(node.expression)
+        for node in reversed(order):
+            kind = node.kind
+            if kind == constants.NODE_BINARY_EXPRESSION:
+                operands = (numbers[id(node.left)], numbers[id(node.right)])
+                key = (kind, node.operator) + operands
+            elif kind == constants.NODE_UNARY_EXPRESSION:
+                operands = (numbers[id(node.expression)],)
+                key = (kind, node.operator) + operands
+            elif kind == constants.NODE_IDENTIFIER:
+                operands = ()
+                key = (kind, node.name, self.versions.get(node.name, 0))
+            else:
+                operands = ()
+                key = (kind, node.value)
+            number = self.numbers.get(key)
+            if number is None:
+                number = self.numbers[key] = len(self.operands)
+                self.operands.append(operands)
+                self.first.append(index)
+                self.nodes.append(node)
+            numbers[id(node)] = number
+        if statement.kind == constants.NODE_VARIABLE_DECLARATION:     # after its value, var x = x + 1 reads the old x
+            name = statement.identifier.name
+            self.versions[name] = self.versions.get(name, 0) + 1
+        return numbers
+
+    def __substitute(self, expression, numbers: dict[int, int], hoisted: dict[int, str], keep):
+        # the expression with every hoisted value (except the one keep computes) read from its temporary,
+        # nodes are copied where something below them changed, never changed in place (they may be shared)
+        order = list()
+        pending = [expression]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            if node is not keep and numbers[id(node)] in hoisted:
+                continue
+            if node.kind == constants.NODE_BINARY_EXPRESSION:
+                pending.append(node.left)
+                pending.append(node.right)
+            elif node.kind == constants.NODE_UNARY_EXPRESSION:
+                pending.append(node.expression)
+        results = list()
+        for node in reversed(order):
+            number = numbers[id(node)]
+            if node is not keep and number in hoisted:
+                results.append(Identifier(hoisted[number], node.line))
+            elif node.kind == constants.NODE_BINARY_EXPRESSION:
+                right = results.pop()
+                left = results.pop()
+                if left is not node.left or right is not node.right:
+                    node = BinaryExpression(left, node.operator, right, node.line)
+                results.append(node)
+            elif node.kind == constants.NODE_UNARY_EXPRESSION:
+                operand = results.pop()
+                if operand is not node.expression:
+                    node = UnaryExpression(node.operator, operand, node.line)
+                results.append(node)
+            else:
+                results.append(node)
+        return results[0]
+
+
+def eliminate_common_subexpressions(program: Program) -> Program:
+    for statement in program.body:
+        if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+            scope = program.symbols.functions.get(statement.name) if program.symbols is not None else None
+            statement.body = CommonSubexpressions(scope).run(statement.body)
+    return program
+
+
+PASSES = {
+    "fold": fold_constants,
+    "simplify": simplify_algebra,
+    "dce": remove_dead_code,
+    "cse": eliminate_common_subexpressions
+}
+OPTIMIZATION_LEVELS = {
+    0: (),
+    1: ("fold", "dce"),                 # the generated program does exactly what the unoptimized one does
+    2: ("simplify", "dce", "cse")       # simplify folds as well
+}
+DEFAULT_OPTIMIZATION = 1
+
+
+def optimize(program: Program, level: int = DEFAULT_OPTIMIZATION, passes: tuple[str, ...] | None = None) -> Program:
+    # runs the passes of an -O level, or the given pass names in order
+    for name in OPTIMIZATION_LEVELS[level] if passes is None else passes:
+        program = PASSES[name](program)
+    return program
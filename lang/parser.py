@@ -1,182 +1,357 @@
+from functools import partial
+
 from lang import constants
 
-from lang.utils.tokenUtils import Token, TokenIterator
+from lang.utils.tokenUtils import Token, TokenIterator, TokenStore
 from lang.utils.parserUtils import (Program,
                                     Statement,
                                     Expression,
                                     Identifier,
-                                    IntLiteral,
-                                    StringLiteral,
-                                    UnaryExpression,
-                                    ReturnStatement,
-                                    BinaryExpression,
-                                    FunctionDeclaration,
-                                    VariableDeclaration,
                                     ExpressionStatement,
-                                    Trace)
+                                    NodeFactory)
+from lang.utils.symbolUtils import Scope, SymbolTable
 
 from lang.exception import LoomSyntaxError
 
+# binding power of every operator, adding an operator to the language only needs an entry here
+# (plus its token in the lexer). binary operators are left associative, unary ones are prefix
+BINARY_PRECEDENCE = {
+    constants.DOUBLE_EQUAL: 1,
+    constants.NOT_EQUAL: 1,
+    constants.LESSER: 2,
+    constants.GREATER: 2,
+    constants.LESSER_EQUAL: 2,
+    constants.GREATER_EQUAL: 2,
+    constants.PLUS: 3,
+    constants.MINUS: 3,
+    constants.STAR: 4,
+    constants.SLASH: 4
+}
+UNARY_PRECEDENCE = {
+    constants.NOT: 5,
+    constants.MINUS: 5
+}
+GROUP_PRECEDENCE = 0    # '(' on the operator stack, nothing reduces past it
+# where a recovering parse resumes
+STATEMENT_KEYWORDS = (constants.KW_FUNCTION, constants.KW_VAR, constants.KW_RETURN, constants.KW_IMPORT)
+
 
 class Parse:
-    def __init__(self, tokens: TokenIterator) -> None:
+    def __init__(self, tokens: TokenIterator, nodes=NodeFactory, lazy: bool = False,
+                 symbols: SymbolTable | None = None, recover: bool = False, modules=None) -> None:
         self.tokens = tokens
-        self.stack_trace: list[Trace] = [Trace("global", 1)]
+        self.nodes = nodes  # NodeFactory or an ArenaBuilder
+        # every name is declared before it is used and once per scope, checked while parsing
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.scope: Scope | None = self.symbols.globals
+        # function bodies are skipped by brace matching and only parsed when .body is read, through the same
+        # factory (a dag shares the expressions of a body with the rest). needs node objects and a TokenIterator
+        # over a token list or store (not a TokenStream), an ArenaBuilder parses eagerly: its arena is final
+        self.lazy = lazy and hasattr(nodes, "lazy_function_declaration")
+        self.lazy_functions: list[Statement] = list()
+        # with recover a syntax error is recorded in diagnostics and the statement it is in is skipped (panic
+        # mode), parse() returns the Program of the statements that did parse. the first diagnostic is the
+        # error a parse without recover raises
+        self.recover = recover
+        self.diagnostics: list[LoomSyntaxError] = list()
+        # modules(path, line) gives the (name, symbol kind) pairs an imported module declares, or raises a
+        # LoomSyntaxError for a module it does not know (see lang/modules.py). without it a file can not
+        # import. imports come before every other statement, so they can be found without a parse
+        self.modules = modules
+        self.imports_closed = False
 
     def parse(self) -> Program:
-        program = Program()
-        program.body = self.parse_statements()
+        try:
+            program = self.nodes.program(self.parse_statements())
+        except Exception:
+            for function in self.lazy_functions:   # an eager parse stops at the first error in a skipped body
+                function.body
+            raise
+        program.symbols = self.symbols
         return program
 
     def parse_statements(self) -> list[Statement]:
+        if self.recover:
+            return self.recover_statements()
         statements: list[Statement] = list()
         while self.tokens.has_token():
-            tokens = self.tokens.get()
-            if tokens.is_of_type(constants.KW_FUNCTION):
-                if len(self.stack_trace) != 1:
-                    raise LoomSyntaxError(
-                        "function declaration inside another method or sub-block is not allowed",
-                        self.tokens.get().get_line()
-                    )
-                statements.append(self.parse_function())
-            elif tokens.is_of_type(constants.KW_VAR):
-                statements.append(self.parse_var())
-            elif tokens.is_of_type(constants.KW_RETURN):
-                statements.append(self.parse_return())
-            elif tokens.is_of_type(constants.CLOSE_BRACE):
-                self.stack_trace.pop()
+            if self.tokens.get().is_of_type(constants.CLOSE_BRACE):
+                self.scope = self.scope.parent
                 return statements
-            else:
-                statements.append(self.parse_expression())
-                self.tokens.expect_consume(1, constants.SEMICOLON)
+            statements.append(self.parse_statement())
+        return statements
+
+    def recover_statements(self) -> list[Statement]:
+        # parse_statements recording the error of a statement and skipping it instead of raising
+        tokens = self.tokens
+        scope = self.scope
+        statements: list[Statement] = list()
+        while tokens.has_token():
+            token = tokens.get()
+            if token.is_of_type(constants.CLOSE_BRACE):
+                self.scope = scope.parent
+                return statements
+            if token.is_of_type(constants.KW_FUNCTION) and scope.parent is not None:
+                # the '}' of the function is missing, most likely, rather than a nested function
+                err = LoomSyntaxError("function declaration inside another method or sub-block is not allowed",
+                                      token.get_line())
+                err.token = tokens.pointer
+                self.diagnostics.append(err)
+                self.scope = scope.parent
+                return statements
+            start = tokens.pointer
+            try:
+                statements.append(self.parse_statement())
+            except LoomSyntaxError as err:
+                err.token = tokens.pointer
+                self.diagnostics.append(err)
+                self.scope = scope
+                self.synchronize(start, token.is_of_type(constants.KW_FUNCTION))
         return statements
 
+    def synchronize(self, start: int, is_function: bool) -> None:
+        # skips the rest of the statement starting at start: up to and with its ';', or with the '}' closing a
+        # block opened in it (a broken function is skipped whole, up to its '}' even when its '{' is missing),
+        # or up to the '}' closing the enclosing block or a keyword that starts the next statement
+        tokens = self.tokens
+        if tokens.pointer > start and tokens.get(-1).is_of_type(constants.SEMICOLON, constants.CLOSE_BRACE):
+            return  # the error came after the statement ended
+        depth = 0
+        while tokens.has_token():
+            token_type = tokens.get().get_type()
+            if token_type == constants.OPEN_BRACE:
+                depth += 1
+            elif token_type == constants.CLOSE_BRACE:
+                if depth == 0 and not is_function:
+                    return
+                depth -= 1
+                if depth <= 0:
+                    tokens.move()
+                    return
+            elif depth == 0:
+                if token_type == constants.SEMICOLON and not is_function:
+                    tokens.move()
+                    return
+                if token_type in STATEMENT_KEYWORDS and tokens.pointer > start and \
+                        (not is_function or token_type == constants.KW_FUNCTION):
+                    return
+            tokens.move()
+
+    def parse_statement(self) -> Statement:
+        tokens = self.tokens.get()
+        if tokens.is_of_type(constants.KW_IMPORT):
+            return self.parse_import()
+        if self.scope.parent is None:
+            self.imports_closed = True
+        if tokens.is_of_type(constants.KW_FUNCTION):
+            if self.scope.parent is not None:
+                raise LoomSyntaxError(
+                    "function declaration inside another method or sub-block is not allowed",
+                    self.tokens.get().get_line()
+                )
+            return self.parse_function()
+        elif tokens.is_of_type(constants.KW_VAR):
+            return self.parse_var()
+        elif tokens.is_of_type(constants.KW_RETURN):
+            return self.parse_return()
+        statement = self.parse_expression()
+        self.tokens.expect_consume(1, constants.SEMICOLON)
+        return statement
+
     def parse_var(self) -> Statement:
         token = self.tokens.get()
         self.tokens.expect_consume(1, constants.KW_VAR)
         raw_identifier = self.tokens.expect_consume(1, constants.ID)
-        identifier = Identifier(raw_identifier.get_raw(), raw_identifier.get_line())
-        self.tokens.expect_consume(1, constants.EQUAL)
-        init = self.parse_expression()
+        identifier = self.nodes.identifier(raw_identifier.get_raw(), raw_identifier.get_line())
+        try:
+            self.tokens.expect_consume(1, constants.EQUAL)
+            init = self.parse_expression()
+            self.tokens.expect_consume(1, constants.SEMICOLON)
+        except LoomSyntaxError:
+            if self.recover:    # declared anyway, the statements using it do not report it again
+                self.scope.declare(raw_identifier.get_raw(), constants.SYMBOL_VARIABLE)
+            raise
+        # declared after its initializer, which may still read an outer variable of the same name
+        if self.scope.declare(raw_identifier.get_raw(), constants.SYMBOL_VARIABLE) is None:
+            raise LoomSyntaxError(f"'{raw_identifier.get_raw()}' is already declared", raw_identifier.get_line())
+        return self.nodes.variable_declaration(identifier, init, token.get_line())
+
+    def parse_import(self) -> Statement:
+        token = self.tokens.get()
+        if self.scope.parent is not None or self.imports_closed:
+            raise LoomSyntaxError("import is only allowed at the start of a file, before any other statement",
+                                  token.get_line())
+        self.tokens.expect_consume(1, constants.KW_IMPORT)
+        path = self.tokens.expect_consume(1, constants.STRING_LITERAL).get_raw()
         self.tokens.expect_consume(1, constants.SEMICOLON)
-        return VariableDeclaration(identifier, init, token.get_line())
+        if self.modules is None:
+            raise LoomSyntaxError(f"can not import \"{path}\" outside of a module build (--build)", token.get_line())
+        for name, kind in self.modules(path, token.get_line()):
+            if self.scope.declare(name, kind) is None:
+                raise LoomSyntaxError(f"'{name}' of \"{path}\" is already declared", token.get_line())
+        return self.nodes.import_statement(path, token.get_line())
 
     def parse_return(self) -> Statement:
         token = self.tokens.get()
         self.tokens.expect_consume(1, constants.KW_RETURN)
-        return_statement = ReturnStatement(self.parse_expression(), token.get_line())
+        return_statement = self.nodes.return_statement(self.parse_expression(), token.get_line())
         self.tokens.expect_consume(1, constants.SEMICOLON)
         return return_statement
 
     def parse_function(self) -> Statement:
         name: Token = self.tokens.move_expect(1, constants.ID)
-        self.stack_trace.append(Trace(name.get_raw(), name.get_line()))     # adding to the stack trace
+        if self.scope.declare(name.get_raw(), constants.SYMBOL_FUNCTION) is None:
+            raise LoomSyntaxError(f"'{name.get_raw()}' is already declared", name.get_line())
+        self.scope = self.symbols.open_function(name.get_raw())
         self.tokens.move_expect(1, constants.OPEN_PARAM)
         self.tokens.move()
         params: list[Identifier] = self.parse_params()
         self.tokens.expect_consume(1, constants.CLOSE_PARAM)
         self.tokens.expect_consume(1, constants.OPEN_BRACE)
+        if self.lazy and (close := self.match_brace()) is not None:
+            body_parser = partial(parse_body, self.tokens.tokens, self.tokens.pointer, close + 1, self.scope,
+                                  self.nodes)
+            self.scope = self.scope.parent
+            self.tokens.move(close + 1 - self.tokens.pointer)
+            function = self.nodes.lazy_function_declaration(name.get_raw(), params, body_parser, name.get_line())
+            self.lazy_functions.append(function)
+            return function
         body: list[Statement] = self.parse_statements()
-        self.tokens.expect_consume(1, constants.CLOSE_BRACE)
-        return FunctionDeclaration(name.get_raw(), params, body, name.get_line())
+        if not (self.recover and self.tokens.has_token() and self.tokens.get().is_of_type(constants.KW_FUNCTION)):
+            self.tokens.expect_consume(1, constants.CLOSE_BRACE)
+        return self.nodes.function_declaration(name.get_raw(), params, body, name.get_line())
+
+    def match_brace(self) -> int | None:
+        # index of the '}' closing the block the pointer is in, None when it is never closed
+        tokens = self.tokens.tokens
+        index = self.tokens.pointer
+        if isinstance(tokens, TokenStore):  # bodies never hold a '{' when they parse, so mostly one array.index
+            types = tokens.types
+            try:
+                close = types.index(constants.CLOSE_BRACE, index)
+            except ValueError:
+                return None
+            try:
+                types.index(constants.OPEN_BRACE, index, close)
+            except ValueError:
+                return close
+        depth = 1
+        for index in range(index, len(tokens)):
+            token_type = tokens[index].get_type()
+            if token_type == constants.CLOSE_BRACE:
+                depth -= 1
+                if depth == 0:
+                    return index
+            elif token_type == constants.OPEN_BRACE:
+                depth += 1
+        return None
 
     def parse_params(self) -> list[Identifier]:
-        name_set = set()
         params: list[Identifier] = list()
         if self.tokens.has_token() and self.tokens.get().is_of_type(constants.CLOSE_PARAM):     # no arg functions
             return params
         while self.tokens.has_token():
             token = self.tokens.expect_consume(1, constants.ID)
             name = token.get_raw()
-            if name in name_set:    # todo: make it scoped by add it to stack_trace
+            if self.scope.declare(name, constants.SYMBOL_PARAMETER) is None:
                 raise LoomSyntaxError(f"re-usage of argument name '{name}'", token.get_line())
-            else:
-                name_set.add(name)
-            params.append(Identifier(token.get_raw(), token.get_line()))
-            if self.tokens.get().is_of_type(constants.CLOSE_PARAM):
+            params.append(self.nodes.identifier(token.get_raw(), token.get_line()))
+            if self.tokens.has_token() and self.tokens.get().is_of_type(constants.CLOSE_PARAM):
                 break
             self.tokens.expect_consume(1, constants.COMMA)
         return params
 
     def parse_expression(self) -> ExpressionStatement:
-        expression = self.equality()
-        return ExpressionStatement(expression, expression.line)
+        expression = self.expression()
+        return self.nodes.expression_statement(expression, expression.line)
 
-    def equality(self) -> Expression:
-        left_expression: Expression = self.comparison()
-        while self.tokens.has_token() and self.tokens.get().is_of_type(constants.DOUBLE_EQUAL, constants.NOT_EQUAL):
-            self.tokens.move()
-            operator: Token = self.tokens.get()
-            right_expression: Expression = self.comparison()
-            left_expression = BinaryExpression(
-                left_expression,
-                operator.get_type(),
-                right_expression,
-                operator.get_line())
-        return left_expression
-
-    def comparison(self) -> Expression:
-        left_expression: Expression = self.term()
-        while self.tokens.has_token() and self.tokens.get().is_of_type(constants.LESSER, constants.GREATER,
-                                                                       constants.LESSER_EQUAL, constants.GREATER_EQUAL):
-            operator: Token = self.tokens.get()
-            self.tokens.move()
-            right_expression: Expression = self.term()
-            left_expression = BinaryExpression(
-                left_expression,
-                operator.get_type(),
-                right_expression,
-                operator.get_line())
-        return left_expression
-
-    def term(self) -> Expression:
-        left_expression: Expression = self.factor()
-        while self.tokens.has_token() and self.tokens.get().is_of_type(constants.PLUS, constants.MINUS):
-            operator: Token = self.tokens.get()
-            self.tokens.move()
-            right_expression: Expression = self.factor()
-            left_expression = BinaryExpression(
-                left_expression,
-                operator.get_type(),
-                right_expression,
-                operator.get_line())
-        return left_expression
-
-    def factor(self) -> Expression:
-        left_expression: Expression = self.unary()
-        while self.tokens.has_token() and self.tokens.get().is_of_type(constants.STAR, constants.SLASH):
-            operator: Token = self.tokens.get()
-            self.tokens.move()
-            right_expression: Expression = self.unary()
-            left_expression = BinaryExpression(
-                left_expression,
-                operator.get_type(),
-                right_expression,
-                operator.get_line())
-        return left_expression
-
-    def unary(self) -> Expression:
-        if self.tokens.has_token():
-            token = self.tokens.get()
-            if token.is_of_type(constants.NOT, constants.MINUS):
-                right_expression: Expression = self.unary()
-                return UnaryExpression(token.get_type(), right_expression, token.get_line())
-        return self.primary()
+    def expression(self) -> Expression:
+        # operator precedence parsing over explicit stacks, so nesting depth never touches the recursion limit
+        tokens = self.tokens
+        operands: list[Expression] = list()
+        operators: list[tuple[int, int, int, bool]] = list()    # (precedence, operator, line, is unary)
+        open_groups = 0
+        while True:
+            token = tokens.get()
+            token_type = token.get_type() if token is not None else None
+            while token_type in UNARY_PRECEDENCE or token_type == constants.OPEN_PARAM:
+                if token_type == constants.OPEN_PARAM:
+                    operators.append((GROUP_PRECEDENCE, token_type, token.get_line(), False))
+                    open_groups += 1
+                else:
+                    operators.append((UNARY_PRECEDENCE[token_type], token_type, token.get_line(), True))
+                tokens.move()
+                token = tokens.get()
+                token_type = token.get_type() if token is not None else None
+            operands.append(self.primary())
+
+            token = tokens.get()
+            token_type = token.get_type() if token is not None else None
+            while open_groups and token_type == constants.CLOSE_PARAM:
+                self.reduce(operands, operators, GROUP_PRECEDENCE + 1)
+                operators.pop()
+                open_groups -= 1
+                tokens.move()
+                token = tokens.get()
+                token_type = token.get_type() if token is not None else None
+            precedence = BINARY_PRECEDENCE.get(token_type)
+            if precedence is None:
+                break
+            if operators and operators[-1][0] >= precedence:
+                self.reduce(operands, operators, precedence)
+            operators.append((precedence, token_type, token.get_line(), False))
+            tokens.move()
+
+        if open_groups:
+            raise LoomSyntaxError(
+                f"expected {constants.get_constants_name(constants.CLOSE_PARAM)}, "
+                f"but got {token.get_raw() if token is not None else 'nothing'}",
+                token.get_line() if token is not None else tokens.get(-1).get_line()
+            )
+        self.reduce(operands, operators, GROUP_PRECEDENCE + 1)
+        return operands[0]
+
+    def reduce(self, operands: list[Expression], operators: list[tuple[int, int, int, bool]], precedence: int) -> None:
+        # builds the nodes of every stacked operator binding at least as tight as precedence
+        while operators and operators[-1][0] >= precedence:
+            _, operator, line, is_unary = operators.pop()
+            right_expression = operands.pop()
+            if is_unary:
+                operands.append(self.nodes.unary_expression(operator, right_expression, line))
+            else:
+                operands[-1] = self.nodes.binary_expression(operands[-1], operator, right_expression, line)
 
     def primary(self) -> Expression:
-        if not self.tokens.has_token():
-            raise LoomSyntaxError("Invalid expression", self.tokens.get(-1).get_line())
         token = self.tokens.get()
-        if token.is_of_type(constants.INT_LITERAL):
-            value: int = int(token.get_raw())
+        if token is None:
+            raise LoomSyntaxError("Invalid expression", self.tokens.get(-1).get_line())
+        token_type = token.get_type()
+        if token_type == constants.ID:
+            if self.scope.lookup(token.get_raw()) is None:
+                if self.recover:    # reported once
+                    self.scope.declare(token.get_raw(), constants.SYMBOL_VARIABLE)
+                raise LoomSyntaxError(f"'{token.get_raw()}' is not declared", token.get_line())
             self.tokens.move()
-            return IntLiteral(value, token.get_line())
-        elif token.is_of_type(constants.STRING_LITERAL):
-            value: str = token.get_raw()
+            return self.nodes.identifier(token.get_raw(), token.get_line())
+        elif token_type == constants.INT_LITERAL:
             self.tokens.move()
-            return StringLiteral(value, token.get_line())
-        elif token.is_of_type(constants.ID):
-            name: str = token.get_raw()
+            return self.nodes.int_literal(int(token.get_raw()), token.get_line())
+        elif token_type == constants.STRING_LITERAL:
             self.tokens.move()
-            return Identifier(name, token.get_line())
+            return self.nodes.string_literal(token.get_raw(), token.get_line())
+        elif token_type == constants.FLOAT_LITERAL:     # the raw of 1.5 is "1..5", see make_float_raw
+            self.tokens.move()
+            return self.nodes.float_literal(float(token.get_raw().replace("..", ".", 1)), token.get_line())
         raise LoomSyntaxError(f"Invalid literal '{token.get_raw()}'", token.get_line())
+
+
+def parse_body(tokens: list[Token] | TokenStore, start: int, stop: int, scope: Scope,
+               nodes=NodeFactory) -> list[Statement]:
+    # parses a function body skipped by a lazy Parse, tokens[start:stop] ends with the closing '}'. the parser
+    # state is the one parse_function had at that point, so the statements (and errors) are the same
+    iterator = TokenIterator(tokens)
+    iterator.pointer = start
+    iterator.length = stop
+    parser = Parse(iterator, nodes)
+    parser.scope = scope
+    return parser.parse_statements()
@@ -0,0 +1,284 @@
+from collections import Counter
+
+from lang import constants
+from lang.utils.parserUtils import CHILD_KINDS, NODE_CHILDREN, NODE_NAMES
+
+# passes over a whole tree (node objects, dag or arena) that a PassManager runs together: every pass that
+# only reads the tree shares one walk with the passes next to it, so n passes cost one walk plus their own
+# work instead of n walks
+LEAVE = object()    # a stack entry after it, the node whose children are all visited
+BINARY_OPERATORS = frozenset([constants.PLUS, constants.MINUS, constants.STAR, constants.SLASH, constants.LESSER,
+                              constants.GREATER, constants.LESSER_EQUAL, constants.GREATER_EQUAL,
+                              constants.DOUBLE_EQUAL, constants.NOT_EQUAL])
+UNARY_OPERATORS = frozenset([constants.MINUS, constants.NOT])
+LITERAL_VALUE_TYPES = {
+    constants.NODE_INT_LITERAL: int,
+    constants.NODE_FLOAT_LITERAL: float,
+    constants.NODE_STRING_LITERAL: str,
+    constants.NODE_BOOL_LITERAL: bool
+}
+
+
+def reachable_kinds() -> dict[int, frozenset[int]]:
+    # kinds that can be anywhere below a node kind, from the kinds of its children (CHILD_KINDS)
+    below = {kind: set(CHILD_KINDS.get(kind, ())) for kind in NODE_NAMES}
+    changed = True
+    while changed:
+        changed = False
+        for kinds in below.values():
+            grown = kinds.union(*(below[kind] for kind in kinds))
+            if len(grown) != len(kinds):
+                kinds |= grown
+                changed = True
+    return {kind: frozenset(kinds) for kind, kinds in below.items()}
+
+
+REACHABLE = reachable_kinds()
+
+
+class Pass:
+    # visit_<node name> methods (see NODE_NAMES) run before the children of a node, leave_<node name> after
+    # them, visit_node / leave_node for the kinds without their own method. the kinds a pass handles are
+    # looked up once per pass class, the walk never goes below a node where no pass of it has anything to do.
+    # a pass that changes the tree in place sets rewrites, it gets a walk of its own: passes after it see the
+    # tree it left, not one half rewritten
+    rewrites = False
+
+    @classmethod
+    def handlers(cls) -> dict[int, tuple]:
+        # node kind -> (visit function, leave function), None for what the pass does not handle
+        table = cls.__dict__.get("handler_table")
+        if table is None:
+            visit_node, leave_node = getattr(cls, "visit_node", None), getattr(cls, "leave_node", None)
+            table = cls.handler_table = {kind: (getattr(cls, "visit_" + name, visit_node),
+                                                getattr(cls, "leave_" + name, leave_node))
+                                         for kind, name in NODE_NAMES.items()}
+        return table
+
+    def begin(self, program) -> None:
+        pass
+
+    def finish(self):
+        # the result of the pass, once the walk is over
+        return None
+
+
+class PassManager:
+    # runs passes in order: consecutive passes that do not rewrite the tree are fused into one walk. the walk
+    # is iterative (expressions can be deeper than the recursion limit) and dispatches through one table per
+    # walk, node kind -> the bound methods of all its passes
+    def __init__(self, passes: list[Pass]) -> None:
+        self.passes = passes
+        self.groups: list[list[Pass]] = list()
+        for current in passes:
+            if not self.groups or current.rewrites or self.groups[-1][-1].rewrites:
+                self.groups.append([current])
+            else:
+                self.groups[-1].append(current)
+        self.visited = 0    # nodes the walks went through
+
+    def run(self, program) -> list:
+        # the results of the passes (finish()), in the order of the passes
+        for group in self.groups:
+            for current in group:
+                current.begin(program)
+            self.__walk(program, group)
+        return [current.finish() for current in self.passes]
+
+    def __walk(self, program, group: list[Pass]) -> None:
+        visits: dict[int, list] = {kind: list() for kind in NODE_NAMES}
+        leaves: dict[int, list] = {kind: list() for kind in NODE_NAMES}
+        for current in group:
+            for kind, (visit, leave) in type(current).handlers().items():
+                if visit is not None:
+                    visits[kind].append(visit.__get__(current))
+                if leave is not None:
+                    leaves[kind].append(leave.__get__(current))
+        handled = {kind for kind in NODE_NAMES if visits[kind] or leaves[kind]}
+        children = {kind: NODE_CHILDREN[kind][::-1] for kind in NODE_NAMES if REACHABLE[kind] & handled}
+        visits = {kind: tuple(methods) for kind, methods in visits.items()}
+        leaves = {kind: tuple(methods[::-1]) for kind, methods in leaves.items() if methods}
+        visited = 0
+        stack = [program]
+        push = stack.append
+        extend = stack.extend
+        while stack:
+            node = stack.pop()
+            if node is LEAVE:
+                node = stack.pop()
+                for leave in leaves[node.kind]:
+                    leave(node)
+                continue
+            visited += 1
+            kind = node.kind
+            for visit in visits[kind]:
+                visit(node)
+            if kind in leaves:
+                push(node)
+                push(LEAVE)
+            fields = children.get(kind)
+            if fields is None:
+                continue
+            for field in fields:    # reversed, so the stack pops them in source order
+                child = getattr(node, field)
+                if isinstance(child, list):
+                    extend(reversed(child))
+                elif child is not None:
+                    push(child)
+        self.visited += visited
+
+
+def run_passes(program, *passes: Pass) -> list:
+    return PassManager(list(passes)).run(program)
+
+
+class NodeStatistics(Pass):
+    # nodes by kind name, a shared dag node as often as it is used
+    def begin(self, program) -> None:
+        self.kinds: Counter = Counter()
+
+    def visit_node(self, node) -> None:
+        self.kinds[node.kind] += 1
+
+    def finish(self) -> Counter:
+        return Counter({NODE_NAMES[kind]: count for kind, count in self.kinds.items()})
+
+
+class TreeValidator(Pass):
+    # what the parser guarantees about a tree and the optimizer, the ast files and the tree factories must
+    # keep: operators of the right arity, literal values of the literal type, functions at the top level
+    # only, identifiers where names are declared. the problems as "line <n>: <what>", empty for a valid tree
+    def begin(self, program) -> None:
+        self.problems: list[str] = list()
+        self.functions = 0      # function declarations the walk is in
+
+    def problem(self, node, message: str) -> None:
+        self.problems.append(f"line {node.line}: {message}")
+
+    def visit_unary_expression(self, node) -> None:
+        if node.operator not in UNARY_OPERATORS:
+            self.problem(node, f"{constants.get_constants_name(node.operator)} is not a unary operator")
+
+    def visit_binary_expression(self, node) -> None:
+        if node.operator not in BINARY_OPERATORS:
+            self.problem(node, f"{constants.get_constants_name(node.operator)} is not a binary operator")
+
+    def visit_int_literal(self, node) -> None:
+        self.check_literal(node)
+
+    def visit_float_literal(self, node) -> None:
+        self.check_literal(node)
+
+    def visit_string_literal(self, node) -> None:
+        self.check_literal(node)
+
+    def visit_bool_literal(self, node) -> None:
+        self.check_literal(node)
+
+    def check_literal(self, node) -> None:
+        expected = LITERAL_VALUE_TYPES[node.kind]
+        if type(node.value) is not expected:
+            self.problem(node, f"{NODE_NAMES[node.kind]} holds a {type(node.value).__name__}")
+
+    def visit_identifier(self, node) -> None:
+        if not node.name.isidentifier():
+            self.problem(node, f"{node.name!r} is not a name")
+
+    def visit_function_declaration(self, node) -> None:
+        if self.functions:
+            self.problem(node, f"function {node.name} inside another function")
+        self.functions += 1
+        for param in node.param:
+            if param.kind != constants.NODE_IDENTIFIER:
+                self.problem(node, f"a parameter of {node.name} is a {NODE_NAMES[param.kind]}")
+
+    def leave_function_declaration(self, node) -> None:
+        self.functions -= 1
+
+    def visit_variable_declaration(self, node) -> None:
+        if node.identifier.kind != constants.NODE_IDENTIFIER:
+            self.problem(node, f"a variable declared by a {NODE_NAMES[node.identifier.kind]}")
+
+    def finish(self) -> list[str]:
+        return self.problems
+
+
+class NameUses(Pass):
+    # how often every declared name (a global, a function, a local or a parameter) is read, 0 for the
+    # unused ones, by (function, name) with "" for the top level: a use is of the local of its function when
+    # one is declared before it (the parser's scopes), of the global otherwise. the identifiers that declare a
+    # name are not counted, a dag identifier may be a declaration and a use
+    def begin(self, program) -> None:
+        self.uses: dict[tuple[str, str], int] = dict()
+        self.function = ""
+        self.locals: set[str] = set()
+        self.declaring = 0  # identifiers next in the walk that declare a name
+
+    def visit_identifier(self, node) -> None:
+        if self.declaring:
+            self.declaring -= 1
+            return
+        key = (self.function, node.name) if node.name in self.locals else ("", node.name)
+        if key in self.uses:
+            self.uses[key] += 1
+
+    def visit_variable_declaration(self, node) -> None:
+        self.declaring = 1
+
+    def leave_variable_declaration(self, node) -> None:
+        self.declare(node.identifier.name)  # after its initializer, which still reads an outer name
+
+    def visit_function_declaration(self, node) -> None:
+        self.declare(node.name)
+        self.function = node.name
+        self.declaring = len(node.param)
+        for param in node.param:
+            self.declare(param.name)
+
+    def leave_function_declaration(self, node) -> None:
+        self.function = ""
+        self.locals = set()
+
+    def declare(self, name: str) -> None:
+        self.uses.setdefault((self.function, name), 0)
+        if self.function:
+            self.locals.add(name)
+
+    def finish(self) -> dict[tuple[str, str], int]:
+        return self.uses
+
+
+class ExpressionDepth(Pass):
+    # the deepest expression of every function ("" for the top level): how deep the closures of
+    # lang/interpreter.py and a recursive walk over it would nest
+    def begin(self, program) -> None:
+        self.depths: dict[str, int] = {"": 0}
+        self.function = ""
+        self.depth = 0
+
+    def visit_function_declaration(self, node) -> None:
+        self.function = node.name
+        self.depths[node.name] = 0
+
+    def leave_function_declaration(self, node) -> None:
+        self.function = ""
+
+    def visit_unary_expression(self, node) -> None:
+        self.enter()
+
+    def visit_binary_expression(self, node) -> None:
+        self.enter()
+
+    def leave_unary_expression(self, node) -> None:
+        self.depth -= 1
+
+    def leave_binary_expression(self, node) -> None:
+        self.depth -= 1
+
+    def enter(self) -> None:
+        self.depth += 1
+        if self.depth > self.depths[self.function]:
+            self.depths[self.function] = self.depth
+
+    def finish(self) -> dict[str, int]:
+        return self.depths
@@ -0,0 +1,117 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from lang.build import TREE_MODES, collect_sources, compile_all, report
+from lang.optimizer import DEFAULT_OPTIMIZATION
+from lang.tokenizer import LEXER_ENGINES
+
+WATCH_INTERVAL = 0.2    # seconds between two scans of the watched sources
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    # one JSON request per line, answered by one JSON line. a connection may send any number of them
+    def handle(self) -> None:
+        for line in self.rfile:
+            start = time.perf_counter()
+            try:
+                message = json.loads(line)
+                response = self.server.dispatch(message)
+            except (ValueError, KeyError, TypeError, AttributeError) as err:
+                message = {"command": "invalid"}
+                response = {"ok": False, "diagnostics": [f"bad request: {err}"]}
+            response["elapsed"] = (time.perf_counter() - start) * 1000
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if self.server.verbose:
+                print(f"{message.get('command')} {len(message.get('paths', ()))} paths "
+                      f"{response['elapsed']:.2f}ms", flush=True)
+
+
+class CompileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    # keeps the compiler imported and warm between requests, see lang/client.py for the other end
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, cache_dir: str | None, verbose: bool = True) -> None:
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+        self.remove_stale_socket(socket_path)
+        super().__init__(socket_path, CompileRequestHandler)
+        os.chmod(socket_path, 0o600)    # compiles any path it is given, only for this user
+
+    @staticmethod
+    def remove_stale_socket(socket_path: str) -> None:
+        if not os.path.exists(socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(socket_path)  # left behind by a server that did not shut down
+                return
+        raise OSError(f"a compile server is already running on {socket_path}")
+
+    def dispatch(self, message: dict) -> dict:
+        command = message["command"]
+        if command == "compile":
+            lexer = message.get("lexer", "table")
+            tree_mode = message.get("tree", "objects")
+            if lexer not in LEXER_ENGINES or tree_mode not in TREE_MODES:
+                raise ValueError(f"unknown lexer '{lexer}' or tree '{tree_mode}'")
+            results = compile_all(collect_sources(message["paths"]), lexer, tree_mode, self.cache_dir, jobs=1,
+                                  recover=bool(message.get("recover", False)))
+            output, diagnostics = report(results)
+            return {"ok": not diagnostics, "output": output, "diagnostics": diagnostics}
+        if command == "ping":
+            return {"ok": True}
+        if command == "stop":
+            threading.Thread(target=self.shutdown).start()  # serve_forever runs on another thread
+            return {"ok": True}
+        raise ValueError(f"unknown command '{command}'")
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def serve(socket_path: str, cache_dir: str | None) -> None:
+    with CompileServer(socket_path, cache_dir) as server:
+        print(f"compile server listening on {socket_path}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def watch(paths: list[str], lexer: str = "table", tree_mode: str = "objects", cache_dir: str | None = None,
+          jobs: int | None = None, emit: bool = False, optimization: int = DEFAULT_OPTIMIZATION,
+          interval: float = WATCH_INTERVAL, recover: bool = False, error_format: str = "text") -> None:
+    # polls (mtime, size) of every source, nothing outside the standard library and a few thousand stats
+    # per scan are cheap. the first scan compiles everything, later ones only what changed or appeared
+    known: dict[str, tuple[int, int]] = dict()
+    while True:
+        current: dict[str, tuple[int, int]] = dict()
+        for source in collect_sources(paths):
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+            current[source] = (stat.st_mtime_ns, stat.st_size)
+        changed = [source for source, signature in current.items() if known.get(source) != signature]
+        known = current
+        if changed:
+            start = time.perf_counter()
+            results = compile_all(changed, lexer, tree_mode, cache_dir, jobs, emit, optimization, recover)
+            elapsed = (time.perf_counter() - start) * 1000
+            _, diagnostics = report(results, error_format)
+            for line in diagnostics:
+                print(line)
+            failed = sum(not result.is_ok() for result in results)
+            print(f"compiled {len(changed)} files in {elapsed:.2f}ms, {failed} failed", flush=True)
+        time.sleep(interval)
@@ -0,0 +1,160 @@
+import gc
+import mmap
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from lang import constants
+from lang.build import TREE_MODES, CompileResult, compile_file, decode_source, default_jobs
+from lang.exception import LoomSyntaxError
+from lang.parser import Parse
+from lang.tokenizer import LEXER_ENGINES
+from lang.utils.arenaUtils import ArenaBuilder, ArenaProgram, arena_to_objects
+from lang.utils.parserUtils import Program
+from lang.utils.symbolUtils import Symbol, SymbolTable
+from lang.utils.tokenUtils import TokenIterator
+
+SPLIT_KEYWORD = b"function"
+MIN_CHUNK_SIZE = 1 << 20    # smaller files (and pieces) are not worth a round trip through a worker
+CHUNKS_PER_JOB = 4          # more chunks than workers, a slow chunk does not hold up the end
+SPLIT_LEXERS = ("table", "store")   # the lexers that can start at a given line (tokenize_range)
+EXTERNAL = Symbol("", constants.SYMBOL_VARIABLE, -1)    # a global of an earlier chunk, visible everywhere
+
+
+class ExternalGlobals(dict):
+    # the symbols of the global scope of a chunk. a name the chunk has not declared is taken as declared by
+    # an earlier chunk: it is found as EXTERNAL and recorded, the merge checks that it really was
+    __slots__ = ("external",)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.external: set[str] = set()
+
+    def get(self, name: str, default=None) -> Symbol:
+        symbol = dict.get(self, name)
+        if symbol is None:
+            self.external.add(name)
+            return EXTERNAL
+        return symbol
+
+
+def split_points(data, parts: int) -> list[int]:
+    # byte offsets to cut data at, 0 first: a line starting with the function keyword, near every 1/parts of
+    # data. only candidates, the keyword may be inside a string or a function body (compile_chunk finds out)
+    points = [0]
+    for part in range(1, parts):
+        position = data.find(b"\n" + SPLIT_KEYWORD, max(points[-1], len(data) * part // parts))
+        while position != -1 and is_keyword_prefix(data, position + 1 + len(SPLIT_KEYWORD)):
+            position = data.find(b"\n" + SPLIT_KEYWORD, position + 1)
+        if position == -1:
+            break
+        points.append(position + 1)
+    return points
+
+
+def is_keyword_prefix(data, end: int) -> bool:
+    # whether the keyword ending at end is only the start of a longer name, the end of data ends it
+    return end < len(data) and is_identifier_byte(data[end])
+
+
+def is_identifier_byte(byte: int) -> bool:
+    return byte == ord("_") or ord("a") <= byte <= ord("z") or ord("0") <= byte <= ord("9")
+
+
+def compile_chunk(program_path: str, start: int, end: int, is_last: bool, lexer: str = "table") -> tuple | None:
+    # lexes and parses bytes [start, end) of a file in a worker, lines counted from 1. the chunk is lexed with
+    # the keyword after it in view, so the end of program rules of the lexer apply where the file ends only.
+    # (ArenaProgram.dump(), lines the chunk counted, globals it declared, function scopes, names it took from
+    # earlier chunks, whether a top level '}' ended the parse), None when the chunk does not lex or parse on
+    # its own (the split was not at a statement boundary, or the file has an error)
+    try:
+        with open(program_path, 'rb') as file:
+            file.seek(start)
+            text = decode_source(file.read(end - start))
+        tokenizer = LEXER_ENGINES[lexer](text if is_last else text + SPLIT_KEYWORD.decode())
+        if is_last:
+            tokens = tokenizer.tokenize()
+        elif tokenizer.tokenize_range(0, len(text), 1) != len(text):
+            return None     # a token crosses the end of the chunk, the keyword is inside a string
+        else:
+            tokens = tokenizer.tokens
+        symbols = SymbolTable()
+        symbols.globals.symbols = ExternalGlobals()
+        iterator = TokenIterator(tokens)
+        program = Parse(iterator, ArenaBuilder(), symbols=symbols).parse()
+    except (LoomSyntaxError, UnicodeDecodeError, OSError):
+        return None
+    declared = [(name, symbol.kind) for name, symbol in symbols.globals.symbols.items()]
+    functions = {name: [(local, symbol.kind) for local, symbol in scope.symbols.items()]
+                 for name, scope in symbols.functions.items()}
+    return (program.dump(), tokenizer.line - 1, declared, functions, symbols.globals.symbols.external,
+            iterator.has_token())
+
+
+def merge_chunks(chunks: list[tuple], tree_mode: str = "objects") -> Program | None:
+    # the Program of the whole file from the chunks in order, None when the chunks do not add up to what a
+    # serial parse gives: a name used before any chunk declared it, or a global declared twice
+    # the parent builds every node of the file here, the only part of a split compile that does not scale.
+    # the tree has no cycles, the collector would only walk it again and again while it grows
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return merge_trees(chunks, tree_mode)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def merge_trees(chunks: list[tuple], tree_mode: str) -> Program | None:
+    nodes = TREE_MODES[tree_mode]()     # one factory, a dag shares expressions across chunks like a serial parse
+    symbols = SymbolTable()
+    global_symbols = symbols.globals.symbols
+    body = list()
+    line_delta = 0
+    for dumped, lines, declared, functions, external, stopped in chunks:
+        if any(name not in global_symbols for name in external):
+            return None
+        for name, kind in declared:
+            if symbols.globals.declare(name, kind) is None:
+                return None
+        for name, names in functions.items():
+            scope = symbols.open_function(name)
+            scope.parent_limit = global_symbols[name].index + 1    # what parse_function opens it with
+            for local, kind in names:
+                scope.declare(local, kind)
+        program = ArenaProgram.load(dumped)
+        if line_delta:
+            program.arena.lines = array('I', [line + line_delta for line in program.arena.lines])
+        body.extend(arena_to_objects(program, nodes).body)
+        line_delta += lines
+        if stopped:     # a top level '}' ends a serial parse as well, the rest of the file is only lexed
+            break
+    program = nodes.program(body)
+    program.symbols = symbols
+    return program
+
+
+def compile_split(program_path: str, lexer: str = "table", tree_mode: str = "objects", jobs: int | None = None,
+                  recover: bool = False, chunk_size: int = MIN_CHUNK_SIZE) -> CompileResult:
+    # one big file lexed and parsed by a pool of jobs processes, cut at top level functions (functions can
+    # not nest, so a line starting with the keyword mostly starts a top level statement). the result is the
+    # one of compile_file: whenever a cut turns out wrong or the file has an error, the file is compiled
+    # serially, which also gives the exact errors
+    jobs = jobs or default_jobs()
+    try:
+        size = os.path.getsize(program_path)
+        parts = min(jobs * CHUNKS_PER_JOB, size // chunk_size)
+        if jobs <= 1 or parts <= 1 or tree_mode not in ("objects", "dag") or lexer not in SPLIT_LEXERS:
+            return compile_file(program_path, lexer, tree_mode, recover=recover)
+        with open(program_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            points = split_points(data, parts)
+    except (OSError, ValueError):
+        return compile_file(program_path, lexer, tree_mode, recover=recover)
+    ends = points[1:] + [size]
+    with ProcessPoolExecutor(min(jobs, len(points))) as executor:
+        chunks = list(executor.map(compile_chunk, [program_path] * len(points), points, ends,
+                                   [end == size for end in ends], [lexer] * len(points)))
+    program = merge_chunks(chunks, tree_mode) if all(chunk is not None for chunk in chunks) else None
+    if program is None:
+        return compile_file(program_path, lexer, tree_mode, recover=recover)
+    return CompileResult(program_path, program)
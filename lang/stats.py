@@ -0,0 +1,280 @@
+import gc
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+from lang.constants import get_constants_name
+from lang.passes import ExpressionDepth, NameUses, NodeStatistics, TreeValidator, run_passes
+from lang.utils.tokenUtils import Token, TokenStore
+
+try:
+    import resource
+except ImportError:     # not on windows, peaks then come from tracemalloc only
+    resource = None
+
+PHASES = ("load", "cache", "tokenize", "parse", "optimize", "emit")
+PROFILERS = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.001     # seconds between two stacks of the sampling profiler
+
+
+class PhaseStats:
+    # one phase of one file. blocks is the change in allocated memory blocks (what the phase leaves allocated,
+    # not what it allocated and freed again), peak is the python heap peak of the phase with trace_memory and
+    # how much the phase raised the high water mark of the process otherwise (0 when it stayed below it)
+    __slots__ = ("name", "path", "pid", "start", "wall", "cpu", "blocks", "collections", "peak")
+
+    def __init__(self, name: str, path: str | None, start: float) -> None:
+        self.name = name
+        self.path = path
+        self.pid = os.getpid()
+        self.start = start
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.blocks = 0
+        self.collections = 0
+        self.peak = 0
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class Sampler:
+    # sampling profiler: a background thread takes the stack of one thread every interval and counts it in
+    # the collapsed format flame graph tools read (outermost frame first, ';' separated). it only runs when the
+    # thread it samples gives up the gil, so while it runs the switch interval is lowered to the sampling one
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.switch_interval = sys.getswitchinterval()
+
+    def start(self) -> None:
+        sys.setswitchinterval(min(self.switch_interval, self.interval))
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        sys.setswitchinterval(self.switch_interval)
+
+    def __run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = list()
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+
+class Recorder:
+    # what a compile spends per phase (see PhaseStats) plus the tokens by type and the nodes by kind it made,
+    # with what the passes of count_tree find in the trees.
+    # hooks are called with ("start" | "end", PhaseStats) around every phase. profile_phase is profiled with
+    # cProfile or the Sampler, every time it runs. without a Recorder (NO_STATS) a phase is a shared
+    # nullcontext and nothing is counted
+    def __init__(self, trace_memory: bool = False, profile_phase: str | None = None, profiler: str = "cprofile",
+                 hooks: list | None = None) -> None:
+        self.trace_memory = trace_memory
+        self.profile_phase = profile_phase
+        self.profiler = profiler
+        self.hooks = hooks if hooks is not None else list()
+        self.phases: list[PhaseStats] = list()
+        self.token_counts: Counter[str] = Counter()
+        self.node_counts: Counter[str] = Counter()
+        self.unused_locals = 0      # parameters and local variables never read
+        self.deepest_expression = 0
+        self.tree_problems: list[str] = list()  # "<path>: line <n>: <what>" of TreeValidator
+        self.profile = None
+        if profile_phase is not None and profiler == "cprofile":
+            import cProfile     # the profilers and tracemalloc are imported when used, not by every compile
+            self.profile = cProfile.Profile()
+        self.samples: Counter[str] = Counter()
+
+    @contextmanager
+    def phase(self, name: str, path: str | None = None):
+        stats = PhaseStats(name, path, time.perf_counter())
+        for hook in self.hooks:
+            hook("start", stats)
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            heap = tracemalloc.get_traced_memory()[0]
+        high_water = max_rss()
+        blocks = sys.getallocatedblocks()
+        collections = gc_collections()
+        sampler = None
+        if name == self.profile_phase:
+            if self.profile is not None:
+                self.profile.enable()
+            else:
+                sampler = Sampler(threading.get_ident())
+                sampler.start()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.wall = time.perf_counter() - start
+            stats.cpu = time.process_time() - cpu
+            if name == self.profile_phase:
+                if sampler is not None:
+                    sampler.stop()
+                    self.samples.update(sampler.stacks)
+                else:
+                    self.profile.disable()
+            stats.blocks = sys.getallocatedblocks() - blocks
+            stats.collections = gc_collections() - collections
+            if self.trace_memory:
+                stats.peak = tracemalloc.get_traced_memory()[1] - heap
+            else:
+                stats.peak = max_rss() - high_water
+            self.phases.append(stats)
+            for hook in self.hooks:
+                hook("end", stats)
+
+    def count_tokens(self, tokens) -> None:
+        self.count_token_types(token_types(tokens))
+
+    def count_token_types(self, types: dict[int, int]) -> None:
+        for token_type, count in types.items():
+            self.token_counts[get_constants_name(token_type)] += count
+
+    def count_tree(self, program, path: str | None = None) -> None:
+        # the statistics of a parsed tree in one walk (lang/passes.py): every node, a shared dag node as often
+        # as it is used, the unused locals, the deepest expression and what is wrong with the tree
+        nodes, uses, depths, problems = run_passes(program, NodeStatistics(), NameUses(), ExpressionDepth(),
+                                                   TreeValidator())
+        self.node_counts.update(nodes)
+        self.unused_locals += sum(1 for (function, _), count in uses.items() if function and count == 0)
+        self.deepest_expression = max(self.deepest_expression, max(depths.values()))
+        self.tree_problems.extend(f"{path}: {problem}" for problem in problems)
+
+    def dump(self) -> tuple:
+        # what a worker sends back to be merged into the Recorder of the parent process
+        return ([stats.as_dict() for stats in self.phases], dict(self.token_counts), dict(self.node_counts),
+                (self.unused_locals, self.deepest_expression, self.tree_problems))
+
+    def merge(self, dumped: tuple) -> None:
+        phases, token_counts, node_counts, (unused_locals, deepest_expression, tree_problems) = dumped
+        self.unused_locals += unused_locals
+        self.deepest_expression = max(self.deepest_expression, deepest_expression)
+        self.tree_problems.extend(tree_problems)
+        for fields in phases:
+            stats = PhaseStats(fields["name"], fields["path"], fields["start"])
+            for field, value in fields.items():
+                setattr(stats, field, value)
+            self.phases.append(stats)
+        self.token_counts.update(token_counts)
+        self.node_counts.update(node_counts)
+
+    def totals(self) -> dict[str, dict]:
+        # per phase over all files, in PHASES order: runs, wall, cpu, blocks and collections summed, peak the largest
+        totals: dict[str, dict] = dict()
+        for stats in sorted(self.phases, key=lambda stats: PHASES.index(stats.name)
+                            if stats.name in PHASES else len(PHASES)):
+            total = totals.setdefault(stats.name, {"runs": 0, "wall": 0.0, "cpu": 0.0, "blocks": 0,
+                                                   "collections": 0, "peak": 0})
+            total["runs"] += 1
+            total["wall"] += stats.wall
+            total["cpu"] += stats.cpu
+            total["blocks"] += stats.blocks
+            total["collections"] += stats.collections
+            total["peak"] = max(total["peak"], stats.peak)
+        return totals
+
+    def format(self) -> list[str]:
+        peak = "heap peak" if self.trace_memory else "rss growth"
+        lines = [f"{'phase':>9} {'runs':>6} {'wall':>10} {'cpu':>10} {'blocks':>10} {'gc':>5} {peak:>11}"]
+        for name, total in self.totals().items():
+            lines.append(f"{name:>9} {total['runs']:>6} {total['wall'] * 1000:>8.2f}ms {total['cpu'] * 1000:>8.2f}ms "
+                         f"{total['blocks']:>10} {total['collections']:>5} {total['peak'] / 1e6:>9.2f}MB")
+        for title, counts in (("tokens", self.token_counts), ("nodes", self.node_counts)):
+            if counts:
+                lines.append(f"{title} {sum(counts.values())}: " +
+                             ", ".join(f"{name} {count}" for name, count in counts.most_common()))
+        if self.node_counts:
+            lines.append(f"trees: deepest expression {self.deepest_expression}, {self.unused_locals} unused locals, "
+                         f"{len(self.tree_problems)} problems")
+            lines.extend(f"tree problem {problem}" for problem in self.tree_problems)
+        return lines
+
+    def write_json(self, path: str) -> None:
+        with open(path, 'w') as file:
+            json.dump({"phases": [stats.as_dict() for stats in self.phases], "totals": self.totals(),
+                       "tokens": dict(self.token_counts), "nodes": dict(self.node_counts),
+                       "unused_locals": self.unused_locals, "deepest_expression": self.deepest_expression,
+                       "tree_problems": self.tree_problems,
+                       "trace_memory": self.trace_memory}, file, indent=1)
+
+    def write_trace(self, path: str) -> None:
+        # chrome trace event format (chrome://tracing, ui.perfetto.dev, speedscope): one complete event per
+        # phase and file, a lane per process
+        origin = min((stats.start for stats in self.phases), default=0.0)
+        events = list()
+        for stats in self.phases:
+            events.append({"name": stats.name, "cat": "compile", "ph": "X", "pid": stats.pid, "tid": stats.pid,
+                           "ts": (stats.start - origin) * 1e6, "dur": stats.wall * 1e6,
+                           "args": {"path": stats.path, "cpu_ms": stats.cpu * 1000, "blocks": stats.blocks,
+                                    "collections": stats.collections, "peak": stats.peak}})
+        with open(path, 'w') as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def write_profile(self, path: str) -> None:
+        # cProfile: a pstats file (python -m pstats, snakeviz, flameprof), sample: collapsed stacks
+        # (flamegraph.pl, speedscope)
+        if self.profile is not None:
+            self.profile.dump_stats(path)
+            return
+        with open(path, 'w') as file:
+            for stack, count in self.samples.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+class NullRecorder:
+    # the Recorder interface doing nothing, what the compile functions use when no Recorder is given
+    phase_context = nullcontext()
+
+    def phase(self, name: str, path: str | None = None) -> nullcontext:
+        return self.phase_context
+
+    def count_tokens(self, tokens) -> None:
+        pass
+
+    def count_token_types(self, types: dict[int, int]) -> None:
+        pass
+
+    def count_tree(self, program, path: str | None = None) -> None:
+        pass
+
+
+NO_STATS = NullRecorder()
+
+
+def token_types(tokens) -> Counter[int]:
+    # tokens by type, what a cache entry keeps of its tokens for the stats of a hit
+    if isinstance(tokens, TokenStore):
+        return Counter(tokens.types)
+    return Counter(map(Token.get_type, tokens))
+
+
+def max_rss() -> int:
+    # high water mark of the process in bytes (linux reports kilobytes, macos bytes)
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def gc_collections() -> int:
+    return sum(generation["collections"] for generation in gc.get_stats())
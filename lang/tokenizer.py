@@ -1,6 +1,14 @@
+import re
+import sys
+from typing import Iterable, Iterator
+
 from lang import constants
 from lang.exception import LoomSyntaxError
-from lang.utils.tokenUtils import Token, is_valid_identifier_beginner, is_valid_identifier_char
+from lang.utils.tokenUtils import (Token,
+                                   TokenStore,
+                                   make_float_raw,
+                                   is_valid_identifier_beginner,
+                                   is_valid_identifier_char)
 
 
 class Lexer:
@@ -131,3 +139,284 @@ class Lexer:
 
     def __is_eof(self) -> bool:
         return not (self.index < self.length)
+
+
+class TableLexer:
+    # scans a whole lexeme per step and emits the same tokens (and line numbers) as Lexer.
+    # run_pattern covers the common lexemes in one regex pass, anything it leaves to "defer"
+    # (invalid or non ascii characters, unterminated strings, the end of the program) goes
+    # through lexeme_pattern one lexeme at a time
+    run_pattern = re.compile(r"""
+        \s*(?:
+              (?P<word>[a-z_][a-z0-9_]*+)(?!\n)
+            | (?P<word_newline>[a-z_][a-z0-9_]++)
+            | (?P<symbol>[(){};,+\-*/])
+            | (?P<operator>[!=<>]=?)
+            | (?P<float>[0-9]++\.[0-9]*+)(?![^\x00-\x7f])
+            | (?P<integer>[0-9]++)(?![^\x00-\x7f]|\.)
+            | (?P<string>"[^"]*+"|'[^']*+'|\.[^.]*+\.)
+            | (?P<defer>)
+        )
+    """, re.VERBOSE)
+
+    lexeme_pattern = re.compile(r"""
+          (?P<space>\s+)
+        | (?P<word>[a-z_][a-z0-9_]*)
+        | (?P<number>[0-9]+)
+        | (?P<quote>["'.])
+        | (?P<operator>[!=<>]=?)
+        | (?P<symbol>[(){};,+\-*/])
+    """, re.VERBOSE)
+
+    symbol_table = {
+        '(': constants.OPEN_PARAM,
+        ')': constants.CLOSE_PARAM,
+        '{': constants.OPEN_BRACE,
+        '}': constants.CLOSE_BRACE,
+        ';': constants.SEMICOLON,
+        ',': constants.COMMA,
+        '+': constants.PLUS,
+        '-': constants.MINUS,
+        '*': constants.STAR,
+        '/': constants.SLASH
+    }
+
+    operator_table = {
+        '!': constants.NOT,
+        '!=': constants.NOT_EQUAL,
+        '=': constants.EQUAL,
+        '==': constants.DOUBLE_EQUAL,
+        '>': constants.GREATER,
+        '>=': constants.GREATER_EQUAL,
+        '<': constants.LESSER,
+        '<=': constants.LESSER_EQUAL
+    }
+
+    quote_table = {
+        '"': constants.STRING_LITERAL,
+        "'": constants.STRING_LITERAL,
+        '.': constants.DOT
+    }
+
+    def __init__(self, program: str = "", chunks: Iterable[str] | None = None) -> None:
+        # with chunks, the program is read (and tokens are produced) one buffer at a time
+        self.line = 1
+        self.program = program + "\n"
+        self.tokens: list[Token] = list()
+        self.length = len(program)
+        self.index = 0
+        self.chunks = iter(chunks) if chunks is not None else None
+        self.final = chunks is None
+
+    def tokenize(self) -> list[Token]:
+        while self.__scan_buffer():
+            continue
+        return self.tokens
+
+    def tokenize_range(self, start: int, end: int, line: int) -> int:
+        # lexes the tokens of program[start:end] as a full tokenize() would, given the line the lexer was on
+        # at start (whitespace never counts lines, so that is the line of the token before). scanning stops at
+        # the first token boundary at or after end, that index is returned
+        self.line = line
+        last = self.length - 1
+        index = start
+        while index < end:
+            index = self._scan_run(index, end, last)
+            if index < end:
+                index = self.__scan_lexeme(index, last)
+        return index
+
+    def __iter__(self) -> Iterator[Token]:
+        more = True
+        while more:
+            more = self.__scan_buffer()
+            tokens, self.tokens = self.tokens, list()
+            yield from tokens
+
+    def __scan_buffer(self) -> bool:
+        if self.final:
+            end = self.length
+            last = self.length - 1     # Lexer never peeks at the last character of the program
+        else:
+            # the fast run stops right after the last whitespace of the buffer, nothing but strings
+            # can cross that point and the program goes on after the buffer, so no end of program rules
+            end = max(self.program.rfind('\n', 0, self.length - 1), self.program.rfind(' ', 0, self.length - 1)) + 1
+            last = sys.maxsize
+        index = self.index
+        while index < end:
+            index = self._scan_run(index, end, last)
+            if index < end:
+                index = self.__scan_lexeme(index, last)
+                if index is None:   # the string goes on in the next chunk
+                    break
+        if self.final:
+            return False
+        self.__refill(self.index if index is None else index)
+        return True
+
+    def __refill(self, index: int) -> None:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.final = True
+            chunk = ""
+        self.program = self.program[index:self.length] + chunk + "\n"
+        self.length = len(self.program) - 1
+        self.index = 0
+
+    def _scan_run(self, index: int, end: int, last: int) -> int:
+        program = self.program
+        word_table = constants.WORD_TABLE
+        symbol_table = self.symbol_table
+        operator_table = self.operator_table
+        append = self.tokens.append
+        line = self.line
+        for matched in self.run_pattern.finditer(program, index, end):
+            kind = matched.lastgroup
+            if kind == "word":
+                word = matched.group(kind)
+                append(Token(word, word_table.get(word, constants.ID), line))
+            elif kind == "symbol":
+                symbol = matched.group(kind)
+                append(Token(symbol, symbol_table[symbol], line))
+            elif kind == "word_newline":
+                if matched.end() < last:
+                    line += 1
+                word = matched.group(kind)
+                append(Token(word, word_table.get(word, constants.ID), line))
+            elif kind == "operator":
+                if matched.end() > last:
+                    self.line = line
+                    return matched.start(kind)
+                operator = matched.group(kind)
+                append(Token(operator, operator_table[operator], line))
+            elif kind == "integer":
+                append(Token(matched.group(kind), constants.INT_LITERAL, line))
+            elif kind == "string":
+                string = matched.group(kind)
+                line += string.count('\n', 2)
+                token_type = constants.DOT if string[0] == '.' else constants.STRING_LITERAL
+                append(Token(string[1:-1], token_type, line))
+            elif kind == "float":
+                if matched.end() >= last:
+                    self.line = line
+                    return matched.start(kind)
+                append(Token(make_float_raw(matched.group(kind)), constants.FLOAT_LITERAL, line))
+            else:
+                self.line = line
+                return matched.end()
+        self.line = line
+        return end
+
+    def __scan_lexeme(self, index: int, last: int) -> int | None:
+        program = self.program
+        length = self.length
+        matched = self.lexeme_pattern.match(program, index, length)
+        kind = matched.lastgroup if matched is not None else None
+        if kind == "space":
+            return matched.end()
+        elif kind == "word":
+            end = matched.end()
+            word = matched.group()
+            if end - index > 1 and end < last and program[end] == '\n':
+                self.line += 1
+            self._make_token(constants.find_word_type(word), index, end)
+            return end
+        elif kind == "symbol":
+            self._make_token(self.symbol_table[program[index]], index, index + 1)
+            return index + 1
+        elif kind == "quote":
+            quote = program[index]
+            close = program.find(quote, index + 1, length)
+            if close == -1:
+                if not self.final:
+                    self.index = index
+                    return None
+                close = length
+            self.line += program.count('\n', index + 2, min(close, last))
+            self._make_token(self.quote_table[quote], index + 1, close)
+            return close + 1
+        elif kind == "operator":
+            operator = matched.group()
+            if index + 1 >= last:
+                operator = operator[0]
+            self._make_token(self.operator_table[operator], index, index + len(operator))
+            return index + len(operator)
+        elif kind == "number" or program[index].isnumeric():
+            end = index + 1
+            while program[end].isnumeric():     # the trailing "\n" stops the scan
+                end += 1
+            if end < last and program[end] == '.':
+                decimal_end = end + 1
+                while program[decimal_end].isnumeric():
+                    decimal_end += 1
+                self._make_token(constants.FLOAT_LITERAL, index, decimal_end)
+                return decimal_end
+            self._make_token(constants.INT_LITERAL, index, end)
+            return end
+        raise LoomSyntaxError(f"Invalid character '{program[index]}'", self.line)
+
+    def _make_token(self, token_type: int, start: int, end: int) -> None:
+        raw = self.program[start:end]
+        if token_type == constants.FLOAT_LITERAL:
+            raw = make_float_raw(raw)
+        self.tokens.append(Token(raw, token_type, self.line))
+
+
+class TokenStoreLexer(TableLexer):
+    # TableLexer filling a TokenStore (spans over the program) instead of building Token objects
+    def __init__(self, program: str) -> None:
+        super().__init__(program)
+        self.tokens: TokenStore = TokenStore(self.program)
+
+    def tokenize(self) -> TokenStore:
+        return super().tokenize()
+
+    def _scan_run(self, index: int, end: int, last: int) -> int:
+        program = self.program
+        word_table = constants.WORD_TABLE
+        symbol_table = self.symbol_table
+        operator_table = self.operator_table
+        append = self.tokens.append
+        line = self.line
+        for matched in self.run_pattern.finditer(program, index, end):
+            kind = matched.lastgroup
+            start, stop = matched.span(kind)
+            if kind == "word":
+                append(word_table.get(program[start:stop], constants.ID), start, stop, line)
+            elif kind == "symbol":
+                append(symbol_table[program[start]], start, stop, line)
+            elif kind == "word_newline":
+                if stop < last:
+                    line += 1
+                append(word_table.get(program[start:stop], constants.ID), start, stop, line)
+            elif kind == "operator":
+                if stop > last:
+                    self.line = line
+                    return start
+                append(operator_table[program[start:stop]], start, stop, line)
+            elif kind == "integer":
+                append(constants.INT_LITERAL, start, stop, line)
+            elif kind == "string":
+                line += program.count('\n', start + 2, stop)
+                token_type = constants.DOT if program[start] == '.' else constants.STRING_LITERAL
+                append(token_type, start + 1, stop - 1, line)
+            elif kind == "float":
+                if stop >= last:
+                    self.line = line
+                    return start
+                append(constants.FLOAT_LITERAL, start, stop, line)
+            else:
+                self.line = line
+                return stop
+        self.line = line
+        return end
+
+    def _make_token(self, token_type: int, start: int, end: int) -> None:
+        self.tokens.append(token_type, start, end, self.line)
+
+
+LEXER_ENGINES = {
+    "table": TableLexer,
+    "store": TokenStoreLexer,
+    "legacy": Lexer
+}
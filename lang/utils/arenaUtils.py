@@ -0,0 +1,345 @@
+import sys
+from array import array
+
+from lang import constants
+from lang.utils.parserUtils import NodeFactory
+
+
+INLINE_INT_MIN = -2 ** 31
+INLINE_INT_MAX = 2 ** 31 - 1
+
+
+class AstArena:
+    # the whole tree as parallel integer arrays, a node is an index into them.
+    # first/second/third hold child node indexes, value ids or offsets into lists (count, items...)
+    # depending on the kind, see ArenaBuilder for the layout of every kind.
+    # int literals that fit in first are stored inline (second == -1), bigger ones are value ids.
+    # float literals are value ids
+    def __init__(self) -> None:
+        self.kinds = array('H')
+        self.operators = array('h')
+        self.lines = array('I')
+        self.first = array('i')
+        self.second = array('i')
+        self.third = array('i')
+        self.lists = array('i')
+        self.values: list = list()
+        self.value_ids: dict[str | int | tuple, int] = dict()
+
+    def add(self, kind: int, line: int, first: int = -1, second: int = -1, third: int = -1, operator: int = -1) -> int:
+        self.kinds.append(kind)
+        self.operators.append(operator)
+        self.lines.append(line)
+        self.first.append(first)
+        self.second.append(second)
+        self.third.append(third)
+        return len(self.kinds) - 1
+
+    def add_list(self, nodes: list["ArenaNode"]) -> int:
+        offset = len(self.lists)
+        self.lists.append(len(nodes))
+        self.lists.extend(node.index for node in nodes)
+        return offset
+
+    def add_value(self, value: str | int | float) -> int:
+        # names and literal values, stored once (names are interned). strings and ints never
+        # share an id since "1" != 1, floats are keyed apart since 1.0 == 1
+        key = value_key(value)
+        value_id = self.value_ids.get(key)
+        if value_id is None:
+            value_id = self.value_ids[key] = len(self.values)
+            self.values.append(sys.intern(value) if isinstance(value, str) else value)
+        return value_id
+
+    def node(self, index: int) -> "ArenaNode":
+        return ARENA_NODES[self.kinds[index]](self, index)
+
+    def node_list(self, offset: int) -> list["ArenaNode"]:
+        count = self.lists[offset]
+        return [self.node(index) for index in self.lists[offset + 1: offset + 1 + count]]
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def dump(self) -> tuple:
+        # plain bytes/lists/ints only, so the result can go straight through marshal
+        return (self.kinds.tobytes(), self.operators.tobytes(), self.lines.tobytes(), self.first.tobytes(),
+                self.second.tobytes(), self.third.tobytes(), self.lists.tobytes(), self.values)
+
+    @classmethod
+    def load(cls, parts: tuple) -> "AstArena":
+        arena = cls()
+        for column, data in zip((arena.kinds, arena.operators, arena.lines, arena.first,
+                                 arena.second, arena.third, arena.lists), parts):
+            column.frombytes(data)
+        arena.values = parts[7]     # marshal keeps names interned
+        arena.value_ids = {value_key(value): value_id for value_id, value in enumerate(arena.values)}
+        return arena
+
+
+def value_key(value: str | int | float) -> str | int | tuple:
+    return (float, value.hex()) if isinstance(value, float) else value
+
+
+class ArenaNode:
+    # read only view of one arena node, with the attributes of the matching parserUtils class
+    __slots__ = ("arena", "index")
+    kind: int = None
+
+    def __init__(self, arena: AstArena, index: int) -> None:
+        self.arena = arena
+        self.index = index
+
+    @property
+    def line(self) -> int:
+        return self.arena.lines[self.index]
+
+
+class ArenaIdentifier(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_IDENTIFIER
+
+    @property
+    def name(self) -> str:
+        return self.arena.values[self.arena.first[self.index]]
+
+
+class ArenaIntLiteral(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_INT_LITERAL
+
+    @property
+    def value(self) -> int:
+        if self.arena.second[self.index] == -1:
+            return self.arena.first[self.index]
+        return self.arena.values[self.arena.first[self.index]]
+
+
+class ArenaStringLiteral(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_STRING_LITERAL
+
+    @property
+    def value(self) -> str:
+        return self.arena.values[self.arena.first[self.index]]
+
+
+class ArenaFloatLiteral(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_FLOAT_LITERAL
+
+    @property
+    def value(self) -> float:
+        return self.arena.values[self.arena.first[self.index]]
+
+
+class ArenaUnaryExpression(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_UNARY_EXPRESSION
+
+    @property
+    def operator(self) -> int:
+        return self.arena.operators[self.index]
+
+    @property
+    def expression(self) -> ArenaNode:
+        return self.arena.node(self.arena.first[self.index])
+
+
+class ArenaBinaryExpression(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_BINARY_EXPRESSION
+
+    @property
+    def left(self) -> ArenaNode:
+        return self.arena.node(self.arena.first[self.index])
+
+    @property
+    def operator(self) -> int:
+        return self.arena.operators[self.index]
+
+    @property
+    def right(self) -> ArenaNode:
+        return self.arena.node(self.arena.second[self.index])
+
+
+class ArenaExpressionStatement(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_EXPRESSION_STATEMENT
+
+    @property
+    def expression(self) -> ArenaNode:
+        return self.arena.node(self.arena.first[self.index])
+
+
+class ArenaFunctionDeclaration(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_FUNCTION_DECLARATION
+
+    @property
+    def name(self) -> str:
+        return self.arena.values[self.arena.first[self.index]]
+
+    @property
+    def param(self) -> list[ArenaNode]:
+        return self.arena.node_list(self.arena.second[self.index])
+
+    @property
+    def body(self) -> list[ArenaNode]:
+        return self.arena.node_list(self.arena.third[self.index])
+
+
+class ArenaReturnStatement(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_RETURN_STATEMENT
+
+    @property
+    def expression(self) -> ArenaNode:
+        return self.arena.node(self.arena.first[self.index])
+
+
+class ArenaVariableDeclaration(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_VARIABLE_DECLARATION
+
+    @property
+    def identifier(self) -> ArenaNode:
+        return self.arena.node(self.arena.first[self.index])
+
+    @property
+    def init(self) -> ArenaNode:
+        return self.arena.node(self.arena.second[self.index])
+
+
+class ArenaImportStatement(ArenaNode):
+    __slots__ = ()
+    kind = constants.NODE_IMPORT_STATEMENT
+
+    @property
+    def path(self) -> str:
+        return self.arena.values[self.arena.first[self.index]]
+
+
+class ArenaProgram:
+    __slots__ = ("version", "arena", "root", "symbols")
+    kind = constants.NODE_PROGRAM
+
+    def __init__(self, arena: AstArena, root: int) -> None:
+        self.version: str = "v1"
+        self.arena = arena
+        self.root = root    # offset of the top level statement list
+        self.symbols = None
+
+    @property
+    def body(self) -> list[ArenaNode]:
+        return self.arena.node_list(self.root)
+
+    def dump(self) -> tuple:
+        return self.arena.dump() + (self.root,)
+
+    @classmethod
+    def load(cls, parts: tuple) -> "ArenaProgram":
+        return cls(AstArena.load(parts[:-1]), parts[-1])
+
+
+ARENA_NODES = {node.kind: node for node in (ArenaIdentifier,
+                                            ArenaIntLiteral,
+                                            ArenaStringLiteral,
+                                            ArenaFloatLiteral,
+                                            ArenaUnaryExpression,
+                                            ArenaBinaryExpression,
+                                            ArenaExpressionStatement,
+                                            ArenaFunctionDeclaration,
+                                            ArenaReturnStatement,
+                                            ArenaVariableDeclaration,
+                                            ArenaImportStatement)}
+
+
+class ArenaBuilder:
+    # NodeFactory interface (parserUtils) building into an AstArena, Parse(tokens, ArenaBuilder())
+    def __init__(self, arena: AstArena | None = None) -> None:
+        self.arena = arena if arena is not None else AstArena()
+
+    def program(self, body: list[ArenaNode]) -> ArenaProgram:
+        return ArenaProgram(self.arena, self.arena.add_list(body))
+
+    def identifier(self, name: str, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_IDENTIFIER, line, self.arena.add_value(name))
+
+    def int_literal(self, value: int, line: int) -> ArenaNode:
+        if INLINE_INT_MIN <= value <= INLINE_INT_MAX:
+            return self.__make(constants.NODE_INT_LITERAL, line, value)
+        return self.__make(constants.NODE_INT_LITERAL, line, self.arena.add_value(value), 1)
+
+    def string_literal(self, value: str, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_STRING_LITERAL, line, self.arena.add_value(value))
+
+    def float_literal(self, value: float, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_FLOAT_LITERAL, line, self.arena.add_value(value))
+
+    def unary_expression(self, operator: int, expression: ArenaNode, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_UNARY_EXPRESSION, line, expression.index, operator=operator)
+
+    def binary_expression(self, left: ArenaNode, operator: int, right: ArenaNode, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_BINARY_EXPRESSION, line, left.index, right.index, operator=operator)
+
+    def expression_statement(self, expression: ArenaNode, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_EXPRESSION_STATEMENT, line, expression.index)
+
+    def function_declaration(self, name: str, params: list[ArenaNode], body: list[ArenaNode], line: int) -> ArenaNode:
+        arena = self.arena
+        return self.__make(constants.NODE_FUNCTION_DECLARATION, line,
+                           arena.add_value(name), arena.add_list(params), arena.add_list(body))
+
+    def return_statement(self, expression: ArenaNode, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_RETURN_STATEMENT, line, expression.index)
+
+    def variable_declaration(self, identifier: ArenaNode, init: ArenaNode, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_VARIABLE_DECLARATION, line, identifier.index, init.index)
+
+    def import_statement(self, path: str, line: int) -> ArenaNode:
+        return self.__make(constants.NODE_IMPORT_STATEMENT, line, self.arena.add_value(path))
+
+    def __make(self, kind: int, line: int, first: int = -1, second: int = -1, third: int = -1,
+               operator: int = -1) -> ArenaNode:
+        return ARENA_NODES[kind](self.arena, self.arena.add(kind, line, first, second, third, operator))
+
+
+def arena_to_objects(program: ArenaProgram, nodes=NodeFactory):
+    # children are always added before their parent, so one pass in index order rebuilds the whole tree
+    arena = program.arena
+    operators, lines, first, second, third = arena.operators, arena.lines, arena.first, arena.second, arena.third
+    lists, values = arena.lists, arena.values
+    built: list = [None] * len(arena)
+
+    def node_list(offset: int) -> list:
+        return [built[index] for index in lists[offset + 1: offset + 1 + lists[offset]]]
+
+    for index, kind in enumerate(arena.kinds):
+        if kind == constants.NODE_BINARY_EXPRESSION:
+            built[index] = nodes.binary_expression(built[first[index]], operators[index], built[second[index]],
+                                                   lines[index])
+        elif kind == constants.NODE_IDENTIFIER:
+            built[index] = nodes.identifier(values[first[index]], lines[index])
+        elif kind == constants.NODE_INT_LITERAL:
+            value = first[index] if second[index] == -1 else values[first[index]]
+            built[index] = nodes.int_literal(value, lines[index])
+        elif kind == constants.NODE_EXPRESSION_STATEMENT:   # on the line of its expression, as Parse does
+            expression = built[first[index]]
+            built[index] = nodes.expression_statement(expression, expression.line)
+        elif kind == constants.NODE_STRING_LITERAL:
+            built[index] = nodes.string_literal(values[first[index]], lines[index])
+        elif kind == constants.NODE_FLOAT_LITERAL:
+            built[index] = nodes.float_literal(values[first[index]], lines[index])
+        elif kind == constants.NODE_UNARY_EXPRESSION:
+            built[index] = nodes.unary_expression(operators[index], built[first[index]], lines[index])
+        elif kind == constants.NODE_VARIABLE_DECLARATION:
+            built[index] = nodes.variable_declaration(built[first[index]], built[second[index]], lines[index])
+        elif kind == constants.NODE_RETURN_STATEMENT:
+            built[index] = nodes.return_statement(built[first[index]], lines[index])
+        elif kind == constants.NODE_FUNCTION_DECLARATION:
+            built[index] = nodes.function_declaration(values[first[index]], node_list(second[index]),
+                                                      node_list(third[index]), lines[index])
+        elif kind == constants.NODE_IMPORT_STATEMENT:
+            built[index] = nodes.import_statement(values[first[index]], lines[index])
+    return nodes.program(node_list(program.root))
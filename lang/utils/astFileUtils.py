@@ -0,0 +1,300 @@
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from lang import constants
+from lang.utils.arenaUtils import INLINE_INT_MAX, INLINE_INT_MIN, ArenaNode, value_key
+from lang.utils.parserUtils import NodeFactory, Program, iter_children
+
+MAGIC = b"LOOMAST\0"
+AST_FORMAT = 1      # bumped when the layout changes, files of another format are refused
+COMPILER_VERSION = Program().version    # trees of another compiler version are refused as well
+# magic, format, length of the version, values, bytes of value text, node records, list items, statements
+HEADER = struct.Struct("<8sHHIIIII")
+NODE = struct.Struct("<HhIiii")     # kind, operator, line, first, second, third (the AstArena columns)
+STATEMENT = struct.Struct("<II")    # first and last node record of a top level statement
+OFFSET = struct.Struct("<I")
+VALUE_TAGS = {str: b"s", int: b"i", float: b"f"}
+
+
+class AstFileWriter:
+    # encodes a tree (node objects, a dag or an ArenaProgram) into the ast file layout:
+    #   header, the compiler version, value offsets, value text (a tag byte and utf-8), node records, list
+    #   items, statement table; every section starts 4 byte aligned.
+    # node records use the AstArena layout (see ArenaBuilder), a bool literal holds its value in first. the
+    # records of a top level statement are its whole subtree, children before parents and the statement last,
+    # so a function is decoded from its own range alone. shared dag nodes stay shared within a statement and
+    # are written again for every other statement using them. names and literal values are stored once
+    def __init__(self) -> None:
+        self.records = bytearray()
+        self.node_count = 0
+        self.list_items: list[int] = list()
+        self.statements = bytearray()
+        self.values: list[bytes] = list()
+        self.value_ids: dict[str | int | tuple, int] = dict()
+        self.key = id   # tells nodes apart, arena nodes are views made anew on every access and use their index
+
+    def add_program(self, program) -> "AstFileWriter":
+        for statement in program.body:
+            first = self.node_count
+            self.statements += STATEMENT.pack(first, self.add_statement(statement))
+        return self
+
+    def add_statement(self, statement) -> int:
+        # post order without recursion, expressions can be deeper than the interpreter stack
+        key = self.key = arena_index if isinstance(statement, ArenaNode) else id
+        indexes: dict[int, int] = dict()   # key(node) -> record of this statement
+        pending = [(statement, False)]
+        while pending:
+            node, ready = pending.pop()
+            node_id = key(node)
+            if node_id in indexes:
+                continue
+            if ready:
+                indexes[node_id] = self.__add_node(node, indexes)
+                continue
+            pending.append((node, True))
+            children = list(iter_children(node))
+            if children:
+                children.reverse()
+                pending.extend([(child, False) for child in children])
+        return indexes[key(statement)]
+
+    def add_value(self, value: str | int | float) -> int:
+        key = value_key(value)
+        value_id = self.value_ids.get(key)
+        if value_id is None:
+            value_id = self.value_ids[key] = len(self.values)
+            text = value.hex() if isinstance(value, float) else str(value)
+            self.values.append(VALUE_TAGS[type(value)] + text.encode("utf-8", "surrogatepass"))
+        return value_id
+
+    def add_list(self, indexes: list[int]) -> int:
+        offset = len(self.list_items)
+        self.list_items.append(len(indexes))
+        self.list_items.extend(indexes)
+        return offset
+
+    def to_bytes(self, version: str = COMPILER_VERSION) -> bytes:
+        version_bytes = version.encode()
+        offsets = bytearray()
+        position = 0
+        for value in self.values:
+            offsets += OFFSET.pack(position)
+            position += len(value)
+        offsets += OFFSET.pack(position)
+        header = HEADER.pack(MAGIC, AST_FORMAT, len(version_bytes), len(self.values), position, self.node_count,
+                             len(self.list_items), len(self.statements) // STATEMENT.size)
+        return b"".join((header, padded(version_bytes), offsets, padded(b"".join(self.values)), self.records,
+                         struct.pack(f"<{len(self.list_items)}i", *self.list_items), self.statements))
+
+    def __add_node(self, node, indexes: dict[int, int]) -> int:
+        kind = node.kind
+        key = self.key
+        operator = first = second = third = -1
+        if kind == constants.NODE_BINARY_EXPRESSION:
+            operator, first, second = node.operator, indexes[key(node.left)], indexes[key(node.right)]
+        elif kind == constants.NODE_IDENTIFIER:
+            first = self.add_value(node.name)
+        elif kind == constants.NODE_INT_LITERAL:
+            if INLINE_INT_MIN <= node.value <= INLINE_INT_MAX:
+                first = node.value
+            else:
+                first, second = self.add_value(node.value), 1
+        elif kind in (constants.NODE_STRING_LITERAL, constants.NODE_FLOAT_LITERAL):
+            first = self.add_value(node.value)
+        elif kind == constants.NODE_BOOL_LITERAL:
+            first = int(node.value)
+        elif kind == constants.NODE_UNARY_EXPRESSION:
+            operator, first = node.operator, indexes[key(node.expression)]
+        elif kind in (constants.NODE_EXPRESSION_STATEMENT, constants.NODE_RETURN_STATEMENT):
+            first = indexes[key(node.expression)]
+        elif kind == constants.NODE_VARIABLE_DECLARATION:
+            first, second = indexes[key(node.identifier)], indexes[key(node.init)]
+        elif kind == constants.NODE_FUNCTION_DECLARATION:
+            first = self.add_value(node.name)
+            second = self.add_list([indexes[key(param)] for param in node.param])
+            third = self.add_list([indexes[key(statement)] for statement in node.body])
+        elif kind == constants.NODE_IMPORT_STATEMENT:
+            first = self.add_value(node.path)
+        else:
+            raise ValueError(f"{type(node).__name__} can not be written to an ast file")
+        self.records += NODE.pack(kind, operator, node.line, first, second, third)
+        self.node_count += 1
+        return self.node_count - 1
+
+
+class AstFile:
+    # reads the ast file layout of AstFileWriter from bytes or a mapped file. opening only checks the header,
+    # values and top level statements are decoded when they are asked for, so reading one function of a big
+    # file touches the pages of its records and names only
+    def __init__(self, data, file=None) -> None:
+        self.data = data
+        self.file = file
+        if len(data) < HEADER.size:
+            raise ValueError("not a LoomScript ast file")
+        magic, ast_format, version_length, value_count, value_bytes, node_count, list_count, statement_count = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("not a LoomScript ast file")
+        if ast_format != AST_FORMAT:
+            raise ValueError(f"ast file format {ast_format}, not {AST_FORMAT}")
+        self.version = bytes(data[HEADER.size: HEADER.size + version_length]).decode()
+        if self.version != COMPILER_VERSION:
+            raise ValueError(f"ast file of compiler version {self.version}, not {COMPILER_VERSION}")
+        self.offsets_start = HEADER.size + padded_length(version_length)
+        self.values_start = self.offsets_start + (value_count + 1) * OFFSET.size
+        self.nodes_start = self.values_start + padded_length(value_bytes)
+        self.lists_start = self.nodes_start + node_count * NODE.size
+        self.statements_start = self.lists_start + list_count * 4
+        if self.statements_start + statement_count * STATEMENT.size != len(data):
+            raise ValueError("truncated LoomScript ast file")
+        self.values: list = [None] * value_count
+        self.statement_count = statement_count
+        self.functions: dict[str, int] | None = None
+
+    @classmethod
+    def open(cls, path: str) -> "AstFile":
+        file = open(path, 'rb')
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b""
+            return cls(data, file)
+        except BaseException:
+            file.close()
+            raise
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.data.close()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self) -> "AstFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.statement_count
+
+    def value(self, value_id: int) -> str | int | float:
+        value = self.values[value_id]
+        if value is None:
+            start, end = struct.unpack_from("<II", self.data, self.offsets_start + value_id * OFFSET.size)
+            raw = bytes(self.data[self.values_start + start: self.values_start + end])
+            text = raw[1:].decode("utf-8", "surrogatepass")
+            if raw[:1] == b"s":
+                value = sys.intern(text)
+            elif raw[:1] == b"i":
+                value = int(text)
+            else:
+                value = float.fromhex(text)
+            self.values[value_id] = value
+        return value
+
+    def function_names(self) -> dict[str, int]:
+        # name -> index of the top level function, read from the statement records alone
+        if self.functions is None:
+            self.functions = dict()
+            for index in range(self.statement_count):
+                kind, name_id = self.__record(STATEMENT.unpack_from(self.data, self.__statement_offset(index))[1])
+                if kind == constants.NODE_FUNCTION_DECLARATION:
+                    self.functions[self.value(name_id)] = index
+        return self.functions
+
+    def function(self, name: str, nodes=NodeFactory):
+        index = self.function_names().get(name)
+        if index is None:
+            raise KeyError(name)
+        return self.statement(index, nodes)
+
+    def statement(self, index: int, nodes=NodeFactory):
+        # decodes one top level statement into the nodes of a NodeFactory
+        if not 0 <= index < self.statement_count:
+            raise IndexError(index)
+        first, last = STATEMENT.unpack_from(self.data, self.__statement_offset(index))
+        records = self.data[self.nodes_start + first * NODE.size: self.nodes_start + (last + 1) * NODE.size]
+        value = self.value
+        built: list = list()
+        for kind, operator, line, a, b, c in NODE.iter_unpack(records):
+            if kind == constants.NODE_BINARY_EXPRESSION:
+                node = nodes.binary_expression(built[a - first], operator, built[b - first], line)
+            elif kind == constants.NODE_IDENTIFIER:
+                node = nodes.identifier(value(a), line)
+            elif kind == constants.NODE_INT_LITERAL:
+                node = nodes.int_literal(a if b == -1 else value(a), line)
+            elif kind == constants.NODE_EXPRESSION_STATEMENT:
+                node = nodes.expression_statement(built[a - first], line)
+            elif kind == constants.NODE_STRING_LITERAL:
+                node = nodes.string_literal(value(a), line)
+            elif kind == constants.NODE_FLOAT_LITERAL:
+                node = nodes.float_literal(value(a), line)
+            elif kind == constants.NODE_UNARY_EXPRESSION:
+                node = nodes.unary_expression(operator, built[a - first], line)
+            elif kind == constants.NODE_VARIABLE_DECLARATION:
+                node = nodes.variable_declaration(built[a - first], built[b - first], line)
+            elif kind == constants.NODE_RETURN_STATEMENT:
+                node = nodes.return_statement(built[a - first], line)
+            elif kind == constants.NODE_BOOL_LITERAL:
+                node = nodes.bool_literal(bool(a), line)
+            elif kind == constants.NODE_FUNCTION_DECLARATION:
+                node = nodes.function_declaration(value(a), [built[item - first] for item in self.__list(b)],
+                                                  [built[item - first] for item in self.__list(c)], line)
+            elif kind == constants.NODE_IMPORT_STATEMENT:
+                node = nodes.import_statement(value(a), line)
+            else:
+                raise ValueError(f"unknown node kind {kind} in LoomScript ast file")
+            built.append(node)
+        return built[-1]
+
+    def program(self, nodes=NodeFactory):
+        return nodes.program([self.statement(index, nodes) for index in range(self.statement_count)])
+
+    def __statement_offset(self, index: int) -> int:
+        return self.statements_start + index * STATEMENT.size
+
+    def __record(self, index: int) -> tuple[int, int]:
+        kind, _, _, first, _, _ = NODE.unpack_from(self.data, self.nodes_start + index * NODE.size)
+        return kind, first
+
+    def __list(self, offset: int) -> tuple[int, ...]:
+        position = self.lists_start + offset * 4
+        count = struct.unpack_from("<i", self.data, position)[0]
+        return struct.unpack_from(f"<{count}i", self.data, position + 4)
+
+
+def arena_index(node: ArenaNode) -> int:
+    return node.index
+
+
+def padded(data: bytes) -> bytes:
+    return data + bytes(padded_length(len(data)) - len(data))
+
+
+def padded_length(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def encode_program(program) -> bytes:
+    return AstFileWriter().add_program(program).to_bytes()
+
+
+def decode_program(data: bytes, nodes=NodeFactory):
+    return AstFile(data).program(nodes)
+
+
+def write_program(program, path: str) -> None:
+    # to a temp file renamed over path like emit_file, a reader never maps half a file
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(encode_program(program))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -1,38 +1,79 @@
+from lang import constants
+
+
 class Program:
-    def __init__(self) -> None:
+    __slots__ = ("version", "body", "symbols")
+    kind = constants.NODE_PROGRAM
+
+    def __init__(self, body: list["Statement"] | None = None) -> None:
         self.version: str = "v1"
-        self.body: list[Statement] = list()
+        self.body: list[Statement] = body if body is not None else list()
+        self.symbols = None     # the SymbolTable of the parse, None for a tree loaded from the cache
 
 
 class Statement:
+    __slots__ = ("line",)
+
     def __init__(self, line: int) -> None:
         self.line = line
 
 
 class Expression:
+    __slots__ = ("line",)
+
     def __init__(self, line: int) -> None:
         self.line = line
 
 
 class Identifier(Expression):
+    __slots__ = ("name",)
+    kind = constants.NODE_IDENTIFIER
+
     def __init__(self, name: str, line: int) -> None:
         super().__init__(line)
         self.name = name
 
 
 class IntLiteral(Expression):
+    __slots__ = ("value",)
+    kind = constants.NODE_INT_LITERAL
+
     def __init__(self, value: int, line: int) -> None:
         super().__init__(line)
         self.value = value
 
 
 class StringLiteral(Expression):
+    __slots__ = ("value",)
+    kind = constants.NODE_STRING_LITERAL
+
     def __init__(self, value: str, line: int) -> None:
         super().__init__(line)
         self.value = value
 
 
+class FloatLiteral(Expression):
+    __slots__ = ("value",)
+    kind = constants.NODE_FLOAT_LITERAL
+
+    def __init__(self, value: float, line: int) -> None:
+        super().__init__(line)
+        self.value = value
+
+
+class BoolLiteral(Expression):
+    __slots__ = ("value",)
+    kind = constants.NODE_BOOL_LITERAL
+
+    def __init__(self, value: bool, line: int) -> None:
+        super().__init__(line)
+        self.value = value
+
+
 class UnaryExpression(Expression):
+    __slots__ = ("operator", "expression")
+    kind = constants.NODE_UNARY_EXPRESSION
+
     def __init__(self, operator: int, expression: Expression, line: int) -> None:
         super().__init__(line)
         self.operator = operator
@@ -40,6 +81,9 @@ class UnaryExpression(Expression):
 
 
 class BinaryExpression(Expression):
+    __slots__ = ("left", "operator", "right")
+    kind = constants.NODE_BINARY_EXPRESSION
+
     def __init__(self, left_expression: Expression, operator: int, right_expression: Expression, line: int) -> None:
         super().__init__(line)
         self.left = left_expression
@@ -48,12 +92,18 @@ class BinaryExpression(Expression):
 
 
 class ExpressionStatement(Statement):
+    __slots__ = ("expression",)
+    kind = constants.NODE_EXPRESSION_STATEMENT
+
     def __init__(self, expression: Expression, line) -> None:
         super().__init__(line)
         self.expression = expression
 
 
 class FunctionDeclaration(Statement):
+    __slots__ = ("name", "param", "body")
+    kind = constants.NODE_FUNCTION_DECLARATION
+
     def __init__(self, name: str, params: list[Identifier], body: list[Statement], line: int) -> None:
         super().__init__(line)
         self.name = name
@@ -61,13 +111,39 @@ class FunctionDeclaration(Statement):
         self.body = body
 
 
+class LazyFunctionDeclaration(FunctionDeclaration):
+    # FunctionDeclaration whose body is parsed the first time it is read (Parse with lazy=True)
+    __slots__ = ("body_parser",)
+
+    def __init__(self, name: str, params: list[Identifier], body_parser, line: int) -> None:
+        super().__init__(name, params, None, line)
+        self.body_parser = body_parser
+
+    @property
+    def body(self) -> list[Statement]:
+        if self.body_parser is not None:
+            FunctionDeclaration.body.__set__(self, self.body_parser())
+            self.body_parser = None
+        return FunctionDeclaration.body.__get__(self)
+
+    @body.setter
+    def body(self, body: list[Statement]) -> None:
+        FunctionDeclaration.body.__set__(self, body)
+
+
 class ReturnStatement(Statement):
+    __slots__ = ("expression",)
+    kind = constants.NODE_RETURN_STATEMENT
+
     def __init__(self, expression: ExpressionStatement, line: int) -> None:
         super().__init__(line)
         self.expression = expression
 
 
 class VariableDeclaration(Statement):
+    __slots__ = ("identifier", "init")
+    kind = constants.NODE_VARIABLE_DECLARATION
+
     def __init__(self, identifier: Identifier, init: ExpressionStatement, line: int) -> None:
         super().__init__(line)
         self.identifier = identifier
@@ -75,20 +151,157 @@ class VariableDeclaration(Statement):
 
 
 class RawCodeStatement(Statement):
+    __slots__ = ("code", "params")
+    kind = constants.NODE_RAW_CODE_STATEMENT
+
     def __init__(self, code: int, params: list[any], line: int) -> None:
         super().__init__(line)
         self.code = code
         self.params = params
 
 
-class Trace:
-    def __init__(self, block_name: str, line: int) -> None:
-        self.block_name = block_name
-        self.line = line
-        self.variable: list[Variable] = list()
+class ImportStatement(Statement):
+    # import "<path>"; the declarations of another module, path as written (relative to the importing file)
+    __slots__ = ("path",)
+    kind = constants.NODE_IMPORT_STATEMENT
 
+    def __init__(self, path: str, line: int) -> None:
+        super().__init__(line)
+        self.path = path
 
-class Variable:
-    def __init__(self, name: str, variable_type: int):
-        self.name = name
-        self.variable_type = variable_type
+
+class NodeFactory:
+    # how Parse builds nodes, ArenaBuilder (arenaUtils) has the same interface
+    program = Program
+    identifier = Identifier
+    int_literal = IntLiteral
+    string_literal = StringLiteral
+    float_literal = FloatLiteral
+    bool_literal = BoolLiteral     # only the optimizer and ast files make them
+    unary_expression = UnaryExpression
+    binary_expression = BinaryExpression
+    expression_statement = ExpressionStatement
+    function_declaration = FunctionDeclaration
+    lazy_function_declaration = LazyFunctionDeclaration
+    return_statement = ReturnStatement
+    variable_declaration = VariableDeclaration
+    import_statement = ImportStatement
+
+
+class HashConsFactory(NodeFactory):
+    # NodeFactory that builds every structurally identical expression once: identifiers and literals are keyed
+    # on their value, unary and binary expressions on (kind, operator, children), and the children are shared
+    # already, so a key holds them as they are and hashes them by identity. a shared node keeps the line of
+    # its first occurrence and must not be changed in place. statements are never shared, one instance per parse
+    def __init__(self) -> None:
+        self.table: dict[tuple, Expression] = dict()
+        self.requested = 0      # expressions asked for, len(table) of them were built
+
+    def __intern(self, key: tuple, node_class, *args) -> Expression:
+        self.requested += 1
+        node = self.table.get(key)
+        if node is None:
+            node = self.table[key] = node_class(*args)
+        return node
+
+    def identifier(self, name: str, line: int) -> Identifier:
+        return self.__intern((constants.NODE_IDENTIFIER, name), Identifier, name, line)
+
+    def int_literal(self, value: int, line: int) -> IntLiteral:
+        return self.__intern((constants.NODE_INT_LITERAL, value), IntLiteral, value, line)
+
+    def string_literal(self, value: str, line: int) -> StringLiteral:
+        return self.__intern((constants.NODE_STRING_LITERAL, value), StringLiteral, value, line)
+
+    def float_literal(self, value: float, line: int) -> FloatLiteral:
+        return self.__intern((constants.NODE_FLOAT_LITERAL, value), FloatLiteral, value, line)
+
+    def unary_expression(self, operator: int, expression: Expression, line: int) -> UnaryExpression:
+        return self.__intern((constants.NODE_UNARY_EXPRESSION, operator, expression), UnaryExpression,
+                             operator, expression, line)
+
+    def binary_expression(self, left_expression: Expression, operator: int, right_expression: Expression,
+                          line: int) -> BinaryExpression:
+        return self.__intern((constants.NODE_BINARY_EXPRESSION, operator, left_expression, right_expression),
+                             BinaryExpression, left_expression, operator, right_expression, line)
+
+
+NODE_NAMES = {
+    constants.NODE_PROGRAM: "program",
+    constants.NODE_IDENTIFIER: "identifier",
+    constants.NODE_INT_LITERAL: "int_literal",
+    constants.NODE_STRING_LITERAL: "string_literal",
+    constants.NODE_UNARY_EXPRESSION: "unary_expression",
+    constants.NODE_BINARY_EXPRESSION: "binary_expression",
+    constants.NODE_EXPRESSION_STATEMENT: "expression_statement",
+    constants.NODE_FUNCTION_DECLARATION: "function_declaration",
+    constants.NODE_RETURN_STATEMENT: "return_statement",
+    constants.NODE_VARIABLE_DECLARATION: "variable_declaration",
+    constants.NODE_RAW_CODE_STATEMENT: "raw_code_statement",
+    constants.NODE_BOOL_LITERAL: "bool_literal",
+    constants.NODE_FLOAT_LITERAL: "float_literal",
+    constants.NODE_IMPORT_STATEMENT: "import_statement"
+}
+
+# fields holding child nodes (or lists of them), by node kind, in source order
+NODE_CHILDREN = {
+    constants.NODE_PROGRAM: ("body",),
+    constants.NODE_IDENTIFIER: (),
+    constants.NODE_INT_LITERAL: (),
+    constants.NODE_STRING_LITERAL: (),
+    constants.NODE_UNARY_EXPRESSION: ("expression",),
+    constants.NODE_BINARY_EXPRESSION: ("left", "right"),
+    constants.NODE_EXPRESSION_STATEMENT: ("expression",),
+    constants.NODE_FUNCTION_DECLARATION: ("param", "body"),
+    constants.NODE_RETURN_STATEMENT: ("expression",),
+    constants.NODE_VARIABLE_DECLARATION: ("identifier", "init"),
+    constants.NODE_RAW_CODE_STATEMENT: (),
+    constants.NODE_BOOL_LITERAL: (),
+    constants.NODE_FLOAT_LITERAL: (),
+    constants.NODE_IMPORT_STATEMENT: ()
+}
+
+EXPRESSION_KINDS = frozenset([constants.NODE_IDENTIFIER, constants.NODE_INT_LITERAL, constants.NODE_STRING_LITERAL,
+                              constants.NODE_FLOAT_LITERAL, constants.NODE_BOOL_LITERAL,
+                              constants.NODE_UNARY_EXPRESSION, constants.NODE_BINARY_EXPRESSION])
+STATEMENT_KINDS = frozenset([constants.NODE_EXPRESSION_STATEMENT, constants.NODE_FUNCTION_DECLARATION,
+                             constants.NODE_RETURN_STATEMENT, constants.NODE_VARIABLE_DECLARATION,
+                             constants.NODE_RAW_CODE_STATEMENT, constants.NODE_IMPORT_STATEMENT])
+# kinds the children of a node kind can have (the initializer of a var and the expression of a return are
+# expression statements, a parameter is an identifier)
+CHILD_KINDS = {
+    constants.NODE_PROGRAM: STATEMENT_KINDS,
+    constants.NODE_UNARY_EXPRESSION: EXPRESSION_KINDS,
+    constants.NODE_BINARY_EXPRESSION: EXPRESSION_KINDS,
+    constants.NODE_EXPRESSION_STATEMENT: EXPRESSION_KINDS,
+    constants.NODE_FUNCTION_DECLARATION: STATEMENT_KINDS | {constants.NODE_IDENTIFIER},
+    constants.NODE_RETURN_STATEMENT: EXPRESSION_KINDS | {constants.NODE_EXPRESSION_STATEMENT},
+    constants.NODE_VARIABLE_DECLARATION: EXPRESSION_KINDS | {constants.NODE_EXPRESSION_STATEMENT}
+}
+
+
+def iter_children(node):
+    for field in NODE_CHILDREN[node.kind]:
+        child = getattr(node, field)
+        if isinstance(child, list):
+            yield from child
+        elif child is not None:
+            yield child
+
+
+class NodeVisitor:
+    # visit_<node name> methods (see NODE_NAMES) are looked up once per visitor class,
+    # works the same on object nodes and on arena nodes
+    def visit(self, node):
+        table = type(self).__dict__.get("dispatch_table")
+        if table is None:
+            table = type(self).dispatch_table = {kind: getattr(type(self), "visit_" + name, None)
+                                                 for kind, name in NODE_NAMES.items()}
+        method = table[node.kind]
+        if method is None:
+            return self.generic_visit(node)
+        return method(self, node)
+
+    def generic_visit(self, node) -> None:
+        for child in iter_children(node):
+            self.visit(child)
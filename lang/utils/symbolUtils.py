@@ -0,0 +1,72 @@
+import sys
+
+from lang import constants
+
+
+class Symbol:
+    __slots__ = ("name", "kind", "index", "type")
+
+    def __init__(self, name: str, kind: int, index: int) -> None:
+        self.name = name
+        self.kind = kind    # SYMBOL_FUNCTION, SYMBOL_PARAMETER or SYMBOL_VARIABLE
+        self.index = index  # declaration order in its scope
+        self.type: str | None = None    # filled in by lang/inference.py, the return type for a function
+
+
+class Scope:
+    # the names declared in one block, a dict keyed by interned name so a lookup is one hash probe however
+    # many names the block has. a name is visible from its declaration on, in its scope and in the scopes
+    # opened after it inside that scope, an inner declaration shadows an outer one.
+    # parent_limit is how many names the parent had when this scope was opened, a lazy body parsed at
+    # the end still only sees the names declared before its function
+    __slots__ = ("name", "parent", "parent_limit", "symbols")
+
+    def __init__(self, name: str, parent: "Scope | None" = None) -> None:
+        self.name = name
+        self.parent = parent
+        self.parent_limit = len(parent.symbols) if parent is not None else 0
+        self.symbols: dict[str, Symbol] = dict()
+
+    def declare(self, name: str, kind: int) -> Symbol | None:
+        # None when the name is already declared in this scope
+        if name in self.symbols:
+            return None
+        name = sys.intern(name)
+        symbol = self.symbols[name] = Symbol(name, kind, len(self.symbols))
+        return symbol
+
+    def lookup(self, name: str) -> Symbol | None:
+        symbol = self.symbols.get(name)
+        if symbol is not None:
+            return symbol
+        scope, limit = self.parent, self.parent_limit
+        while scope is not None:    # one step for a function body, scopes never nest deeper
+            symbol = scope.symbols.get(name)
+            if symbol is not None and symbol.index < limit:
+                return symbol
+            scope, limit = scope.parent, scope.parent_limit
+        return None
+
+
+class SymbolTable:
+    # every scope of a program, filled in by Parse: the global one and one per function (function names are
+    # unique). the body of a lazy function adds its locals when it is parsed
+    __slots__ = ("globals", "functions")
+
+    def __init__(self) -> None:
+        self.globals = Scope("global")
+        self.functions: dict[str, Scope] = dict()
+
+    def open_function(self, name: str) -> Scope:
+        scope = self.functions[name] = Scope(name, self.globals)
+        return scope
+
+
+def declared_symbol(statement) -> tuple[str, int] | None:
+    # the (name, symbol kind) a top level statement declares
+    if statement.kind == constants.NODE_FUNCTION_DECLARATION:
+        return statement.name, constants.SYMBOL_FUNCTION
+    if statement.kind == constants.NODE_VARIABLE_DECLARATION:
+        return statement.identifier.name, constants.SYMBOL_VARIABLE
+    return None
+
@@ -1,3 +1,9 @@
+import sys
+from array import array
+from collections import deque
+from typing import Iterable, Iterator
+
+from lang import constants
 from lang.exception import LoomSyntaxError
 
 from lang.constants import get_constants_name
@@ -22,8 +28,68 @@ class Token:  # Token POPO
         return self.token_type in token_type
 
 
+class TokenStore:
+    # struct of arrays token storage: type, lexeme span and line of every token live in typed arrays,
+    # the lexeme is only sliced out of the source (sources up to 4GiB) when it is asked for
+    word_types = frozenset([constants.ID, *constants.WORD_TABLE.values()])
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.types = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = array('I')
+        self.last_ref = TokenRef(self, -1)     # the parser asks for the same token several times in a row
+
+    def append(self, token_type: int, start: int, end: int, line: int) -> None:
+        self.types.append(token_type)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+
+    def get_raw(self, index: int) -> str:
+        raw = self.source[self.starts[index]:self.ends[index]]
+        token_type = self.types[index]
+        if token_type in self.word_types:
+            return sys.intern(raw)
+        if token_type == constants.FLOAT_LITERAL:
+            return make_float_raw(raw)
+        return raw
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> "TokenRef":
+        if self.last_ref.index != index:
+            self.last_ref = TokenRef(self, index)
+        return self.last_ref
+
+    def __iter__(self) -> Iterator["TokenRef"]:
+        return map(self.__getitem__, range(len(self.types)))
+
+
+class TokenRef:  # Token interface over one entry of a TokenStore
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: TokenStore, index: int) -> None:
+        self.store = store
+        self.index = index
+
+    def get_raw(self) -> str:
+        return self.store.get_raw(self.index)
+
+    def get_type(self) -> int:
+        return self.store.types[self.index]
+
+    def get_line(self) -> int:
+        return self.store.lines[self.index]
+
+    def is_of_type(self, *token_type: int) -> bool:
+        return self.store.types[self.index] in token_type
+
+
 class TokenIterator:
-    def __init__(self, tokens: list[Token]) -> None:
+    def __init__(self, tokens: list[Token] | TokenStore) -> None:
         self.pointer = 0
         self.tokens = tokens
         self.length = len(tokens)
@@ -41,6 +107,11 @@ class TokenIterator:
 
     def expect_consume(self, offset: int = 1, *expected_type: int) -> Token:
         token = self.get()
+        if token is None:   # the source ended, the error is on its last line
+            types = list(map(get_constants_name, expected_type))
+            last = self.get(-1)
+            raise LoomSyntaxError(f"expected {'or'.join(types)}, but got nothing",
+                                  last.get_line() if last is not None else None)
         if token.get_type() not in expected_type:
             types = list(map(get_constants_name, expected_type))
             raise LoomSyntaxError(f"expected {'or'.join(types)}, but got {token.get_raw()}", token.get_line())
@@ -63,9 +134,51 @@ class TokenIterator:
         return self.pointer < self.length
 
 
+class TokenStream(TokenIterator):
+    # TokenIterator over a token generator, only a small window around the pointer is kept in memory
+    def __init__(self, tokens: Iterable[Token], lookahead: int = 2, lookbehind: int = 1) -> None:
+        self.pointer = 0
+        self.base = 0   # position of window[0] in the stream
+        self.source = iter(tokens)
+        self.window: deque[Token] = deque(maxlen=lookbehind + 1 + lookahead)
+
+    def get(self, offset: int = 0) -> Token | None:
+        position = self.pointer + offset
+        while position >= self.base + len(self.window):
+            if not self.__pull():
+                return None
+        if position < self.base:
+            raise IndexError(f"token at offset {offset} is out of the lookahead window")
+        return self.window[position - self.base]
+
+    def move(self, offset: int = 1) -> None:
+        if self.get(offset) is not None:
+            self.pointer += offset
+        else:
+            self.pointer = self.base + len(self.window)
+
+    def has_token(self) -> bool:
+        return self.get() is not None
+
+    def __pull(self) -> bool:
+        token = next(self.source, None)
+        if token is None:
+            return False
+        if len(self.window) == self.window.maxlen:
+            self.base += 1
+        self.window.append(token)
+        return True
+
+
 def is_valid_identifier_beginner(char: str) -> bool:
     return char in "abcdefghijklmnopqrstuvwxyz_"
 
 
 def is_valid_identifier_char(char: str) -> bool:
     return char in "abcdefghijklmnopqrstuvwxyz_1234567890"
+
+
+def make_float_raw(lexeme: str) -> str:
+    # Lexer keeps the '.' in the decimal part as well, 1.5 is lexed as "1..5"
+    dot = lexeme.index('.')
+    return lexeme[:dot] + "." + lexeme[dot:]
@@ -1,30 +1,221 @@
 import sys
+import argparse
+from typing import Iterator
 
-from lang.tokenizer import Lexer
-from lang.utils.tokenUtils import Token, TokenIterator
+from lang.tokenizer import LEXER_ENGINES, TableLexer
+from lang.utils.tokenUtils import Token, TokenStore, TokenIterator, TokenStream
 
 from lang.parser import Parse
+from lang.build import (ERROR_FORMATS, TREE_MODES, CompileResult, collect_sources, compile_all, decode_source, default_jobs,
+                        emit_result, get_outline, outline_file, report, write_ast_result)
+from lang.cache import default_cache_dir
+from lang.stats import PHASES, PROFILERS, Recorder
+from lang.exception import LoomSyntaxError
+from lang.optimizer import DEFAULT_OPTIMIZATION, OPTIMIZATION_LEVELS
+from lang.utils.parserUtils import NodeFactory
 
 
 def print_usage(should_exit: bool) -> None:
     print("USAGE:")
-    print("lscript <name>.ls")
+    print("lscript [--lexer {table,store,legacy} | --stream] [--tree {objects,arena,dag}] [--emit {tree,go,ast}] [-O{0,1,2}] "
+          "[--no-cache | --cache-dir <dir>] [--jobs <n>] [--split] [--watch] [--all-errors] [--error-format {text,json}] "
+          "<name>.ls | <dir> ...")
+    print("        [--stats] [--trace-memory] [--stats-json <path>] [--trace <path>] "
+          "[--profile-phase {load,cache,tokenize,parse,optimize,emit} [--profiler {cprofile,sample}] "
+          "--profile-output <path>]")
+    print("lscript --outline [--lexer {table,store,legacy}] [--error-format {text,json}] <name>.ls | <dir> ...")
+    print("lscript --build [--build-state <path>] [--lexer {table,store,legacy}] [--jobs <n>] [--all-errors] "
+          "[--error-format {text,json}] <name>.ls | <dir> ...")
+    print("lscript --serve [--socket <path>] [--no-cache | --cache-dir <dir>]")
+    print("lscript --lsp")
     if should_exit:
         exit(1)
 
 
+def parse_args(args: list[str]) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(prog="lscript", add_help=False)
+    arg_parser.add_argument("program_paths", nargs="*")
+    arg_parser.add_argument("--lexer", choices=LEXER_ENGINES.keys(), default="table")
+    arg_parser.add_argument("--stream", action="store_true")
+    arg_parser.add_argument("--tree", choices=TREE_MODES.keys(), default="objects")
+    arg_parser.add_argument("--emit", choices=("tree", "go", "ast"), default="tree")
+    arg_parser.add_argument("-O", dest="optimization", type=int, choices=OPTIMIZATION_LEVELS.keys(),
+                            default=DEFAULT_OPTIMIZATION)
+    arg_parser.add_argument("--no-cache", action="store_true")
+    arg_parser.add_argument("--cache-dir", default=default_cache_dir())
+    arg_parser.add_argument("--jobs", "-j", type=int, default=default_jobs())
+    arg_parser.add_argument("--split", action="store_true")
+    arg_parser.add_argument("--watch", action="store_true")
+    arg_parser.add_argument("--outline", action="store_true")
+    arg_parser.add_argument("--build", action="store_true")
+    arg_parser.add_argument("--build-state")
+    arg_parser.add_argument("--serve", action="store_true")
+    arg_parser.add_argument("--socket")
+    arg_parser.add_argument("--lsp", action="store_true")
+    arg_parser.add_argument("--all-errors", action="store_true")
+    arg_parser.add_argument("--error-format", choices=ERROR_FORMATS, default="text")
+    arg_parser.add_argument("--stats", action="store_true")
+    arg_parser.add_argument("--trace-memory", action="store_true")
+    arg_parser.add_argument("--stats-json")
+    arg_parser.add_argument("--trace")
+    arg_parser.add_argument("--profile-phase", choices=PHASES)
+    arg_parser.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+    arg_parser.add_argument("--profile-output")
+    options, unknown = arg_parser.parse_known_args(args)
+    options.record = options.stats or options.trace_memory or options.stats_json is not None \
+        or options.trace is not None or options.profile_phase is not None
+    if unknown or (options.stream and options.lexer != "table") or options.jobs < 1 \
+            or (options.serve or options.lsp) == bool(options.program_paths) or (options.lsp and args != ["--lsp"]) \
+            or (options.watch and (options.stream or options.emit == "ast")) \
+            or (options.outline and (options.stream or options.watch or options.serve or options.tree != "objects" or options.emit != "tree"
+                                     or options.all_errors)) \
+            or (options.record and (options.stream or options.watch or options.serve or options.outline)) \
+            or ((options.profile_phase is None) != (options.profile_output is None)) \
+            or (options.build and (options.stream or options.watch or options.outline or options.split or options.record
+                                   or options.tree != "objects" or options.emit != "tree")) \
+            or (options.build_state is not None and not options.build) \
+            or (options.split and (options.stream or options.watch or options.serve or options.outline or options.record)):
+        print_usage(should_exit=True)
+    return options
+
+
 def main(args: list[str]) -> None:
     if len(args) < 2:
         print_usage(should_exit=True)
 
-    program_path = args[1]
-    raw_program = load_raw_program(program_path)
-    parse(tokenize(raw_program))
+    options = parse_args(args[1:])
+    cache_dir = None if options.no_cache else options.cache_dir
+    # the modes other than a plain compile import what they run here, a compile does not load them
+    if options.lsp:
+        from lang.lsp import serve_stdio
+        exit(serve_stdio())
+    if options.serve:
+        from lang.client import default_socket_path
+        from lang.server import serve
+        try:
+            serve(options.socket or default_socket_path(), cache_dir)
+        except OSError as err:
+            print(f"Error : {err}")
+            exit(1)
+        return
+    if options.watch:
+        from lang.server import watch
+        try:
+            watch(options.program_paths, options.lexer, options.tree, cache_dir, options.jobs, options.emit == "go",
+                  options.optimization, recover=options.all_errors, error_format=options.error_format)
+        except KeyboardInterrupt:
+            pass
+        return
+    if options.build:
+        build(options)
+        return
+    sources = collect_sources(options.program_paths)
+    if options.outline:
+        print_outline([outline_file(path, options.lexer) for path in sources], options.error_format)
+        return
+    if options.stream:     # never cached or parallel, hashing would need the whole file up front
+        results = [stream_program(path, "objects" if options.emit == "go" else options.tree, options.all_errors)
+                   for path in sources]
+        if options.emit == "go":    # the optimizer rewrites node objects
+            results = [emit_result(result, options.optimization) for result in results]
+    elif options.split:     # one file at a time, its pieces go to the workers (never cached)
+        from lang.split import compile_split
+        tree_mode = "objects" if options.emit == "go" else options.tree
+        results = [compile_split(path, options.lexer, tree_mode, options.jobs, options.all_errors) for path in sources]
+        if options.emit == "go":
+            results = [emit_result(result, options.optimization) for result in results]
+    else:
+        recorder = None
+        jobs = options.jobs
+        if options.record:
+            recorder = Recorder(options.trace_memory, options.profile_phase, options.profiler)
+            if options.profile_phase is not None:   # the profilers only see this process
+                jobs = 1
+        results = compile_all(sources, options.lexer, options.tree, cache_dir, jobs, options.emit == "go",
+                              options.optimization, options.all_errors, recorder)
+        if recorder is not None:
+            write_stats(recorder, options)
+    if options.emit == "ast":
+        results = [write_ast_result(result) for result in results]
+    output, diagnostics = report(results, options.error_format)
+    for line in output:
+        print(line)
+    for line in diagnostics:
+        print(line, file=sys.stderr)
+    if diagnostics:
+        exit(1)
+
+
+def build(options: argparse.Namespace) -> None:
+    from lang.modules import build_modules
+    build_report = build_modules(options.program_paths, options.build_state, options.jobs, options.lexer,
+                                 options.all_errors)
+    _, diagnostics = report(build_report.results, options.error_format)
+    for line in diagnostics:
+        print(line, file=sys.stderr)
+    print(build_report.summary())
+    if diagnostics:
+        exit(1)
+
+
+def write_stats(recorder: Recorder, options: argparse.Namespace) -> None:
+    if options.stats or options.trace_memory:
+        for line in recorder.format():
+            print(line, file=sys.stderr)
+    if options.stats_json is not None:
+        recorder.write_json(options.stats_json)
+    if options.trace is not None:
+        recorder.write_trace(options.trace)
+    if options.profile_output is not None:
+        recorder.write_profile(options.profile_output)
+
+
+def print_outline(results: list[CompileResult], error_format: str = "text") -> None:
+    failed = False
+    for result in results:
+        if not result.is_ok():
+            print(result.get_diagnostic(error_format), file=sys.stderr)
+            failed = True
+            continue
+        for line, signature in get_outline(result.tree):
+            print(f"{result.path}:{line}: {signature}")
+    if failed:
+        exit(1)
+
+
+def stream_program(program_path: str, tree_mode: str = "objects", recover: bool = False) -> CompileResult:
+    # a file that can not be read fails on its own, like in compile_file, the other files still compile
+    try:
+        tokens = TokenStream(TableLexer(chunks=stream_raw_program(program_path)))
+        parser = Parse(tokens, TREE_MODES[tree_mode](), recover=recover)
+        program = parser.parse()
+        if parser.diagnostics:
+            return CompileResult.from_errors(program_path, parser.diagnostics)
+        return CompileResult(program_path, program)
+    except LoomSyntaxError as err:
+        return CompileResult(program_path, error=str(err), line=err.line)
+    except FileNotFoundError:
+        return CompileResult(program_path, error="file not found")
+    except (OSError, UnicodeDecodeError) as err:
+        return CompileResult(program_path, error=str(err))
 
 
 def load_raw_program(program_path: str) -> str:
+    return decode_raw_program(read_raw_program(program_path))
+
+
+def decode_raw_program(raw_program: bytes) -> str:
     try:
-        with open(program_path, 'r') as file:
+        return decode_source(raw_program)
+    except UnicodeDecodeError as err:
+        print("Internal Error: Unhandled Exception during loading the file")
+        print(f"Error Message: {err}")
+        exit(1)
+
+
+def read_raw_program(program_path: str) -> bytes:
+    try:
+        with open(program_path, 'rb') as file:
             return file.read()
     except FileNotFoundError:
         print("Error : file not found")
@@ -35,16 +226,21 @@ def load_raw_program(program_path: str) -> str:
         exit(1)
 
 
-def tokenize(raw_program: str) -> list[Token]:
-    lexer = Lexer(raw_program)
+def stream_raw_program(program_path: str, chunk_size: int = 1 << 16) -> Iterator[str]:
+    # raises what reading the file raises, stream_program reports it for that file
+    with open(program_path, 'r') as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+def tokenize(raw_program: str, engine: str = "table") -> list[Token] | TokenStore:
+    lexer = LEXER_ENGINES[engine](raw_program)
     return lexer.tokenize()
 
 
-def parse(tokens: list[Token]) -> None:
-    tokens_iterator = TokenIterator(tokens)
-    parser = Parse(tokens_iterator)
-    tree = parser.parse()
-    print(tree)
+def parse(tokens: TokenIterator, nodes=NodeFactory):
+    parser = Parse(tokens, nodes)
+    return parser.parse()
 
 
 if __name__ == "__main__":